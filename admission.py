@@ -0,0 +1,196 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+import uvicorn
+
+from logs import get_logger
+from metrics import ADMISSION_DECISIONS
+from upstream_router import upstream_router
+
+# Configuration
+# Calls (answered or streaming) one process takes on; 0 means no limit
+MAX_CONCURRENT_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", 20))
+# How long an answered call holds its slot while waiting for its /media-stream
+ADMISSION_RESERVATION_TTL = float(os.getenv("ADMISSION_RESERVATION_TTL", 30))
+# Refuse new calls while every upstream deployment has less than this share of a rate limit left
+ADMISSION_MIN_RATE_LIMIT_FRACTION = float(
+    os.getenv("ADMISSION_MIN_RATE_LIMIT_FRACTION", 0.05)
+)
+# Another instance's /incoming-call to <Redirect> refused calls to (empty: say the message and hang up)
+ADMISSION_OVERFLOW_URL = os.getenv("ADMISSION_OVERFLOW_URL", "")
+ADMISSION_OVERFLOW_MESSAGE = os.getenv(
+    "ADMISSION_OVERFLOW_MESSAGE",
+    "Sorry, all of our lines are busy right now. Please try again in a few minutes.",
+)
+# How long a drain waits for active calls to finish before shutting down anyway
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 300))
+
+log = get_logger(__name__)
+
+
+class AdmissionController:
+    """Decides whether this process takes another call, and drains it for shutdown.
+
+    A call holds a slot from /incoming-call (a reservation that expires if the
+    media stream never connects) until its /media-stream closes. New calls are
+    refused when every slot is taken, when every upstream deployment reported
+    a nearly exhausted rate limit, and while draining.
+    """
+
+    def __init__(
+        self,
+        max_calls=MAX_CONCURRENT_CALLS,
+        reservation_ttl=ADMISSION_RESERVATION_TTL,
+        min_rate_limit_fraction=ADMISSION_MIN_RATE_LIMIT_FRACTION,
+    ):
+        self.max_calls = max_calls
+        self.reservation_ttl = reservation_ttl
+        self.min_rate_limit_fraction = min_rate_limit_fraction
+        self.active = 0
+        self.draining = False
+        self._reservations = deque()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def reserved(self):
+        self._expire_reservations()
+        return len(self._reservations)
+
+    def admit_call(self, call_sid):
+        """Reserve a slot for a call on /incoming-call; returns the refusal reason or None."""
+        reason = self._refusal_reason(self.active + self.reserved)
+        ADMISSION_DECISIONS.labels(reason or "admitted").inc()
+        if reason is None:
+            self._reservations.append((call_sid, time.monotonic()))
+            self._idle.clear()
+        else:
+            log.warning(
+                "admission.refused",
+                call_sid=call_sid,
+                reason=reason,
+                active=self.active,
+                reserved=len(self._reservations),
+            )
+        return reason
+
+    def admit_stream(self):
+        """Turn a reservation into an active call when a /media-stream connects.
+
+        Streams carry no CallSid until their `start` event, so the oldest
+        reservation is taken. A stream without one (its reservation expired,
+        or /incoming-call was skipped) is admitted only if a slot is free.
+        """
+        if self.reserved:
+            self._reservations.popleft()
+        elif self._refusal_reason(self.active) is not None:
+            ADMISSION_DECISIONS.labels("stream_refused").inc()
+            return False
+        self.active += 1
+        self._idle.clear()
+        return True
+
+    def accepting(self):
+        return self._refusal_reason(self.active + self.reserved) is None
+
+    def release_stream(self):
+        self.active -= 1
+        self._check_idle()
+
+    def rate_limited(self):
+        return upstream_router.headroom() < self.min_rate_limit_fraction
+
+    def start_drain(self):
+        """Stop admitting calls; the active ones are left to finish."""
+        if not self.draining:
+            self.draining = True
+            log.info("admission.draining", active=self.active, reserved=self.reserved)
+        self._check_idle()
+
+    def resume(self):
+        self.draining = False
+        log.info("admission.resumed")
+
+    async def drain(self, timeout=DRAIN_TIMEOUT):
+        """Start draining and wait until no call holds a slot; False on timeout."""
+        self.start_drain()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            log.warning("admission.drain_timeout", active=self.active, reserved=self.reserved)
+            return False
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "reserved": self.reserved,
+            "max_calls": self.max_calls,
+            "draining": int(self.draining),
+            "rate_limited": int(self.rate_limited()),
+        }
+
+    def _refusal_reason(self, taken):
+        if self.draining:
+            return "draining"
+        if self.max_calls > 0 and taken >= self.max_calls:
+            return "full"
+        if self.rate_limited():
+            return "rate_limited"
+        return None
+
+    def _expire_reservations(self):
+        cutoff = time.monotonic() - self.reservation_ttl
+        expired = False
+        while self._reservations and self._reservations[0][1] < cutoff:
+            self._reservations.popleft()
+            expired = True
+        if expired:
+            self._check_idle()
+
+    def _check_idle(self):
+        if self.active <= 0 and not self._reservations:
+            self._idle.set()
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that drains calls on the first SIGTERM/SIGINT.
+
+    uvicorn closes open websockets as soon as it shuts down, which would cut
+    every call in progress. The first signal starts a drain instead and the
+    shutdown proceeds once the calls have ended (or DRAIN_TIMEOUT passed); a
+    second signal shuts down immediately.
+    """
+
+    def __init__(self, config, admission, drain_timeout=DRAIN_TIMEOUT):
+        super().__init__(config)
+        self.admission = admission
+        self.drain_timeout = drain_timeout
+        self._loop = None
+        self._drain_task = None
+        self._signalled = False
+
+    async def serve(self, sockets=None):
+        self._loop = asyncio.get_running_loop()
+        await super().serve(sockets)
+
+    def handle_exit(self, sig, frame):
+        if self._loop is None or self._signalled:
+            super().handle_exit(sig, frame)
+            return
+        self._signalled = True
+        # Signal handlers run between bytecodes; wake the loop to start the drain
+        self._loop.call_soon_threadsafe(self._start_drain, sig, frame)
+
+    def _start_drain(self, sig, frame):
+        self._drain_task = asyncio.create_task(self._drain_then_exit(sig, frame))
+
+    async def _drain_then_exit(self, sig, frame):
+        await self.admission.drain(self.drain_timeout)
+        super().handle_exit(sig, frame)
+
+
+# Shared by /incoming-call, /media-stream and the server's signal handling
+admission = AdmissionController()
@@ -0,0 +1,149 @@
+import os
+import json
+import base64
+import asyncio
+from functools import lru_cache
+
+from logs import get_logger
+
+# Use a fast JSON parser when one is installed
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Configuration
+# Upstream audio is coalesced into chunks of this many ms (20 = one Twilio frame, no batching)
+UPSTREAM_AUDIO_BATCH_MS = int(os.getenv("UPSTREAM_AUDIO_BATCH_MS", 80))
+# A partial chunk is flushed after at most this many ms
+UPSTREAM_AUDIO_MAX_LATENCY_MS = int(os.getenv("UPSTREAM_AUDIO_MAX_LATENCY_MS", 100))
+
+# g711 mu-law at 8 kHz: one byte per sample
+ULAW_BYTES_PER_MS = 8
+
+log = get_logger(__name__)
+
+
+def payload_ms(payload):
+    """Duration of a base64 mu-law payload, without decoding it."""
+    return (len(payload) * 3 // 4 - payload.count("=", -2)) / ULAW_BYTES_PER_MS
+
+
+@lru_cache(maxsize=1024)
+def _media_frame_prefix(stream_sid):
+    return '{"event":"media","streamSid":%s,"media":{"payload":"' % json.dumps(
+        stream_sid
+    )
+
+
+def media_frame(stream_sid, payload):
+    """Build a Twilio `media` frame around an already base64-encoded payload.
+
+    The payload from `response.audio.delta` is g711 mu-law in base64, which is
+    exactly what Twilio expects, so it is spliced into a pre-encoded template
+    without being decoded, re-encoded or re-serialized.
+    """
+    return _media_frame_prefix(stream_sid) + payload + '"}}'
+
+
+@lru_cache(maxsize=1024)
+def mark_frame(stream_sid, name="responsePart"):
+    """Pre-encoded Twilio `mark` frame."""
+    return json.dumps(
+        {"event": "mark", "streamSid": stream_sid, "mark": {"name": name}},
+        separators=(",", ":"),
+    )
+
+
+@lru_cache(maxsize=1024)
+def clear_frame(stream_sid):
+    """Pre-encoded Twilio `clear` frame."""
+    return json.dumps({"event": "clear", "streamSid": stream_sid}, separators=(",", ":"))
+
+
+class UpstreamAudioCoalescer:
+    """Coalesce 20 ms Twilio media frames into larger `input_audio_buffer.append` messages.
+
+    Frames are base64-decoded and concatenated until `batch_ms` of audio is
+    buffered, then sent upstream as one message. A partial chunk is flushed
+    when the `max_latency_ms` timer fires or when `flush()` is called, e.g. on
+    Twilio `mark`/`stop` events.
+    """
+
+    def __init__(
+        self,
+        send,
+        batch_ms=UPSTREAM_AUDIO_BATCH_MS,
+        max_latency_ms=UPSTREAM_AUDIO_MAX_LATENCY_MS,
+    ):
+        self.send = send
+        self.batch_bytes = batch_ms * ULAW_BYTES_PER_MS
+        self.passthrough = batch_ms <= 20
+        self.max_latency = max_latency_ms / 1000
+        self._chunks = []
+        self._size = 0
+        self._timer = None
+        # Strong references to timer flushes in flight (the loop only keeps weak ones)
+        self._flush_tasks = set()
+        self.frames_in = 0
+        self.messages_out = 0
+
+    async def append(self, payload):
+        """Queue one base64 mu-law frame from a Twilio `media` event."""
+        self.frames_in += 1
+        if self.passthrough:
+            await self._send_audio(payload)
+            return
+
+        chunk = base64.b64decode(payload)
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size >= self.batch_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_latency, self._on_timer
+            )
+
+    async def flush(self):
+        """Send whatever audio is buffered right away."""
+        self._cancel_timer()
+        if not self._chunks:
+            return
+        audio = base64.b64encode(b"".join(self._chunks)).decode("ascii")
+        self._chunks = []
+        self._size = 0
+        await self._send_audio(audio)
+
+    def close(self):
+        """Drop buffered audio, stop the latency timer and cancel a timer flush in flight."""
+        self._cancel_timer()
+        for task in list(self._flush_tasks):
+            task.cancel()
+        self._chunks = []
+        self._size = 0
+
+    async def _send_audio(self, audio):
+        self.messages_out += 1
+        await self.send(
+            '{"type":"input_audio_buffer.append","audio":"' + audio + '"}'
+        )
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.ensure_future(self._flush_on_timer())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_on_timer(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            log.warning("upstream_audio.flush_failed", error=str(e))
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
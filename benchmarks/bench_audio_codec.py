@@ -0,0 +1,88 @@
+"""Micro-benchmark: CPU per `response.audio.delta` on the OpenAI -> Twilio path.
+
+Compares the original relay (json.loads, base64 decode + re-encode, dict,
+json.dumps as done by `websocket.send_json`) with the `audio_codec` path
+(fast parser when installed, payload spliced into a pre-encoded template).
+
+    python benchmarks/bench_audio_codec.py --iterations 20000 --delta-bytes 4800
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_codec  # noqa: E402
+
+
+def make_event(delta_bytes):
+    return json.dumps(
+        {
+            "type": "response.audio.delta",
+            "event_id": "event_AbCdEf0123456789",
+            "response_id": "resp_AbCdEf0123456789",
+            "item_id": "item_AbCdEf0123456789",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": base64.b64encode(os.urandom(delta_bytes)).decode("ascii"),
+        }
+    )
+
+
+def relay_before(message, stream_sid):
+    response = json.loads(message)
+    audio_payload = base64.b64encode(base64.b64decode(response["delta"])).decode(
+        "utf-8"
+    )
+    audio_delta = {
+        "event": "media",
+        "streamSid": stream_sid,
+        "media": {"payload": audio_payload},
+    }
+    # Starlette's send_json serialization
+    return json.dumps(audio_delta, separators=(",", ":"), ensure_ascii=False)
+
+
+def relay_after(message, stream_sid):
+    response = audio_codec.loads(message)
+    return audio_codec.media_frame(stream_sid, response["delta"])
+
+
+def measure(relay, message, stream_sid, iterations):
+    start = time.process_time()
+    for _ in range(iterations):
+        relay(message, stream_sid)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument(
+        "--delta-bytes",
+        type=int,
+        nargs="+",
+        default=[800, 4800, 9600],
+        help="Decoded mu-law bytes per delta (8 bytes per ms of audio)",
+    )
+    args = parser.parse_args()
+
+    stream_sid = "MZ0123456789abcdef0123456789abcdef"
+    parser_name = getattr(audio_codec.loads, "__module__", None) or "orjson"
+    print(f"JSON parser for the new path: {parser_name}")
+    print(f"{'delta bytes':>12} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for delta_bytes in args.delta_bytes:
+        message = make_event(delta_bytes)
+        assert json.loads(relay_before(message, stream_sid)) == json.loads(
+            relay_after(message, stream_sid)
+        )
+        before = measure(relay_before, message, stream_sid, args.iterations)
+        after = measure(relay_after, message, stream_sid, args.iterations)
+        print(f"{delta_bytes:>12} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Benchmark: resident memory per concurrent call at 100/500/1000 simulated calls.
+
+Runs N calls through the real `handle_media_stream` in-process, against the
+fake Twilio and upstream sockets of `benchmarks/bench_replay.py` (same
+settings: no pool, no side outputs). Every call connects, starts its stream
+and sends `--frames` frames of caller audio, then stays open and idle while
+memory is measured; then all of them hang up. Reported per call, as the
+growth over a process that has run one call to completion:
+
+- `rss KiB`: resident set size (VmRSS);
+- `heap KiB`: Python allocations traced by tracemalloc (a separate run, as
+  tracing inflates RSS);
+- `gc objs`: objects tracked by the garbage collector (closures, cells,
+  dicts, tasks, ...).
+
+The fake sockets and the per-call asyncio tasks are included, so the numbers
+are what one more call costs the process. Each stage runs in its own child
+process so memory freed by one stage does not hide the growth of the next.
+`--repo` measures another checkout (e.g. a `git worktree` of an earlier
+commit) with this script:
+
+    python benchmarks/bench_call_memory.py --calls 100 500 1000
+    python benchmarks/bench_call_memory.py --repo ../before --calls 100 500 1000
+"""
+import os
+import sys
+import gc
+import json
+import base64
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+SIDE_OUTPUTS = tempfile.mkdtemp(prefix="call_memory_")
+os.environ.setdefault("CALLER_HISTORY_PATH", "")
+os.environ.setdefault("OUTBOX_PATH", os.path.join(SIDE_OUTPUTS, "outbox.jsonl"))
+
+import bench_replay  # noqa: E402  (sets the in-process relay's environment)
+
+# 20 ms of mu-law silence, as Twilio sends it
+FRAME_PAYLOAD = base64.b64encode(b"\xff" * 160).decode()
+
+
+def rss_kib():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class IdleCall:
+    """Twilio's side of one call: start, some audio, then silence until hung up."""
+
+    def __init__(self, index, frames, hangup):
+        self.messages = [
+            json.dumps({"event": "connected"}),
+            json.dumps(
+                {
+                    "event": "start",
+                    "start": {
+                        "streamSid": f"MZ{index:032d}",
+                        "callSid": f"CA{index:032d}",
+                        "customParameters": {"caller_number": f"+1555{index:07d}"},
+                    },
+                }
+            ),
+        ]
+        self.messages += [
+            json.dumps({"event": "media", "media": {"timestamp": str(20 * (frame + 1)), "payload": FRAME_PAYLOAD}})
+            for frame in range(frames)
+        ]
+        self.hangup = hangup
+        self.position = 0
+        self.idle = asyncio.Event()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.position < len(self.messages):
+            self.position += 1
+            return self.messages[self.position - 1]
+        self.messages = []
+        self.idle.set()
+        await self.hangup.wait()
+        raise StopAsyncIteration
+
+
+class SilentUpstream:
+    """The model's side: never says anything."""
+
+    def __init__(self, hangup):
+        self.hangup = hangup
+
+    async def __anext__(self):
+        await self.hangup.wait()
+        raise StopAsyncIteration
+
+
+async def measure(main, calls, frames, trace):
+    async def run_calls(count):
+        hangup = asyncio.Event()
+        twilio = [IdleCall(index, frames, hangup) for index in range(count)]
+
+        async def acquire():
+            return bench_replay.FakeUpstreamSocket(SilentUpstream(hangup))
+
+        main.realtime_pool.acquire = acquire
+        tasks = [
+            asyncio.create_task(main.handle_media_stream(bench_replay.FakeTwilioSocket(call)))
+            for call in twilio
+        ]
+        await asyncio.gather(*(call.idle.wait() for call in twilio))
+        # Let the forwarders drain the caller audio upstream
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return hangup, tasks
+
+    # Warm up lazy imports and caches with one complete call
+    hangup, tasks = await run_calls(1)
+    hangup.set()
+    await asyncio.gather(*tasks)
+    del hangup, tasks
+
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    before = {"rss": rss_kib(), "objects": len(gc.get_objects())}
+    if trace:
+        before["heap"] = tracemalloc.get_traced_memory()[0]
+    hangup, tasks = await run_calls(calls)
+    gc.collect()
+    after = {"rss": rss_kib(), "objects": len(gc.get_objects())}
+    if trace:
+        after["heap"] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    hangup.set()
+    await asyncio.gather(*tasks)
+    return {name: (after[name] - before[name]) / calls for name in before}
+
+
+def child(args):
+    if args.repo:
+        sys.path.insert(0, os.path.abspath(args.repo))
+    import main
+
+    result = asyncio.run(measure(main, args.child, args.frames, args.tracemalloc))
+    print(json.dumps(result))
+
+
+def run_stage(args, calls, trace):
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(calls), "--frames", str(args.frames)]
+    if args.repo:
+        command += ["--repo", args.repo]
+    if trace:
+        command.append("--tracemalloc")
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[100, 500, 1000], help="Concurrent calls per stage")
+    parser.add_argument("--frames", type=int, default=50, help="Caller audio frames (20 ms) each call sends")
+    parser.add_argument("--repo", help="Checkout to measure instead of this one")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--tracemalloc", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"{'calls':>6} {'rss KiB':>8} {'heap KiB':>9} {'gc objs':>8}   (per call)")
+    for calls in args.calls:
+        plain = run_stage(args, calls, trace=False)
+        traced = run_stage(args, calls, trace=True)
+        print(f"{calls:>6} {plain['rss']:>8.1f} {traced['heap'] / 1024:>9.1f} {plain['objects']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: prompt size and time to first audio for repeat callers, with and without caller history.
+
+Without caller history, a returning caller's context is whatever the Make.com
+lookup returns; `benchmarks/mock_realtime.py` models it as free-form notes
+that grow by one entry per earlier call. With it (`caller_history.py`), the
+first message is a fixed instruction plus one bounded summary item. The
+first table compares the text sent upstream before the first response.create
+after k earlier calls: characters, estimated tokens (~4 characters each),
+and the share of the free-form prompt that is left.
+
+With `--e2e` it runs `benchmarks/loadtest.py` twice (history off, then on):
+a first stage of new callers and a second stage where the same numbers call
+again, and reports the repeat callers' /incoming-call answer time and time
+to first audio (from the stream's `start` to the first media frame). The
+greeting cache is off in both runs so every greeting is rendered, and so is
+the caller profile cache: real repeat calls come long after its TTL. The mock
+model answers after a fixed delay whatever the prompt size, so the run shows
+the relay's side of the saving (the skipped lookup); the prompt table is what
+a real deployment's prefill time and token bill scale with.
+
+    python benchmarks/bench_caller_history.py --calls 1 3 10 30
+    python benchmarks/bench_caller_history.py --e2e --callers 10 --history-calls 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from caller_history import CallerHistory  # noqa: E402
+from mock_realtime import previous_calls_text  # noqa: E402
+from transcripts import Turn  # noqa: E402
+
+CHARS_PER_TOKEN = 4
+CALLER = "+15550000001"
+
+# One earlier call, as its turn log would read at hangup
+CALL_TURNS = [
+    Turn(0, "user", "Hi, my name is Ana. What is the game today?"),
+    Turn(1, "agent", "Which college has the oldest continuously operating university in the Americas?"),
+    Turn(2, "user", "Can I get a hint?"),
+    Turn(3, "agent", "Sure, here is a hint: it is in Mexico."),
+    Turn(4, "user", "No idea. Tell me a joke instead."),
+    Turn(5, "agent", "Here is a dad joke: why didn't the skeleton fight? It didn't have the guts."),
+]
+
+
+def compact_prompt(calls):
+    """The first message and summary item a caller gets after `calls` earlier calls."""
+    history = CallerHistory(path="", enabled=True)
+    for _ in range(calls):
+        history.record_call(CALLER, CALL_TURNS)
+    summary = history.get(CALLER)
+    item = history.prompt_item(summary)
+    return history.first_message(summary) + item["item"]["content"][0]["text"]
+
+
+def prompt_table(call_counts):
+    print(
+        f"{'earlier calls':>13} {'free-form chars':>15} {'~tokens':>8} "
+        f"{'summary chars':>13} {'~tokens':>8} {'left':>6} {'summary us':>10}"
+    )
+    for calls in call_counts:
+        free_form = previous_calls_text(CALLER, calls)
+        started = time.perf_counter()
+        compact = compact_prompt(calls)
+        # Per earlier call: building the summary is one record_call per hangup
+        update_us = (time.perf_counter() - started) / max(calls, 1) * 1e6
+        print(
+            f"{calls:>13} {len(free_form):>15} {len(free_form) // CHARS_PER_TOKEN:>8} "
+            f"{len(compact):>13} {len(compact) // CHARS_PER_TOKEN:>8} "
+            f"{len(compact) / len(free_form):>6.0%} {update_us:>10.1f}"
+        )
+
+
+async def loadtest_row(enabled, args):
+    import loadtest
+
+    parser = loadtest.build_parser()
+    argv = [
+        "--stages", str(args.callers), str(args.callers),
+        "--stage-seconds", str(args.seconds),
+        "--callers", str(args.callers),
+        "--personalized",
+        "--history-calls", str(args.history_calls),
+        "--webhook-latency-ms", str(args.webhook_latency_ms),
+        "--env",
+        f"CALLER_HISTORY_ENABLED={str(enabled).lower()}",
+        "GREETING_CACHE_ENABLED=false",
+        # Repeat calls come hours or days apart, long after the profile cache forgot them
+        "CALLER_PROFILE_MAX_SIZE=0",
+    ]
+    rows = await loadtest.main_async(parser.parse_args(argv))
+    # The second stage: every caller is calling again
+    return rows[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[1, 3, 10, 30], help="Earlier calls per caller")
+    parser.add_argument("--e2e", action="store_true", help="Also run the load test with history off/on")
+    parser.add_argument("--callers", type=int, default=10, help="Concurrent repeat callers in the load test")
+    parser.add_argument("--history-calls", type=int, default=10, help="Earlier calls in the free-form history")
+    parser.add_argument("--webhook-latency-ms", type=int, default=300, help="Make.com lookup latency")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    prompt_table(args.calls)
+
+    if args.e2e:
+        rows = [asyncio.run(loadtest_row(enabled, args)) for enabled in (False, True)]
+        print(f"{'repeat callers':<16} {'answer p50':>10} {'first audio p50':>15} {'e2e p50':>8} {'errors':>6}")
+        for name, row in zip(("history off", "history on"), rows):
+            print(
+                f"{name:<16} {row['answer_p50_ms']:>10.1f} {row['first_audio_p50_ms']:>15.1f} "
+                f"{row['e2e_p50_ms']:>8.1f} {row['errors']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Replay benchmark: upstream Realtime events handled per second per core.
+
+Replays a stream of Azure OpenAI Realtime events through the original
+`send_to_twilio` loop shape (full parse of every event, full-payload logging
+of LOG_EVENT_TYPES, a chain of `type` comparisons) and through
+`events.EventDispatcher` (type read from the prefix, only handled events
+parsed). Handlers are no-ops so only the routing cost is measured; log output
+goes to /dev/null.
+
+The default stream is a synthetic conversation; `--events` replays a file
+with one raw upstream message per line.
+
+    python benchmarks/bench_event_dispatch.py --turns 200 --stdlib-json
+    python benchmarks/bench_event_dispatch.py --events upstream_events.jsonl
+"""
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events  # noqa: E402
+from events import EventDispatcher  # noqa: E402
+
+loads = events.loads
+
+# LOG_EVENT_TYPES before and after the change in main.py
+LOG_BEFORE = [
+    "error",
+    "response.content.done",
+    "rate_limits.updated",
+    "response.done",
+    "input_audio_buffer.committed",
+    "input_audio_buffer.speech_stopped",
+    "input_audio_buffer.speech_started",
+    "session.created",
+]
+LOG_AFTER = LOG_BEFORE[1:2] + LOG_BEFORE[4:]
+HANDLED = [
+    "response.audio.delta",
+    "input_audio_buffer.speech_stopped",
+    "input_audio_buffer.speech_started",
+    "response.done",
+    "conversation.item.input_audio_transcription.completed",
+    "response.function_call_arguments.done",
+    "rate_limits.updated",
+    "error",
+]
+
+
+def event(type_, **fields):
+    # Compact, "type" first, as the service sends them
+    return json.dumps(
+        {"type": type_, "event_id": "event_AbCdEf0123456789", **fields},
+        separators=(",", ":"),
+    )
+
+
+def synthetic_turn(deltas=20, delta_bytes=1600, words=40):
+    """One caller turn and one spoken response, in the order Azure sends them."""
+    ids = {"response_id": "resp_AbCdEf0123456789", "item_id": "item_AbCdEf0123456789"}
+    audio = base64.b64encode(os.urandom(delta_bytes)).decode("ascii")
+    messages = [
+        event("input_audio_buffer.speech_started", audio_start_ms=1000, item_id="item_user"),
+        event("input_audio_buffer.speech_stopped", audio_end_ms=2500, item_id="item_user"),
+        event("input_audio_buffer.committed", item_id="item_user", previous_item_id=None),
+        event("conversation.item.created", item={"id": "item_user", "type": "message", "role": "user"}),
+        event("response.created", response={"id": ids["response_id"], "status": "in_progress"}),
+        event("response.output_item.added", output_index=0, item={"id": ids["item_id"], "type": "message"}),
+        event("conversation.item.created", item={"id": ids["item_id"], "type": "message", "role": "assistant"}),
+        event("response.content_part.added", output_index=0, content_index=0, part={"type": "audio"}, **ids),
+        event(
+            "conversation.item.input_audio_transcription.completed",
+            item_id="item_user",
+            content_index=0,
+            transcript="Hi, could you repeat the question for the game?",
+        ),
+    ]
+    for index in range(max(deltas, words)):
+        if index < deltas:
+            messages.append(event("response.audio.delta", output_index=0, content_index=0, delta=audio, **ids))
+        if index < words:
+            messages.append(event("response.audio_transcript.delta", output_index=0, content_index=0, delta="word ", **ids))
+    transcript = "word " * words
+    messages += [
+        event("response.audio.done", output_index=0, content_index=0, **ids),
+        event("response.audio_transcript.done", output_index=0, content_index=0, transcript=transcript, **ids),
+        event("response.content_part.done", output_index=0, content_index=0, part={"type": "audio", "transcript": transcript}, **ids),
+        event("response.output_item.done", output_index=0, item={"id": ids["item_id"], "content": [{"type": "audio", "transcript": transcript}]}),
+        event(
+            "rate_limits.updated",
+            rate_limits=[
+                {"name": "requests", "limit": 1000, "remaining": 999, "reset_seconds": 0.06},
+                {"name": "tokens", "limit": 100000, "remaining": 99000, "reset_seconds": 0.6},
+            ],
+        ),
+        event(
+            "response.done",
+            response={
+                "id": ids["response_id"],
+                "status": "completed",
+                "output": [{"id": ids["item_id"], "content": [{"type": "audio", "transcript": transcript}]}],
+                "usage": {"total_tokens": 1200, "input_tokens": 800, "output_tokens": 400},
+            },
+        ),
+    ]
+    return messages
+
+
+async def noop(response):
+    pass
+
+
+async def route_before(messages):
+    """The original loop: parse everything, then compare the type against each branch."""
+    for openai_message in messages:
+        response = loads(openai_message)
+        if response["type"] in LOG_BEFORE:
+            print(f"Received event: {response['type']}", response)
+        if response.get("type") == "response.audio.delta" and "delta" in response:
+            await noop(response)
+        if response.get("type") == "input_audio_buffer.speech_stopped":
+            await noop(response)
+        if response.get("type") == "input_audio_buffer.speech_started":
+            await noop(response)
+        if response.get("type") == "response.done":
+            await noop(response)
+        if (
+            response.get("type") == "conversation.item.input_audio_transcription.completed"
+            and "transcript" in response
+        ):
+            await noop(response)
+        if response.get("type") == "response.function_call_arguments.done":
+            await noop(response)
+
+
+async def route_after(messages, dispatcher):
+    for openai_message in messages:
+        await dispatcher.dispatch(openai_message)
+
+
+def measure(route, messages, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        asyncio.run(route(messages))
+    return len(messages) * repeat / (time.process_time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", help="File with one raw upstream message per line")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--stdlib-json", action="store_true", help="Parse with json instead of orjson"
+    )
+    args = parser.parse_args()
+
+    if args.stdlib_json:
+        global loads
+        loads = events.loads = json.loads
+
+    if args.events:
+        with open(args.events, encoding="utf-8") as events_file:
+            messages = [line.rstrip("\n") for line in events_file if line.strip()]
+    else:
+        messages = synthetic_turn() * args.turns
+
+    dispatcher = EventDispatcher(LOG_AFTER)
+    for event_type in HANDLED:
+        dispatcher.on(event_type, noop)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        before = measure(route_before, messages, args.repeat)
+        after = measure(lambda messages: route_after(messages, dispatcher), messages, args.repeat)
+
+    skipped = dispatcher.counters["skipped"] / (dispatcher.counters["skipped"] + dispatcher.counters["dispatched"])
+    parser_name = "json" if loads is json.loads else "orjson"
+    print(f"{len(messages)} events, JSON parser {parser_name}, {skipped:.0%} skipped without parsing")
+    print(f"{'path':<12} {'events/s/core':>14}")
+    print(f"{'before':<12} {before:>14,.0f}")
+    print(f"{'after':<12} {after:>14,.0f}")
+    print(f"speedup {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
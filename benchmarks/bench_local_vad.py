@@ -0,0 +1,136 @@
+"""Benchmark: local barge-in VAD cost per inbound frame and interruption latency.
+
+Runs `local_vad.LocalVoiceDetector` over 20 ms Twilio frames of caller audio
+(a raw 8 kHz mu-law recording via `--audio`, or the synthetic voiced signal
+from `benchmarks/fake_twilio.py`) preceded by silence, and reports:
+
+- CPU per frame of the vectorized detector, next to a pure-Python decode of
+  the same frame for scale;
+- how long after the speech onset the detector fires, and how often it fires
+  on silence or line noise.
+
+With `--e2e` it also runs `benchmarks/loadtest.py` twice, with local VAD off
+and on, and compares the barge-in latency (caller speech onset to Twilio
+`clear`) the fake Twilio clients measured against the mock's server VAD.
+
+    python benchmarks/bench_local_vad.py --audio recorded_call.ulaw
+    python benchmarks/bench_local_vad.py --e2e --calls 5
+"""
+import os
+import sys
+import time
+import base64
+import random
+import asyncio
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import local_vad  # noqa: E402
+import fake_twilio  # noqa: E402
+
+FRAME_BYTES = fake_twilio.FRAME_BYTES
+
+
+def frames_of(audio):
+    return [
+        base64.b64encode(audio[offset : offset + FRAME_BYTES]).decode("ascii")
+        for offset in range(0, len(audio) - FRAME_BYTES + 1, FRAME_BYTES)
+    ]
+
+
+def line_noise(frames, level=200):
+    """Low-level white noise, mu-law encoded."""
+    rng = random.Random(0)
+    audio = bytes(
+        fake_twilio.linear_to_ulaw(int(rng.gauss(0, level)))
+        for _ in range(frames * FRAME_BYTES)
+    )
+    return frames_of(audio)
+
+
+def decode_python(payload):
+    """Per-sample mu-law decode and energy, as it would be done without NumPy."""
+    energy = 0
+    for code in base64.b64decode(payload):
+        code = ~code & 0xFF
+        magnitude = ((((code & 0x0F) << 3) + 0x84) << ((code >> 4) & 0x07)) - 0x84
+        energy += magnitude * magnitude
+    return energy
+
+
+def measure(function, frames, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        for frame in frames:
+            function(frame)
+    return (time.process_time() - start) / (repeat * len(frames)) * 1e6
+
+
+def detection_delay_ms(speech_frames, lead_in):
+    """Frames of lead-in (silence or noise), then speech: ms from onset to detection."""
+    detector = local_vad.LocalVoiceDetector()
+    false_triggers = sum(detector.feed(frame) for frame in lead_in)
+    for index, frame in enumerate(speech_frames):
+        if detector.feed(frame):
+            return (index + 1) * fake_twilio.FRAME_MS, false_triggers
+    return float("nan"), false_triggers
+
+
+async def barge_in_p50(vad_enabled, args):
+    import loadtest
+
+    parser = loadtest.build_parser()
+    argv = [
+        "--stages", str(args.calls),
+        "--stage-seconds", "14",
+        "--response-ms", "6000",
+        "--env", f"LOCAL_VAD_ENABLED={str(vad_enabled).lower()}",
+    ]
+    if args.audio:
+        argv += ["--audio", args.audio]
+    rows = await loadtest.main_async(parser.parse_args(argv))
+    return rows[0]["barge_p50_ms"], rows[0]["barge_p90_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--audio", help="Raw 8 kHz g711 mu-law recording (or mu-law .wav)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--e2e", action="store_true", help="Also run the load test with VAD off/on")
+    parser.add_argument("--calls", type=int, default=3, help="Concurrent calls for --e2e")
+    args = parser.parse_args()
+
+    speech = frames_of(fake_twilio.load_audio(args.audio))
+    silence = [base64.b64encode(fake_twilio.SILENCE_FRAME).decode("ascii")] * 50
+    noise = line_noise(50)
+
+    detector = local_vad.LocalVoiceDetector()
+    vad_us = measure(detector.feed, silence + noise + speech, args.repeat)
+    python_us = measure(decode_python, speech, max(args.repeat // 4, 1))
+    print(f"{'path':<28} {'us/frame':>9} {'% of 20 ms':>10}")
+    print(f"{'local VAD (numpy)':<28} {vad_us:>9.2f} {vad_us / 200:>9.3f}%")
+    print(f"{'pure-Python decode only':<28} {python_us:>9.2f} {python_us / 200:>9.3f}%")
+
+    for name, lead_in in (("silence", silence), ("line noise", noise)):
+        delay, false_triggers = detection_delay_ms(speech, lead_in)
+        print(
+            f"after {name:<10}: detected {delay:.0f} ms after speech onset, "
+            f"{false_triggers} false triggers in {len(lead_in) * 20} ms"
+        )
+
+    if args.e2e:
+        rows = []
+        for enabled in (False, True):
+            rows.append(asyncio.run(barge_in_p50(enabled, args)))
+        (off_p50, off_p90), (on_p50, on_p90) = rows
+        print(f"{'barge-in latency':<28} {'p50 ms':>9} {'p90 ms':>9}")
+        print(f"{'server VAD only':<28} {off_p50:>9.1f} {off_p90:>9.1f}")
+        print(f"{'local VAD':<28} {on_p50:>9.1f} {on_p90:>9.1f}")
+        print(f"reduction at p50: {off_p50 - on_p50:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
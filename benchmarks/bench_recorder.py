@@ -0,0 +1,158 @@
+"""Benchmark: event-loop cost of recording calls with `recordings.CallRecorder`.
+
+Simulates N concurrent calls in one event loop, each tapping a 20 ms inbound
+Twilio frame and a 20 ms chunk of response audio every 20 ms in real time
+(what the relay does with recording on), and compares recording off and on:
+
+- event-loop time spent in the taps, per frame and as a share of the frame;
+- event-loop lag (how late a 10 ms timer fires) at p50/p99;
+- process CPU, which includes the writer thread;
+- what the writer produced (files, bytes, dropped or late audio).
+
+With `--e2e` it also runs `benchmarks/loadtest.py` with RECORDING_ENABLED
+off and on and compares the server's CPU and event-loop lag.
+
+    python benchmarks/bench_recorder.py --calls 10 50 100 --seconds 10
+    python benchmarks/bench_recorder.py --e2e --calls 10
+"""
+import os
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import recordings  # noqa: E402
+import fake_twilio  # noqa: E402
+
+FRAME_MS = fake_twilio.FRAME_MS
+FRAME_BYTES = fake_twilio.FRAME_BYTES
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+async def simulated_call(recorder, index, frames, seconds, tap_seconds):
+    """One call: an inbound frame and a response chunk every 20 ms, like the relay."""
+    loop = asyncio.get_running_loop()
+    recording = recorder.open_call(f"CA{index:032x}") if recorder else None
+    started = loop.time()
+    for step in range(int(seconds * 1000 / FRAME_MS)):
+        delay = started + step * FRAME_MS / 1000 - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if recording is None:
+            continue
+        tap_start = time.perf_counter()
+        payload = frames[step % len(frames)]
+        recording.caller(step * FRAME_MS, payload)
+        recording.agent(step * FRAME_MS + 300, payload, FRAME_MS)
+        tap_seconds.append(time.perf_counter() - tap_start)
+    if recording is not None:
+        recording.close()
+
+
+async def measure_lag(stop, lags):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(loop.time() - expected, 0))
+
+
+async def run(calls, seconds, frames, enabled, directory):
+    recorder = None
+    if enabled:
+        recorder = recordings.CallRecorder(directory=directory, enabled=True)
+        await recorder.start()
+    tap_seconds, lags = [], []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(
+        *(simulated_call(recorder, index, frames, seconds, tap_seconds) for index in range(calls))
+    )
+    stop.set()
+    await lag_task
+    if recorder is not None:
+        await recorder.close()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        "tap_us": sum(tap_seconds) / max(len(tap_seconds), 1) * 1e6,
+        "lag_p50_ms": percentile(lags, 50) * 1000,
+        "lag_p99_ms": percentile(lags, 99) * 1000,
+        "cpu_pct": cpu / wall * 100,
+        "stats": recorder.stats() if recorder else dict(),
+    }
+
+
+async def loadtest_row(enabled, args):
+    import loadtest
+
+    parser = loadtest.build_parser()
+    argv = [
+        "--stages", str(args.calls[0]),
+        "--stage-seconds", str(args.seconds),
+        "--env", f"RECORDING_ENABLED={str(enabled).lower()}",
+    ]
+    if args.audio:
+        argv += ["--audio", args.audio]
+    rows = await loadtest.main_async(parser.parse_args(argv))
+    return rows[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--audio", help="Raw 8 kHz g711 mu-law recording (or mu-law .wav)")
+    parser.add_argument("--e2e", action="store_true", help="Also run the load test with recording off/on")
+    args = parser.parse_args()
+
+    audio = fake_twilio.load_audio(args.audio)
+    frames = [
+        base64.b64encode(audio[offset : offset + FRAME_BYTES]).decode("ascii")
+        for offset in range(0, len(audio) - FRAME_BYTES + 1, FRAME_BYTES)
+    ]
+
+    print(
+        f"{'calls':>6} {'recording':>9} {'tap us':>7} {'% of 20 ms':>10} "
+        f"{'lag p50':>8} {'lag p99':>8} {'cpu%':>6} {'files':>6} {'MB':>7} {'dropped':>8} {'late':>6}"
+    )
+    for calls in args.calls:
+        for enabled in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                row = asyncio.run(run(calls, args.seconds, frames, enabled, directory))
+            stats = row["stats"]
+            # Two taps per frame: the caller's and the agent's
+            frame_us = row["tap_us"] if enabled else 0.0
+            print(
+                f"{calls:>6} {'on' if enabled else 'off':>9} {frame_us:>7.2f} "
+                f"{frame_us / (FRAME_MS * 1000) * 100:>9.3f}% "
+                f"{row['lag_p50_ms']:>8.2f} {row['lag_p99_ms']:>8.2f} {row['cpu_pct']:>6.1f} "
+                f"{stats.get('files', 0):>6} {stats.get('bytes_written', 0) / 1e6:>7.1f} "
+                f"{stats.get('dropped_queue_full', 0):>8} {stats.get('late_frames', 0):>6}"
+            )
+
+    if args.e2e:
+        rows = [asyncio.run(loadtest_row(enabled, args)) for enabled in (False, True)]
+        print(f"{'server':<16} {'cpu%':>7} {'lag p50':>8} {'lag p99':>8} {'e2e p50':>8}")
+        for name, row in zip(("recording off", "recording on"), rows):
+            print(
+                f"{name:<16} {row['cpu_pct']:>7.1f} {row['lag_p50_ms']:>8.2f} "
+                f"{row['lag_p99_ms']:>8.2f} {row['e2e_p50_ms']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Benchmark: per-branch cost of the relay, replaying captured call event streams.
+
+Replays capture files (written by the app with CAPTURE_ENABLED=true, see
+`captures.py`) through the real `handle_media_stream` against in-memory fake
+Twilio and upstream sockets. Messages are delivered in their captured order,
+one at a time and as fast as the relay consumes them. Each message's cost is
+the time from handing it to the relay's receive loop until that loop asks for
+the next one. It is reported per branch:
+
+- `twilio:<event>`: the `receive_from_twilio` branches (`media`, `start`, `mark`, ...);
+- `upstream:<type>`: `send_to_twilio`'s dispatch plus the event's handlers
+  (`response.audio.delta`, the transcript events, `response.done`, and
+  `input_audio_buffer.speech_started`, which runs `handle_speech_started_event`);
+- `task:pacer.send_audio`: one paced chunk to Twilio, including `send_mark`;
+- `task:upstream_audio.append`: caller audio handed to the upstream coalescer.
+
+For each branch it reports ns/event (mean and p50) and allocation per event:
+the tracemalloc peak above the level before the event, in bytes, measured in
+a separate pass. `--save` writes the results as JSON and `--compare` diffs
+a run against a saved one, so two commits can be compared on the same traces:
+
+    python benchmarks/bench_replay.py --record-calls 4 --keep-traces traces/
+    python benchmarks/bench_replay.py --traces traces/*.jsonl.gz --save before.json
+    python benchmarks/bench_replay.py --traces traces/*.jsonl.gz --compare before.json
+
+Without `--traces`, fresh traces are captured first by running
+`benchmarks/loadtest.py` with capture enabled.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# The relay runs in-process: no network, no pool, no side outputs, and the
+# pacer never waits for playback so a trace replays as fast as it is consumed.
+# Set before any app module reads its configuration.
+REPLAY_ENV = {
+    "AZURE_OPENAI_ENDPOINT": "ws://127.0.0.1:9/realtime",
+    "AZURE_OPENAI_API_KEY": "replay",
+    "MAKE_WEBHOOK_URL": "http://127.0.0.1:9/webhook",
+    "REALTIME_POOL_SIZE": "0",
+    "MAX_CONCURRENT_CALLS": "0",
+    "GREETING_CACHE_ENABLED": "false",
+    "TRANSCRIPT_PATH": "",
+    "RECORDING_ENABLED": "false",
+    "CAPTURE_ENABLED": "false",
+    "UPSTREAM_MAX_RECONNECTS": "0",
+    "RELAY_PLAYBACK_LEAD_MS": str(24 * 3600 * 1000),
+    "LOG_LEVEL": "WARNING",
+}
+for key, value in REPLAY_ENV.items():
+    os.environ.setdefault(key, value)
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def branch_of(source, message):
+    from events import peek_type
+
+    if source == "twilio":
+        return "twilio:" + json.loads(message).get("event", "unknown")
+    return "upstream:" + str(peek_type(message)[0])
+
+
+class Profile:
+    """Per-branch samples of one pass: nanoseconds, or bytes under tracemalloc."""
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.samples = dict()
+
+    def start(self):
+        if self.memory:
+            tracemalloc.reset_peak()
+            return tracemalloc.get_traced_memory()[0]
+        return time.perf_counter_ns()
+
+    def stop(self, branch, mark):
+        if self.memory:
+            value = tracemalloc.get_traced_memory()[1] - mark
+        else:
+            value = time.perf_counter_ns() - mark
+        self.samples.setdefault(branch, []).append(value)
+
+
+class TraceCursor:
+    """Hands out a trace's messages in captured order to the socket they came from."""
+
+    def __init__(self, events):
+        self.events = events
+        self.position = 0
+        self._turn = {"twilio": asyncio.Event(), "upstream": asyncio.Event()}
+
+    async def next(self, source):
+        while self.position < len(self.events) and self.events[self.position][0] != source:
+            self._turn[source].clear()
+            await self._turn[source].wait()
+        if self.position >= len(self.events):
+            return None
+        _, message, branch = self.events[self.position]
+        self.position += 1
+        if self.position < len(self.events):
+            self._turn[self.events[self.position][0]].set()
+        else:
+            for turn in self._turn.values():
+                turn.set()
+        return message, branch
+
+
+class ReplayStream:
+    """Async iterator over one source's messages that times the loop body consuming each."""
+
+    def __init__(self, cursor, source, profile):
+        self.cursor = cursor
+        self.source = source
+        self.profile = profile
+        self._branch = None
+        self._mark = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._branch is not None:
+            self.profile.stop(self._branch, self._mark)
+            self._branch = None
+        item = await self.cursor.next(self.source)
+        if item is None:
+            raise StopAsyncIteration
+        message, self._branch = item
+        self._mark = self.profile.start()
+        return message
+
+
+class FakeTwilioSocket:
+    """The parts of Starlette's WebSocket that `handle_media_stream` uses."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.headers = dict()
+        self.sent = 0
+
+    async def accept(self):
+        pass
+
+    def iter_text(self):
+        return self.stream
+
+    async def send_text(self, text):
+        self.sent += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+class FakeUpstreamSocket:
+    """The parts of a websockets connection the relay uses; ends once closed."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.open = True
+        self.close_code = None
+        self.sent = 0
+        self._closed = asyncio.Event()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.open:
+            try:
+                return await self.stream.__anext__()
+            except StopAsyncIteration:
+                await self._closed.wait()
+        raise StopAsyncIteration
+
+    async def send(self, message):
+        self.sent += 1
+
+    async def close(self):
+        self.open = False
+        self.close_code = 1000
+        self._closed.set()
+
+
+def instrument(main, passes):
+    """Measure the relay's background work: paced sends to Twilio and upstream audio appends.
+
+    Samples go to `passes.current`, the Profile of the pass being run.
+    """
+
+    class TimedPacer(main.OutboundPacer):
+        def __init__(self, queue, tracker, send_audio, *args, **kwargs):
+            async def timed_send_audio(payload, audio_ms):
+                mark = passes.current.start()
+                await send_audio(payload, audio_ms)
+                passes.current.stop("task:pacer.send_audio", mark)
+
+            super().__init__(queue, tracker, timed_send_audio, *args, **kwargs)
+
+    class TimedCoalescer(main.UpstreamAudioCoalescer):
+        async def append(self, payload):
+            mark = passes.current.start()
+            await super().append(payload)
+            passes.current.stop("task:upstream_audio.append", mark)
+
+    main.OutboundPacer = TimedPacer
+    main.UpstreamAudioCoalescer = TimedCoalescer
+
+
+async def replay(main, events, profile):
+    cursor = TraceCursor(events)
+    twilio = FakeTwilioSocket(ReplayStream(cursor, "twilio", profile))
+    upstream = FakeUpstreamSocket(ReplayStream(cursor, "upstream", profile))
+
+    async def acquire():
+        return upstream
+
+    main.realtime_pool.acquire = acquire
+    await main.handle_media_stream(twilio)
+
+
+def load_traces(paths):
+    from captures import load_capture
+
+    traces = []
+    for path in paths:
+        _, events = load_capture(path)
+        traces.append([(source, message, branch_of(source, message)) for _, source, message in events])
+    return traces
+
+
+def record_traces(directory, calls, seconds):
+    """Capture fresh traces by running the load test with capture on."""
+    import loadtest
+
+    parser = loadtest.build_parser()
+    argv = [
+        "--stages", str(calls),
+        "--stage-seconds", str(seconds),
+        "--response-ms", "5000",
+        "--env", "CAPTURE_ENABLED=true", f"CAPTURE_DIR={directory}",
+    ]
+    asyncio.run(loadtest.main_async(parser.parse_args(argv)))
+    return sorted(glob.glob(os.path.join(directory, "*.jsonl.gz")))
+
+
+class Passes:
+    """The Profile samples currently go to."""
+
+    current = None
+
+
+def run_passes(traces, repeat):
+    import main
+
+    async def run():
+        timing = Profile(memory=False)
+        memory = Profile(memory=True)
+        instrument(main, Passes)
+        # Warm up caches and lazy imports before measuring
+        Passes.current = Profile(memory=False)
+        await replay(main, traces[0], Passes.current)
+        Passes.current = timing
+        for _ in range(repeat):
+            for events in traces:
+                await replay(main, events, timing)
+        Passes.current = memory
+        tracemalloc.start()
+        try:
+            for events in traces:
+                await replay(main, events, memory)
+        finally:
+            tracemalloc.stop()
+        return timing, memory
+
+    return asyncio.run(run())
+
+
+def summarize(timing, memory):
+    results = dict()
+    for branch, samples in timing.samples.items():
+        allocations = memory.samples.get(branch, [])
+        results[branch] = {
+            "events": len(samples),
+            "ns_mean": sum(samples) / len(samples),
+            "ns_p50": percentile(samples, 50),
+            "alloc_bytes": sum(allocations) / len(allocations) if allocations else float("nan"),
+        }
+    return results
+
+
+def print_results(results, baseline, threshold, min_events):
+    regressions = []
+    header = f"{'branch':<58} {'events':>7} {'ns/ev':>9} {'p50 ns':>9} {'alloc B/ev':>10}"
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    print(header)
+    for branch in sorted(results, key=lambda name: -results[name]["ns_mean"] * results[name]["events"]):
+        row = results[branch]
+        line = (
+            f"{branch[:58]:<58} {row['events']:>7} {row['ns_mean']:>9.0f} "
+            f"{row['ns_p50']:>9.0f} {row['alloc_bytes']:>10.0f}"
+        )
+        if baseline is not None and branch in baseline:
+            change = row["ns_p50"] / baseline[branch]["ns_p50"] - 1
+            line += f" {change * 100:>+7.1f}%"
+            # Branches seen a handful of times are too noisy to flag
+            if change > threshold and row["events"] >= min_events:
+                line += "  REGRESSION"
+                regressions.append(branch)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traces", nargs="+", help="Capture files (.jsonl.gz) to replay")
+    parser.add_argument("--record-calls", type=int, default=3, help="Calls to capture without --traces")
+    parser.add_argument("--record-seconds", type=float, default=20)
+    parser.add_argument("--keep-traces", help="Directory to keep freshly captured traces in")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed replays of every trace")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON from another run to diff against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.15, help="p50 slowdown reported as a regression"
+    )
+    parser.add_argument(
+        "--min-events", type=int, default=50, help="Events a branch needs to be flagged"
+    )
+    args = parser.parse_args()
+
+    paths = args.traces
+    if not paths:
+        directory = args.keep_traces or tempfile.mkdtemp(prefix="traces_")
+        paths = record_traces(directory, args.record_calls, args.record_seconds)
+        print(f"captured {len(paths)} traces in {directory}")
+    traces = load_traces(paths)
+    print(f"replaying {sum(len(events) for events in traces)} messages from {len(traces)} traces x{args.repeat}")
+
+    timing, memory = run_passes(traces, args.repeat)
+    results = summarize(timing, memory)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["branches"]
+    regressions = print_results(results, baseline, args.threshold, args.min_events)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"traces": paths, "repeat": args.repeat, "branches": results}, file, indent=1)
+    if regressions:
+        print(f"{len(regressions)} branches slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: cold start, from process start to the first answered /incoming-call.
+
+Starts `python main.py` repeatedly and polls POST /incoming-call (as Twilio
+would after a scale-up) until it answers, for each configuration:
+
+- `default`: no tools enabled, local VAD off (tool SDKs and NumPy stay unimported);
+- `tools+vad`: TOOLS_ENABLED=tavily_search and LOCAL_VAD_ENABLED=true.
+
+It also reports the import time of `main` alone (`python -X importtime`).
+Upstream and webhook URLs point at closed loopback ports and the connection
+pool is off, so only the app's own startup is measured.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --env SESSION_STORE_URL=redis://127.0.0.1:6379
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import http.client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from loadtest import free_port, percentile  # noqa: E402
+
+CONFIGURATIONS = {
+    "default": {"TOOLS_ENABLED": "", "LOCAL_VAD_ENABLED": "false"},
+    "tools+vad": {"TOOLS_ENABLED": "tavily_search", "LOCAL_VAD_ENABLED": "true"},
+}
+
+
+def server_env(port, workdir, overrides, extra):
+    env = dict(os.environ)
+    env.update(
+        {
+            "PORT": str(port),
+            "AZURE_OPENAI_ENDPOINT": f"ws://127.0.0.1:{free_port()}/realtime",
+            "AZURE_OPENAI_API_KEY": "startup",
+            "MAKE_WEBHOOK_URL": f"http://127.0.0.1:{free_port()}/webhook",
+            "TAVILY_API_KEY": env.get("TAVILY_API_KEY", "startup"),
+            "REALTIME_POOL_SIZE": "0",
+            "OUTBOX_PATH": os.path.join(workdir, "outbox.jsonl"),
+            "TRANSCRIPT_PATH": os.path.join(workdir, "transcripts.jsonl"),
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    env.update(overrides)
+    env.update(extra)
+    return env
+
+
+def first_answer_seconds(env, port, timeout=30):
+    """Seconds from spawning the server to its first 200 on /incoming-call."""
+    body = "CallSid=CAstartup&From=%2B15550000000"
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=REPO_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            try:
+                connection.request("POST", "/incoming-call", body, headers)
+                if connection.getresponse().status == 200:
+                    return time.perf_counter() - started
+            except (ConnectionError, OSError):
+                time.sleep(0.002)
+            finally:
+                connection.close()
+            if server.poll() is not None:
+                raise RuntimeError(f"main.py exited with {server.returncode}")
+        raise TimeoutError("main.py did not answer /incoming-call")
+    finally:
+        # The answered call holds an admission reservation a graceful drain would wait out
+        server.kill()
+        server.wait()
+
+
+def import_seconds(env):
+    """Cumulative import time of `main`, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=REPO_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    match = re.search(r"\|\s*(\d+) \| main$", result.stderr, re.MULTILINE)
+    return int(match.group(1)) / 1e6 if match else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--configs", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS)
+    )
+    parser.add_argument(
+        "--env", nargs="*", default=[], help="Extra KEY=VALUE settings for the server"
+    )
+    args = parser.parse_args()
+    extra = dict(pair.split("=", 1) for pair in args.env)
+
+    print(f"{'config':<12} {'import ms':>10} {'first p50 ms':>13} {'first min ms':>13} {'first max ms':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.configs:
+            imports, answers = [], []
+            for _ in range(args.runs):
+                port = free_port()
+                env = server_env(port, workdir, CONFIGURATIONS[name], extra)
+                imports.append(import_seconds(env))
+                answers.append(first_answer_seconds(env, port))
+            print(
+                f"{name:<12} {percentile(imports, 50) * 1000:>10.1f} "
+                f"{percentile(answers, 50) * 1000:>13.1f} {min(answers) * 1000:>13.1f} "
+                f"{max(answers) * 1000:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark: concurrent calls one host carries as the number of worker processes grows.
+
+Runs `benchmarks/loadtest.py` once per worker count (`WORKERS=N`, see
+`workers.py`) over the same concurrency stages. A stage passes when no call
+errored or was refused and the end-to-end p90 latency stays within `--slo-ms`;
+a worker count's capacity is its largest passing stage. With N workers,
+roughly (N-1)/N of the media streams reach another worker than the one that
+answered the call and are handed off over loopback, so the table includes
+that relay cost.
+
+The mocks and the simulated Twilio clients run on the same host and take
+CPU of their own; for numbers that reflect the server alone, give them spare
+cores (or run with fewer workers than cores).
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --stages 25 50 100 200
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import loadtest  # noqa: E402
+
+
+def passed(row, slo_ms):
+    return not row["errors"] and not row["refused"] and row["e2e_p90_ms"] <= slo_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--stages", type=int, nargs="+", default=[25, 50, 100, 200])
+    parser.add_argument("--stage-seconds", type=float, default=20)
+    parser.add_argument("--slo-ms", type=float, default=800, help="End-to-end p90 a stage must stay within")
+    parser.add_argument("--audio", help="Raw 8 kHz g711 mu-law recording (or mu-law .wav)")
+    args = parser.parse_args()
+    print(f"host cores: {os.cpu_count()}")
+
+    capacity = dict()
+    for workers in args.workers:
+        argv = [
+            "--workers", str(workers),
+            "--stages", *[str(stage) for stage in args.stages],
+            "--stage-seconds", str(args.stage_seconds),
+        ]
+        if args.audio:
+            argv += ["--audio", args.audio]
+        print(f"\nworkers={workers}")
+        rows = asyncio.run(loadtest.main_async(loadtest.build_parser().parse_args(argv)))
+        capacity[workers] = max((row["calls"] for row in rows if passed(row, args.slo_ms)), default=0)
+
+    print(f"\n{'workers':>7} {'calls/host':>10} {'per worker':>10}")
+    for workers, calls in capacity.items():
+        print(f"{workers:>7} {calls:>10} {calls / workers:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Simulated Twilio call: POST /incoming-call, then stream g711 mu-law into /media-stream.
+
+Audio is sent in 20 ms `media` frames at real-time pacing: mu-law silence
+while the caller listens and, while the caller speaks, either a raw 8 kHz
+mu-law recording (`--audio`) or a synthetic voiced signal. Outbound
+audio is "played" against a local clock so `mark` events are echoed back the
+way Twilio does once playback reaches them, and `clear` drops queued audio.
+
+End-to-end latency is measured on the schedule shared with
+`benchmarks/mock_realtime.py`: from the moment the caller's simulated speech
+ends to the first `media` frame the server sends back afterwards. Barge-in
+latency runs from the start of the caller's speech to the server's `clear`,
+and each `clear` also records how much queued audio it threw away. A call
+answered with overflow TwiML (no `<Stream>`) is recorded as refused.
+"""
+import re
+import json
+import argparse
+import time
+import math
+import uuid
+import base64
+import asyncio
+
+import aiohttp
+import websockets
+
+FRAME_MS = 20
+ULAW_BYTES_PER_MS = 8
+FRAME_BYTES = FRAME_MS * ULAW_BYTES_PER_MS
+SILENCE_FRAME = bytes([0xFF]) * FRAME_BYTES
+
+
+def linear_to_ulaw(sample):
+    """Encode one 16-bit PCM sample as a g711 mu-law byte."""
+    sign = 0x80 if sample < 0 else 0
+    magnitude = min(abs(sample), 32635) + 0x84
+    exponent = max(magnitude.bit_length() - 8, 0)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | (exponent << 4) | mantissa) & 0xFF
+
+
+def load_audio(path=None, seconds=2):
+    """Raw mu-law bytes from `path`, or a synthetic voiced signal."""
+    if path:
+        with open(path, "rb") as audio:
+            data = audio.read()
+        if path.endswith(".wav"):
+            data = data[data.find(b"data") + 8 :]
+        return data
+    # A 140 Hz pitch with a few harmonics and a 4 Hz syllable envelope
+    samples = []
+    for index in range(seconds * 8000):
+        t = index / 8000
+        envelope = 0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)
+        voiced = sum(math.sin(2 * math.pi * 140 * k * t) / k for k in (1, 2, 3, 5))
+        samples.append(linear_to_ulaw(int(6000 * envelope * voiced)))
+    return bytes(samples)
+
+
+class CallResult:
+    __slots__ = (
+        "latencies_ms",
+        "barge_in_ms",
+        "cleared_ms",
+        "frames_sent",
+        "media_received",
+        "clears",
+        "refused",
+        "error",
+        "answer_ms",
+        "first_audio_ms",
+    )
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.barge_in_ms = []
+        self.cleared_ms = []
+        self.frames_sent = 0
+        self.media_received = 0
+        self.clears = 0
+        self.refused = False
+        self.error = None
+        self.answer_ms = None
+        self.first_audio_ms = None
+
+
+async def run_call(
+    base_url,
+    audio,
+    duration_s,
+    cycle_ms=6000,
+    speech_ms=1500,
+    http=None,
+    caller_number=None,
+):
+    """Simulate one call for `duration_s` seconds and return a CallResult.
+
+    Without `caller_number` every call comes from a new number.
+    """
+    result = CallResult()
+    call_sid = "CA" + uuid.uuid4().hex
+    stream_sid = "MZ" + uuid.uuid4().hex
+    caller_number = caller_number or "+1555" + call_sid[-7:]
+    try:
+        answer_start = time.perf_counter()
+        async with http.post(
+            base_url + "/incoming-call",
+            data={"From": caller_number, "CallSid": call_sid},
+        ) as response:
+            twiml = await response.text()
+        result.answer_ms = (time.perf_counter() - answer_start) * 1000
+        parameters = dict(re.findall(r'<Parameter name="([^"]+)" value="([^"]*)"', twiml))
+        stream_url = re.search(r'<Stream url="wss://[^/"]+([^"]+)"', twiml)
+        if stream_url is None:
+            result.refused = True
+            return result
+        stream_path = stream_url.group(1)
+        ws_url = base_url.replace("http://", "ws://") + stream_path
+
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+            await ws.send(
+                json.dumps(
+                    {
+                        "event": "start",
+                        "sequenceNumber": "1",
+                        "start": {
+                            "streamSid": stream_sid,
+                            "callSid": call_sid,
+                            "customParameters": parameters,
+                            "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+                        },
+                        "streamSid": stream_sid,
+                    }
+                )
+            )
+            # "connected": when `start` was sent, to time the greeting's first audio
+            speech = {"started": None, "ended": None, "connected": time.perf_counter()}
+            receiver = asyncio.ensure_future(_receive(ws, stream_sid, result, speech))
+            try:
+                await _send_audio(ws, stream_sid, audio, duration_s, cycle_ms, speech_ms, result, speech)
+                await ws.send(json.dumps({"event": "stop", "streamSid": stream_sid, "stop": {"callSid": call_sid}}))
+            finally:
+                receiver.cancel()
+    except Exception as e:
+        result.error = repr(e)
+    return result
+
+
+async def _send_audio(ws, stream_sid, audio, duration_s, cycle_ms, speech_ms, result, speech):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    offset = 0
+    for index in range(int(duration_s * 1000 / FRAME_MS)):
+        timestamp_ms = index * FRAME_MS
+        # The mock's caller speech fills the end of each cycle
+        if timestamp_ms % cycle_ms >= cycle_ms - speech_ms:
+            if timestamp_ms % cycle_ms == cycle_ms - speech_ms:
+                speech["started"] = time.perf_counter()
+            frame = audio[offset : offset + FRAME_BYTES]
+            if len(frame) < FRAME_BYTES:
+                offset = 0
+                frame = audio[:FRAME_BYTES]
+            offset += FRAME_BYTES
+        else:
+            frame = SILENCE_FRAME
+        await ws.send(
+            json.dumps(
+                {
+                    "event": "media",
+                    "sequenceNumber": str(index + 2),
+                    "media": {
+                        "track": "inbound",
+                        "chunk": str(index + 1),
+                        "timestamp": str(timestamp_ms),
+                        "payload": base64.b64encode(frame).decode(),
+                    },
+                    "streamSid": stream_sid,
+                }
+            )
+        )
+        result.frames_sent += 1
+        if (timestamp_ms + FRAME_MS) % cycle_ms == 0:
+            speech["started"] = None
+            speech["ended"] = time.perf_counter()
+        await asyncio.sleep(max(start + (index + 1) * FRAME_MS / 1000 - loop.time(), 0))
+
+
+async def _send_quietly(ws, message):
+    try:
+        await ws.send(message)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+async def _receive(ws, stream_sid, result, speech):
+    pending_marks = []
+    try:
+        await _play(ws, stream_sid, result, speech, pending_marks)
+    finally:
+        for handle in pending_marks:
+            handle.cancel()
+
+
+async def _play(ws, stream_sid, result, speech, pending_marks):
+    loop = asyncio.get_running_loop()
+    playback_until = loop.time()
+    async for message in ws:
+        event = json.loads(message)
+        kind = event.get("event")
+        if kind == "media":
+            result.media_received += 1
+            if result.first_audio_ms is None:
+                result.first_audio_ms = (time.perf_counter() - speech["connected"]) * 1000
+            if speech["ended"] is not None:
+                result.latencies_ms.append((time.perf_counter() - speech["ended"]) * 1000)
+                speech["ended"] = None
+            payload = event["media"]["payload"]
+            audio_ms = (len(payload) * 3 // 4 - payload.count("=", -2)) / ULAW_BYTES_PER_MS
+            playback_until = max(playback_until, loop.time()) + audio_ms / 1000
+        elif kind == "mark":
+            # Twilio acknowledges a mark once the audio queued before it has played
+            mark = json.dumps({"event": "mark", "streamSid": stream_sid, "mark": event["mark"]})
+            handle = loop.call_at(playback_until, lambda mark=mark: asyncio.ensure_future(_send_quietly(ws, mark)))
+            pending_marks.append(handle)
+        elif kind == "clear":
+            result.clears += 1
+            result.cleared_ms.append(max(playback_until - loop.time(), 0) * 1000)
+            if speech["started"] is not None:
+                result.barge_in_ms.append((time.perf_counter() - speech["started"]) * 1000)
+                speech["started"] = None
+            playback_until = loop.time()
+            for handle in pending_marks:
+                handle.cancel()
+            pending_marks.clear()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5050")
+    parser.add_argument("--audio", help="Raw 8 kHz g711 mu-law file (or mu-law .wav)")
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+    async with aiohttp.ClientSession() as http:
+        result = await run_call(args.url, load_audio(args.audio), args.duration, http=http)
+    print(
+        f"frames sent {result.frames_sent}, media received {result.media_received}, "
+        f"clears {result.clears}, latencies ms {[round(x) for x in result.latencies_ms]}, "
+        f"barge-in ms {[round(x) for x in result.barge_in_ms]}, "
+        f"error {result.error}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,384 @@
+"""Offline load test: how many concurrent calls can one server instance carry?
+
+Starts the Realtime/Make.com mocks and the FastAPI app (`python main.py`) as
+subprocesses on loopback ports, then ramps concurrent simulated Twilio calls
+through the given stages. For every stage it reports server CPU and RSS
+(from /proc), event-loop lag (from the app's /metrics), and the end-to-end
+audio latency, barge-in latency and audio discarded per `clear` that the
+fake Twilio clients measured.
+
+    python benchmarks/loadtest.py --stages 1 10 25 50 --stage-seconds 20
+    python benchmarks/loadtest.py --audio recorded_call.ulaw
+    python benchmarks/loadtest.py --deployments 3 --dead-deployments 1 --token-budget 20000
+
+With `--drop-after-ms` the mock closes every upstream connection after that
+much caller audio, and the reconnect outcomes and recovery-time percentiles
+are printed after the stages.
+
+With `--deployments N` the server is pointed at N independent realtime mocks
+(plus `--dead-deployments` endpoints that refuse connections) through
+AZURE_OPENAI_ENDPOINTS, and the per-deployment connection counts and budgets
+from /upstreams are printed after the stages.
+
+With `--workers N` the server runs N worker processes (`WORKERS=N`) and the
+metrics are summed over every worker's private port.
+
+With `--callers N` calls come from a pool of N numbers, so every stage
+after the first is made of repeat callers (see `benchmarks/bench_caller_history.py`).
+"""
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import aiohttp
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_twilio  # noqa: E402
+import mock_realtime  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+class ProcessSampler:
+    """CPU seconds and RSS of a process (and its children) from /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+
+    def pids(self):
+        pids = [self.pid]
+        try:
+            for task in os.listdir(f"/proc/{self.pid}/task"):
+                with open(f"/proc/{self.pid}/task/{task}/children") as children:
+                    pids.extend(int(pid) for pid in children.read().split())
+        except OSError:
+            pass
+        return pids
+
+    def cpu_seconds(self):
+        total = 0.0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as stat:
+                    fields = stat.read().rsplit(")", 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / self.ticks
+            except OSError:
+                pass
+        return total
+
+    def rss_mb(self):
+        total = 0.0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as status:
+                    match = re.search(r"VmRSS:\s+(\d+)", status.read())
+                total += int(match.group(1)) / 1024
+            except (OSError, AttributeError):
+                pass
+        return total
+
+
+def histogram_buckets(metrics_text, name):
+    """Cumulative {upper_bound: count} for an unlabelled histogram in Prometheus text.
+
+    Counts for the same bound are added, so the text may be several workers' scrapes.
+    """
+    buckets = {}
+    for bound, count in re.findall(rf'^{name}_bucket{{le="([^"]+)"}} (\S+)$', metrics_text, re.M):
+        buckets[float(bound)] = buckets.get(float(bound), 0.0) + float(count)
+    return buckets
+
+
+def histogram_quantile(before, after, q):
+    """Approximate quantile (upper bucket bound) of the observations between two scrapes."""
+    bounds = sorted(after)
+    deltas = [after[b] - before.get(b, 0) for b in bounds]
+    total = deltas[-1] if deltas else 0
+    if not total:
+        return float("nan")
+    for bound, cumulative in zip(bounds, deltas):
+        if cumulative >= q * total:
+            return bound
+    return bounds[-1]
+
+
+async def wait_until_ready(http, urls, timeout=30):
+    deadline = time.monotonic() + timeout
+    pending = list(urls)
+    while pending and time.monotonic() < deadline:
+        try:
+            async with http.get(pending[0] + "/") as response:
+                if response.status == 200:
+                    pending.pop(0)
+                    continue
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    if pending:
+        raise RuntimeError("Server did not become ready")
+
+
+async def scrape(http, urls):
+    """/metrics of every server process, concatenated."""
+    texts = []
+    for url in urls:
+        async with http.get(url + "/metrics") as response:
+            texts.append(await response.text())
+    return "\n".join(texts)
+
+
+def server_urls(args, base_url):
+    """The URL of each server process: the workers' private ports, or the one server."""
+    if args.workers > 1:
+        return [f"http://127.0.0.1:{args.worker_port_base + index}" for index in range(args.workers)]
+    return [base_url]
+
+
+async def run_stage(http, base_url, sampler, concurrency, stage_seconds, audio, args):
+    before_metrics = await scrape(http, server_urls(args, base_url))
+    cpu_before = sampler.cpu_seconds()
+    wall_before = time.monotonic()
+    rss_samples = []
+
+    async def sample_rss():
+        while True:
+            rss_samples.append(sampler.rss_mb())
+            await asyncio.sleep(1)
+
+    rss_task = asyncio.ensure_future(sample_rss())
+    calls = []
+    for index in range(concurrency):
+        calls.append(
+            asyncio.ensure_future(
+                fake_twilio.run_call(
+                    base_url,
+                    audio,
+                    stage_seconds,
+                    cycle_ms=args.cycle_ms,
+                    speech_ms=args.speech_ms,
+                    http=http,
+                    caller_number=f"+1555{index % args.callers:07d}" if args.callers else None,
+                )
+            )
+        )
+        # Spread call setup over the ramp window
+        await asyncio.sleep(args.ramp_seconds / max(concurrency, 1))
+    results = await asyncio.gather(*calls)
+    rss_task.cancel()
+
+    cpu = sampler.cpu_seconds() - cpu_before
+    wall = time.monotonic() - wall_before
+    after_metrics = await scrape(http, server_urls(args, base_url))
+    lag_before = histogram_buckets(before_metrics, "event_loop_lag_seconds")
+    lag_after = histogram_buckets(after_metrics, "event_loop_lag_seconds")
+    latencies = [ms for result in results for ms in result.latencies_ms]
+    barge_ins = [ms for result in results for ms in result.barge_in_ms]
+    cleared = [ms for result in results for ms in result.cleared_ms]
+    answers = [result.answer_ms for result in results if result.answer_ms is not None]
+    first_audio = [result.first_audio_ms for result in results if result.first_audio_ms is not None]
+    errors = [result.error for result in results if result.error]
+    refused = sum(result.refused for result in results)
+    return {
+        "calls": concurrency,
+        "cpu_pct": cpu / wall * 100,
+        "rss_mb": max(rss_samples) if rss_samples else sampler.rss_mb(),
+        "lag_p50_ms": histogram_quantile(lag_before, lag_after, 0.5) * 1000,
+        "lag_p99_ms": histogram_quantile(lag_before, lag_after, 0.99) * 1000,
+        "e2e_p50_ms": percentile(latencies, 50),
+        "e2e_p90_ms": percentile(latencies, 90),
+        "e2e_p99_ms": percentile(latencies, 99),
+        "barge_p50_ms": percentile(barge_ins, 50),
+        "barge_p90_ms": percentile(barge_ins, 90),
+        "cleared_p50_ms": percentile(cleared, 50),
+        "answer_p50_ms": percentile(answers, 50),
+        "first_audio_p50_ms": percentile(first_audio, 50),
+        "turns": len(latencies),
+        "refused": refused,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else "",
+    }
+
+
+def print_row(row):
+    print(
+        f"{row['calls']:>6} {row['cpu_pct']:>7.1f} {row['rss_mb']:>8.1f} "
+        f"{row['lag_p50_ms']:>8.2f} {row['lag_p99_ms']:>8.2f} "
+        f"{row['e2e_p50_ms']:>8.1f} {row['e2e_p90_ms']:>8.1f} {row['e2e_p99_ms']:>8.1f} "
+        f"{row['barge_p50_ms']:>9.1f} {row['barge_p90_ms']:>9.1f} {row['cleared_p50_ms']:>9.1f} "
+        f"{row['turns']:>6} {row['refused']:>7} {row['errors']:>6} {row['first_error'][:40]}",
+        flush=True,
+    )
+
+
+async def print_upstreams(http, base_url):
+    async with http.get(base_url + "/upstreams") as response:
+        deployments = (await response.json())["deployments"]
+    print(f"\n{'deployment':<24} {'healthy':>7} {'connects':>8} {'failures':>8} {'headroom':>8}")
+    for deployment in deployments:
+        print(
+            f"{deployment['name']:<24} {str(deployment['healthy']):>7} {deployment['connects']:>8} "
+            f"{deployment['connect_failures']:>8} {deployment['headroom']:>8.2f}"
+        )
+
+
+async def print_reconnects(http, urls):
+    metrics_text = await scrape(http, urls)
+    outcomes = dict()
+    for outcome, count in re.findall(r'^upstream_reconnects_total{outcome="([^"]+)"} (\S+)$', metrics_text, re.M):
+        outcomes[outcome] = outcomes.get(outcome, 0.0) + float(count)
+    recovery = histogram_buckets(metrics_text, "upstream_reconnect_seconds")
+    print(
+        "\nupstream reconnects: "
+        + ", ".join(f"{outcome} {float(count):.0f}" for outcome, count in sorted(outcomes.items()))
+        + f"; recovery p50 {histogram_quantile({}, recovery, 0.5) * 1000:.0f} ms"
+        + f", p90 {histogram_quantile({}, recovery, 0.9) * 1000:.0f} ms"
+    )
+
+
+def start_processes(args, app_port, realtime_ports, webhook_port, workdir):
+    mock_cmd = [
+        sys.executable,
+        os.path.join(BENCH_DIR, "mock_realtime.py"),
+        "--realtime-port", *[str(port) for port in realtime_ports],
+        "--webhook-port", str(webhook_port),
+        "--cycle-ms", str(args.cycle_ms),
+        "--speech-ms", str(args.speech_ms),
+        "--model-latency-ms", str(args.model_latency_ms),
+        "--response-ms", str(args.response_ms),
+        "--greeting-ms", str(args.greeting_ms),
+        "--vad-delay-ms", str(args.vad_delay_ms),
+        "--token-budget", str(args.token_budget),
+        "--tokens-per-response", str(args.tokens_per_response),
+        "--drop-after-ms", str(args.drop_after_ms),
+        "--session-update-ms", str(args.session_update_ms),
+        "--webhook-latency-ms", str(args.webhook_latency_ms),
+        "--history-calls", str(args.history_calls),
+    ] + (["--personalized"] if args.personalized else [])
+    mock = subprocess.Popen(mock_cmd)
+
+    env = dict(os.environ)
+    env.update(
+        {
+            "PORT": str(app_port),
+            # Dead endpoints first, so the first connects exercise failover
+            "AZURE_OPENAI_ENDPOINTS": ",".join(
+                f"ws://127.0.0.1:{port}/realtime"
+                for port in [free_port() for _ in range(args.dead_deployments)] + realtime_ports
+            ),
+            "AZURE_OPENAI_API_KEY": "loadtest",
+            "MAKE_WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}/webhook",
+            "TAVILY_API_KEY": env.get("TAVILY_API_KEY", "loadtest"),
+            "OUTBOX_PATH": os.path.join(workdir, "outbox.jsonl"),
+            "TRANSCRIPT_PATH": os.path.join(workdir, "transcripts.jsonl"),
+            "RECORDING_DIR": os.path.join(workdir, "recordings"),
+            "CAPTURE_DIR": os.path.join(workdir, "captures"),
+            "CALLER_HISTORY_PATH": os.path.join(workdir, "caller_history.jsonl"),
+            "WORKERS": str(args.workers),
+            "WORKER_PORT_BASE": str(args.worker_port_base),
+            # Measure raw capacity unless a stage sets a limit with --env
+            "MAX_CONCURRENT_CALLS": "0",
+        }
+    )
+    env.update(dict(pair.split("=", 1) for pair in args.env))
+    server_cmd = [sys.executable, "main.py"] + args.server_args
+    server = subprocess.Popen(
+        server_cmd,
+        cwd=REPO_DIR,
+        env=env,
+        stdout=None if args.server_output else subprocess.DEVNULL,
+        stderr=None if args.server_output else subprocess.DEVNULL,
+    )
+    return mock, server
+
+
+async def main_async(args):
+    audio = fake_twilio.load_audio(args.audio)
+    app_port, webhook_port = free_port(), free_port()
+    realtime_ports = [free_port() for _ in range(args.deployments)]
+    base_url = f"http://127.0.0.1:{app_port}"
+    # Workers' private ports are consecutive from here
+    args.worker_port_base = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        mock, server = start_processes(args, app_port, realtime_ports, webhook_port, workdir)
+        sampler = ProcessSampler(server.pid)
+        try:
+            connector = aiohttp.TCPConnector(limit=0)
+            async with aiohttp.ClientSession(connector=connector) as http:
+                await wait_until_ready(http, server_urls(args, base_url))
+                print(
+                    f"{'calls':>6} {'cpu%':>7} {'rss MB':>8} {'lag p50':>8} {'lag p99':>8} "
+                    f"{'e2e p50':>8} {'e2e p90':>8} {'e2e p99':>8} "
+                    f"{'barge p50':>9} {'barge p90':>9} {'clear p50':>9} {'turns':>6} {'refused':>7} {'errors':>6}"
+                )
+                rows = []
+                for concurrency in args.stages:
+                    row = await run_stage(
+                        http, base_url, sampler, concurrency, args.stage_seconds, audio, args
+                    )
+                    rows.append(row)
+                    print_row(row)
+                if args.deployments > 1 or args.dead_deployments:
+                    await print_upstreams(http, base_url)
+                if args.drop_after_ms:
+                    await print_reconnects(http, server_urls(args, base_url))
+                return rows
+        finally:
+            server.terminate()
+            mock.terminate()
+            server.wait()
+            mock.wait()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", type=int, nargs="+", default=[1, 10, 25, 50])
+    parser.add_argument("--stage-seconds", type=float, default=20)
+    parser.add_argument("--ramp-seconds", type=float, default=2)
+    parser.add_argument("--audio", help="Raw 8 kHz g711 mu-law recording (or mu-law .wav)")
+    parser.add_argument(
+        "--env", nargs="*", default=[], help="Extra KEY=VALUE settings for the server"
+    )
+    parser.add_argument(
+        "--server-args", nargs="*", default=[], help="Extra arguments for main.py"
+    )
+    parser.add_argument("--server-output", action="store_true", help="Show server logs")
+    parser.add_argument("--deployments", type=int, default=1, help="Realtime mocks to route over")
+    parser.add_argument(
+        "--dead-deployments", type=int, default=0, help="Extra endpoints that refuse connections"
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes")
+    parser.add_argument(
+        "--callers", type=int, default=0, help="Reuse this many caller numbers (0: a new one per call)"
+    )
+    mock_realtime.add_arguments(parser)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""Local stand-ins for the Azure OpenAI Realtime websocket and the Make.com webhook.
+
+The realtime mock follows a fixed conversation schedule driven by how much
+caller audio it has received: within every `cycle_ms` of audio, the caller
+listens first and the last `speech_ms` count as caller speech. It emits
+`input_audio_buffer.speech_started` `vad_delay_ms` after the speech begins
+(server VAD detection time), `speech_stopped` when it ends and, after
+`model_latency_ms`, streams a response as `response.audio.delta` events faster than real time, followed by
+`response.done` and the caller's transcription. `benchmarks/fake_twilio.py`
+uses the same schedule to measure end-to-end audio latency.
+
+Every response draws `tokens_per_response` from a per-minute `token_budget`,
+reported in `rate_limits.updated` the way Azure does. Several realtime ports
+serve independent mocks, one per simulated deployment. With `drop_after_ms`
+every connection is closed (1011) after that much caller audio, to exercise
+mid-call reconnects; the schedule restarts on the new connection. With
+`session_update_ms`, `session.updated` comes that long after `session.update`,
+like a real deployment's session warm-up (what a pool miss waits for).
+
+    python benchmarks/mock_realtime.py --realtime-port 18082 --webhook-port 18081
+    python benchmarks/mock_realtime.py --realtime-port 18082 18083 --token-budget 20000
+"""
+import json
+import time
+import base64
+import asyncio
+import argparse
+
+import websockets
+from aiohttp import web
+
+ULAW_BYTES_PER_MS = 8
+
+
+class MockRealtimeServer:
+    def __init__(
+        self,
+        cycle_ms=6000,
+        speech_ms=1500,
+        model_latency_ms=300,
+        response_ms=2000,
+        delta_ms=100,
+        delta_interval_ms=25,
+        greeting_ms=3000,
+        vad_delay_ms=250,
+        token_budget=100000,
+        tokens_per_response=1000,
+        drop_after_ms=0,
+        session_update_ms=0,
+    ):
+        self.cycle_ms = cycle_ms
+        self.speech_ms = speech_ms
+        self.model_latency_ms = model_latency_ms
+        self.response_ms = response_ms
+        self.delta_ms = delta_ms
+        self.delta_interval_ms = delta_interval_ms
+        self.greeting_ms = greeting_ms
+        self.vad_delay_ms = vad_delay_ms
+        self.token_budget = token_budget
+        self.tokens_per_response = tokens_per_response
+        self.drop_after_ms = drop_after_ms
+        self.session_update_ms = session_update_ms
+        self.connections = 0
+        self._tokens_used = 0
+        self._window_ends = 0.0
+        # The payload content does not matter to the relay; 0x7F is mu-law silence
+        self._delta = base64.b64encode(bytes([0x7F]) * (delta_ms * ULAW_BYTES_PER_MS)).decode()
+
+    async def handler(self, ws, path=None):
+        self.connections += 1
+        state = {"audio_ms": 0.0, "in_speech": False, "response": None, "vad": None, "items": 0}
+        await ws.send(json.dumps({"type": "session.created", "session": {}}))
+        try:
+            async for message in ws:
+                event = json.loads(message)
+                kind = event.get("type")
+                if kind == "input_audio_buffer.append":
+                    await self._on_audio(ws, state, event["audio"])
+                elif kind == "session.update":
+                    if self.session_update_ms:
+                        await asyncio.sleep(self.session_update_ms / 1000)
+                    await ws.send(json.dumps({"type": "session.updated", "session": {}}))
+                elif kind == "response.create":
+                    self._start_response(ws, state, self.greeting_ms)
+                elif kind in ("conversation.item.truncate", "response.cancel"):
+                    self._cancel_response(state)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._cancel_response(state)
+            if state["vad"] is not None:
+                state["vad"].cancel()
+
+    async def _on_audio(self, ws, state, audio):
+        padding = audio.count("=", -2)
+        state["audio_ms"] += (len(audio) * 3 // 4 - padding) / ULAW_BYTES_PER_MS
+        if self.drop_after_ms and state["audio_ms"] >= self.drop_after_ms:
+            await ws.close(1011, "mock upstream drop")
+            return
+        in_speech = state["audio_ms"] % self.cycle_ms >= self.cycle_ms - self.speech_ms
+        if in_speech and not state["in_speech"]:
+            state["in_speech"] = True
+            state["vad"] = asyncio.ensure_future(
+                self._speech_started(ws, state, int(state["audio_ms"]))
+            )
+        elif not in_speech and state["in_speech"]:
+            state["in_speech"] = False
+            if state["vad"] is not None and not state["vad"].done():
+                await state["vad"]
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "input_audio_buffer.speech_stopped",
+                        "audio_end_ms": int(state["audio_ms"]),
+                        "item_id": "item_user",
+                    }
+                )
+            )
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "conversation.item.input_audio_transcription.completed",
+                        "item_id": "item_user",
+                        "content_index": 0,
+                        "transcript": "Hi, this is a load test caller.",
+                    }
+                )
+            )
+            self._start_response(ws, state, self.response_ms)
+
+    async def _speech_started(self, ws, state, audio_start_ms):
+        try:
+            await asyncio.sleep(self.vad_delay_ms / 1000)
+            self._cancel_response(state)
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "input_audio_buffer.speech_started",
+                        "audio_start_ms": audio_start_ms,
+                        "item_id": "item_user",
+                    }
+                )
+            )
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def _start_response(self, ws, state, duration_ms):
+        self._cancel_response(state)
+        state["items"] += 1
+        state["response"] = asyncio.ensure_future(
+            self._stream_response(ws, f"item_{state['items']}", duration_ms)
+        )
+
+    def _cancel_response(self, state):
+        if state["response"] is not None:
+            state["response"].cancel()
+            state["response"] = None
+
+    async def _stream_response(self, ws, item_id, duration_ms):
+        try:
+            await asyncio.sleep(self.model_latency_ms / 1000)
+            sent_ms = 0
+            while sent_ms < duration_ms:
+                await ws.send(
+                    json.dumps(
+                        {
+                            "type": "response.audio.delta",
+                            "event_id": "event_mock",
+                            "response_id": "resp_mock",
+                            "item_id": item_id,
+                            "output_index": 0,
+                            "content_index": 0,
+                            "delta": self._delta,
+                        }
+                    )
+                )
+                sent_ms += self.delta_ms
+                await asyncio.sleep(self.delta_interval_ms / 1000)
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "rate_limits.updated",
+                        "rate_limits": self._rate_limits(),
+                    }
+                )
+            )
+            await ws.send(
+                json.dumps(
+                    {
+                        "type": "response.done",
+                        "response": {
+                            "id": "resp_mock",
+                            "status": "completed",
+                            "output": [
+                                {
+                                    "id": item_id,
+                                    "type": "message",
+                                    "role": "assistant",
+                                    "content": [
+                                        {
+                                            "type": "audio",
+                                            "transcript": "Hello there! This is a mocked response.",
+                                        }
+                                    ],
+                                }
+                            ],
+                        },
+                    }
+                )
+            )
+        except (asyncio.CancelledError, websockets.exceptions.ConnectionClosed):
+            pass
+
+
+    def _rate_limits(self):
+        """Charge one response to the per-minute token budget and report what is left."""
+        now = time.monotonic()
+        if now >= self._window_ends:
+            self._window_ends = now + 60
+            self._tokens_used = 0
+        self._tokens_used += self.tokens_per_response
+        return [
+            {"name": "requests", "limit": 1000, "remaining": 999, "reset_seconds": 0.06},
+            {
+                "name": "tokens",
+                "limit": self.token_budget,
+                "remaining": max(self.token_budget - self._tokens_used, 0),
+                "reset_seconds": round(self._window_ends - now, 2),
+            },
+        ]
+
+
+def previous_calls_text(caller_number, calls):
+    """A free-form history of `calls` earlier calls, like the Make.com lookup returns."""
+    lines = [f"Greet the caller {caller_number} warmly."]
+    if calls:
+        lines.append(f"They have called {calls} times before. Notes from those calls:")
+    for index in range(calls):
+        lines.append(
+            f"- Call {index + 1} (2026-09-{index % 28 + 1:02d}): the caller, Ana, said hello and asked "
+            "what the game was. You asked which college has the oldest continuously operating "
+            "university in the Americas and gave the hint that it is in Mexico. She guessed twice, "
+            "then asked for a dad joke and you told one about a skeleton who would not fight."
+        )
+    return "\n".join(lines)
+
+
+def make_webhook_app(latency_ms=50, personalized=False, history_calls=0):
+    """Mock Make.com webhook: route 1 looks up the caller, route 2 accepts transcripts.
+
+    Callers are unknown (no firstMessage, so the default greeting is used)
+    unless `personalized` is set; `history_calls` adds that many earlier
+    calls' notes to the firstMessage.
+    """
+    counters = {"route_1": 0, "route_2": 0}
+
+    async def webhook(request):
+        payload = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        route = payload.get("route")
+        counters[f"route_{route}"] = counters.get(f"route_{route}", 0) + 1
+        if route == "1" and personalized:
+            return web.json_response(
+                {"firstMessage": previous_calls_text(payload.get("data1"), history_calls)}
+            )
+        if route == "1":
+            return web.json_response({})
+        return web.Response(text="Accepted")
+
+    app = web.Application()
+    app.router.add_post("/webhook", webhook)
+    app["counters"] = counters
+    return app
+
+
+async def serve(
+    realtime_ports, webhook_port, server_kwargs, webhook_latency_ms, personalized, history_calls=0
+):
+    """Run the webhook mock and one realtime mock per port until cancelled."""
+    runner = web.AppRunner(make_webhook_app(webhook_latency_ms, personalized, history_calls))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", webhook_port).start()
+    servers = []
+    for realtime_port in realtime_ports:
+        realtime = MockRealtimeServer(**server_kwargs)
+        servers.append(
+            await websockets.serve(realtime.handler, "127.0.0.1", realtime_port, max_size=None)
+        )
+    try:
+        await asyncio.Future()
+    finally:
+        for server in servers:
+            server.close()
+        await runner.cleanup()
+
+
+def add_arguments(parser):
+    parser.add_argument("--cycle-ms", type=int, default=6000)
+    parser.add_argument("--speech-ms", type=int, default=1500)
+    parser.add_argument("--model-latency-ms", type=int, default=300)
+    parser.add_argument("--response-ms", type=int, default=2000)
+    parser.add_argument("--delta-ms", type=int, default=100)
+    parser.add_argument("--delta-interval-ms", type=int, default=25)
+    parser.add_argument("--greeting-ms", type=int, default=3000)
+    parser.add_argument(
+        "--vad-delay-ms", type=int, default=250, help="Server VAD speech_started delay"
+    )
+    parser.add_argument(
+        "--token-budget", type=int, default=100000, help="Tokens per minute per deployment"
+    )
+    parser.add_argument("--tokens-per-response", type=int, default=1000)
+    parser.add_argument(
+        "--drop-after-ms", type=int, default=0, help="Close each upstream connection after this much audio"
+    )
+    parser.add_argument(
+        "--session-update-ms", type=int, default=0, help="Delay before session.updated (session warm-up)"
+    )
+    parser.add_argument("--webhook-latency-ms", type=int, default=50)
+    parser.add_argument(
+        "--personalized", action="store_true", help="Return a firstMessage per caller"
+    )
+    parser.add_argument(
+        "--history-calls", type=int, default=0, help="Earlier calls described in each firstMessage"
+    )
+
+
+def server_kwargs(args):
+    return {
+        "cycle_ms": args.cycle_ms,
+        "speech_ms": args.speech_ms,
+        "model_latency_ms": args.model_latency_ms,
+        "response_ms": args.response_ms,
+        "delta_ms": args.delta_ms,
+        "delta_interval_ms": args.delta_interval_ms,
+        "greeting_ms": args.greeting_ms,
+        "vad_delay_ms": args.vad_delay_ms,
+        "token_budget": args.token_budget,
+        "tokens_per_response": args.tokens_per_response,
+        "drop_after_ms": args.drop_after_ms,
+        "session_update_ms": args.session_update_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--realtime-port", type=int, nargs="+", default=[18082])
+    parser.add_argument("--webhook-port", type=int, default=18081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(
+            serve(
+                args.realtime_port,
+                args.webhook_port,
+                server_kwargs(args),
+                args.webhook_latency_ms,
+                args.personalized,
+                args.history_calls,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
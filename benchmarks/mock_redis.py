@@ -0,0 +1,145 @@
+"""Local stand-in for a Redis server, enough for `RedisSessionStore`.
+
+Speaks RESP over asyncio streams and keeps keys in memory. It understands
+PING, AUTH, SELECT, GET, SET (with EX), DEL and EXPIRE; anything else gets
+an error reply. Each client's commands are answered in order, every reply
+after `reply_delay_ms`, so a command cancelled while waiting leaves its reply
+on the socket, as a slow or remote server would.
+
+    python benchmarks/mock_redis.py --port 16379
+    SESSION_STORE_URL=redis://127.0.0.1:16379/0 python main.py
+"""
+import time
+import asyncio
+import argparse
+
+
+class MockRedisServer:
+    def __init__(self, reply_delay_ms=0, password=None):
+        self.reply_delay = reply_delay_ms / 1000
+        self.password = password
+        self.data = dict()  # key -> (value, expires_at or None)
+        self.commands = 0
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self.handler, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def handler(self, reader, writer):
+        authenticated = self.password is None
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                self.commands += 1
+                if self.reply_delay:
+                    await asyncio.sleep(self.reply_delay)
+                name = args[0].upper()
+                if not authenticated and name != "AUTH":
+                    reply = error("NOAUTH Authentication required.")
+                elif name == "AUTH":
+                    authenticated = args[1:] == [self.password]
+                    reply = b"+OK\r\n" if authenticated else error("WRONGPASS invalid password")
+                else:
+                    reply = self.execute(name, args[1:])
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def execute(self, name, args):
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "SELECT":
+            return b"+OK\r\n"
+        if name == "GET":
+            value = self._get(args[0])
+            return bulk(value)
+        if name == "SET":
+            expires_at = None
+            if len(args) >= 4 and args[2].upper() == "EX":
+                expires_at = time.monotonic() + int(args[3])
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if self._get(key) is not None:
+                    del self.data[key]
+                    removed += 1
+            return b":%d\r\n" % removed
+        if name == "EXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return b":0\r\n"
+            self.data[args[0]] = (value, time.monotonic() + int(args[1]))
+            return b":1\r\n"
+        return error(f"ERR unknown command '{name}'")
+
+    def _get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+
+async def read_command(reader):
+    """One command as a list of strings (RESP array of bulk strings), or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, as typed into telnet
+        return line.decode().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readuntil(b"\r\n")
+        data = await reader.readexactly(int(header[1:-2]) + 2)
+        args.append(data[:-2].decode())
+    return args
+
+
+def bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    data = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def error(message):
+    return f"-{message}\r\n".encode()
+
+
+async def serve(port, reply_delay_ms, password):
+    server = MockRedisServer(reply_delay_ms, password)
+    await server.start(port=port)
+    try:
+        await asyncio.Future()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=16379)
+    parser.add_argument("--reply-delay-ms", type=int, default=0)
+    parser.add_argument("--password")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.port, args.reply_delay_ms, args.password))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
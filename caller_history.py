@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from logs import get_logger
+from workers import WORKER_INDEX
+
+# Configuration
+# Keep a compact summary per caller number and use it instead of the Make.com history
+CALLER_HISTORY_ENABLED = os.getenv("CALLER_HISTORY_ENABLED", "true").lower() == "true"
+CALLER_HISTORY_PATH = os.getenv("CALLER_HISTORY_PATH", "caller_history.jsonl")
+CALLER_HISTORY_MAX_CALLERS = int(os.getenv("CALLER_HISTORY_MAX_CALLERS", 5000))
+# With several workers sharing the file, how often each reads what the others appended
+CALLER_HISTORY_SYNC_INTERVAL = float(os.getenv("CALLER_HISTORY_SYNC_INTERVAL", 2))
+# The summary injected at call start never exceeds this many characters
+CALLER_HISTORY_MAX_CHARS = int(os.getenv("CALLER_HISTORY_MAX_CHARS", 300))
+# What the agent may have shared, as "label=keyword|keyword,...", matched in its turns
+CALLER_HISTORY_TOPICS = os.getenv(
+    "CALLER_HISTORY_TOPICS",
+    "the game question=college,the hint=mexico,a dad joke=joke",
+)
+# First message for callers with a summary; their Make.com lookup is skipped
+CALLER_HISTORY_FIRST_MESSAGE = os.getenv(
+    "CALLER_HISTORY_FIRST_MESSAGE",
+    "Greet {name} by name as a returning caller in one short sentence, then offer "
+    "to repeat what you already shared or to tell a new dad joke.",
+)
+# The same for returning callers who never gave their name (no {name} placeholder)
+CALLER_HISTORY_FIRST_MESSAGE_UNNAMED = os.getenv(
+    "CALLER_HISTORY_FIRST_MESSAGE_UNNAMED",
+    "Welcome the caller back in one short sentence, then offer to repeat what you "
+    "already shared or to tell a new dad joke.",
+)
+
+# A name the caller gave: "my name is Ana", "I'm Ana", "this is Ana". The prefix
+# matches in any case (it often starts the sentence); the name must be capitalized
+NAME_PATTERN = re.compile(r"\b(?i:my name is|name['’]s|i am|i['’]m|this is|it['’]s)\s+([A-Z][a-z]+)")
+NOT_NAMES = frozenset({"Calling", "Here", "Just", "Not", "The", "Fine", "Good", "Great", "Sorry"})
+
+log = get_logger(__name__)
+
+
+def _parse_topics(spec):
+    topics = []
+    for pair in spec.split(","):
+        if "=" in pair:
+            label, keywords = pair.split("=", 1)
+            topics.append((label.strip(), [k.strip().lower() for k in keywords.split("|") if k.strip()]))
+    return topics
+
+
+def caller_name(turns):
+    """The most recent name the caller introduced themselves with, if any."""
+    for turn in reversed(turns):
+        if turn.speaker == "user" and turn.text:
+            for match in reversed(NAME_PATTERN.findall(turn.text)):
+                if match not in NOT_NAMES:
+                    return match
+    return None
+
+
+class CallerSummary:
+    """What the agent needs to know about a returning caller, and nothing more."""
+
+    __slots__ = ("number", "name", "calls", "last_call", "shared")
+
+    def __init__(self, number, name=None, calls=0, last_call=None, shared=()):
+        self.number = number
+        self.name = name
+        self.calls = calls
+        self.last_call = last_call
+        self.shared = list(shared)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def render(self, max_chars=CALLER_HISTORY_MAX_CHARS):
+        """Fixed-format summary text, cut to `max_chars`."""
+        parts = [f"Returning caller: {self.name or 'name unknown'}."]
+        calls = "1 previous call" if self.calls == 1 else f"{self.calls} previous calls"
+        if self.last_call:
+            last = datetime.fromtimestamp(self.last_call, timezone.utc)
+            calls += f", the last on {last:%B} {last.day}"
+        parts.append(calls + ".")
+        if self.shared:
+            parts.append(f"Already shared with them: {', '.join(self.shared)}.")
+        text = " ".join(parts)
+        return text if len(text) <= max_chars else text[: max_chars - 3] + "..."
+
+
+class CallerHistory:
+    """Bounded, locally cached summaries of previous calls, keyed on caller number.
+
+    A summary is updated once per call at hangup from that call's turn log
+    (one more call, the name the caller gave, the topics the agent covered)
+    and appended to a JSONL file; the file is replayed on startup and
+    compacted once it holds mostly superseded lines. At call start the
+    summary is injected as one short system item, so a repeat caller's
+    prompt stays the same size however often they call.
+
+    Workers on one host share the file: each appends whole lines and
+    periodically reads the lines the others appended. Only the supervisor
+    compacts it, before the workers start.
+    """
+
+    def __init__(
+        self,
+        path=CALLER_HISTORY_PATH,
+        enabled=CALLER_HISTORY_ENABLED,
+        max_callers=CALLER_HISTORY_MAX_CALLERS,
+        max_chars=CALLER_HISTORY_MAX_CHARS,
+        topics=CALLER_HISTORY_TOPICS,
+        first_message=CALLER_HISTORY_FIRST_MESSAGE,
+        first_message_unnamed=CALLER_HISTORY_FIRST_MESSAGE_UNNAMED,
+        sync_interval=CALLER_HISTORY_SYNC_INTERVAL,
+        shared=WORKER_INDEX is not None,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self.max_callers = max_callers
+        self.max_chars = max_chars
+        self.topics = _parse_topics(topics)
+        self.first_message_template = first_message
+        self.first_message_unnamed = first_message_unnamed
+        self._entries = OrderedDict()
+        self.sync_interval = sync_interval
+        self.shared = shared
+        self._file = None
+        self._lines = 0
+        # Where the next read of the file starts, and which file (inode) that offset is in
+        self._offset = 0
+        self._inode = None
+        self._follower = None
+        self.counters = {"calls_recorded": 0, "injected": 0, "writes": 0, "write_failures": 0, "compactions": 0}
+
+    async def start(self):
+        """Load the summaries written by earlier runs."""
+        if self.enabled and self.path:
+            await asyncio.to_thread(self._load)
+            if self.shared and self.sync_interval > 0:
+                self._follower = asyncio.create_task(self._follow())
+
+    def compact(self):
+        """Load the file and compact it if most of its lines are superseded (blocking)."""
+        if self.enabled and self.path:
+            self._load()
+
+    async def close(self):
+        if self._follower is not None:
+            self._follower.cancel()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get(self, caller_number):
+        """The caller's summary, or None for a first-time (or anonymous) caller."""
+        if not self.enabled or not caller_number:
+            return None
+        summary = self._entries.get(caller_number)
+        if summary is not None:
+            self._entries.move_to_end(caller_number)
+        return summary
+
+    def first_message(self, summary):
+        if summary.name is None:
+            return self.first_message_unnamed
+        return self.first_message_template.format(name=summary.name)
+
+    def prompt_item(self, summary):
+        """`conversation.item.create` carrying the summary, sent before the first response.create."""
+        self.counters["injected"] += 1
+        return {
+            "type": "conversation.item.create",
+            "item": {
+                "type": "message",
+                "role": "system",
+                "content": [{"type": "input_text", "text": summary.render(self.max_chars)}],
+            },
+        }
+
+    def record_call(self, caller_number, turns):
+        """Fold a finished call into the caller's summary and persist it."""
+        if not self.enabled or not caller_number or caller_number == "Unknown":
+            return None
+        summary = self._entries.pop(caller_number, None) or CallerSummary(caller_number)
+        self._entries[caller_number] = summary
+        while len(self._entries) > self.max_callers:
+            self._entries.popitem(last=False)
+        summary.calls += 1
+        summary.last_call = round(time.time())
+        summary.name = caller_name(turns) or summary.name
+        agent_text = " ".join(t.text.lower() for t in turns if t.speaker == "agent" and t.text)
+        for label, keywords in self.topics:
+            if label not in summary.shared and any(k in agent_text for k in keywords):
+                summary.shared.append(label)
+        self.counters["calls_recorded"] += 1
+        self._append(summary)
+        return summary
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["callers"] = len(self._entries)
+        return stats
+
+    def _append(self, summary):
+        if not self.path:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(summary.to_dict(), ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._lines += 1
+            self.counters["writes"] += 1
+        except OSError as e:
+            self.counters["write_failures"] += 1
+            log.warning("caller_history.write_failed", error=str(e))
+
+    def _load(self):
+        try:
+            summaries = self._read_new()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            log.warning("caller_history.load_failed", error=str(e))
+            return
+        self._apply(summaries)
+        # Workers sharing the file leave compaction to the supervisor
+        if not self.shared and self._lines > 2 * len(self._entries):
+            self._compact()
+        log.info("caller_history.loaded", callers=len(self._entries))
+
+    def _read_new(self):
+        """Summaries from the lines appended since the last read, from the start if the file was replaced."""
+        with open(self.path, "rb") as file:
+            inode = os.fstat(file.fileno()).st_ino
+            if inode != self._inode or os.fstat(file.fileno()).st_size < self._offset:
+                self._inode, self._offset = inode, 0
+            file.seek(self._offset)
+            data = file.read()
+        # A line another worker is still appending is read next time
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        summaries = []
+        for line in data[:end].splitlines():
+            try:
+                summaries.append(CallerSummary(**json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+        return summaries
+
+    def _apply(self, summaries):
+        for summary in summaries:
+            self._lines += 1
+            self._entries.pop(summary.number, None)
+            self._entries[summary.number] = summary
+        while len(self._entries) > self.max_callers:
+            self._entries.popitem(last=False)
+
+    async def _follow(self):
+        """Pick up the summaries other workers appended to the shared file."""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                summaries = await asyncio.to_thread(self._read_new)
+            except OSError:
+                continue
+            self._apply(summaries)
+
+    def _compact(self):
+        """Rewrite the file with one line per caller."""
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            for summary in self._entries.values():
+                file.write(json.dumps(summary.to_dict(), ensure_ascii=False) + "\n")
+        os.replace(temporary, self.path)
+        self._lines = len(self._entries)
+        self._inode = os.stat(self.path).st_ino
+        self._offset = os.path.getsize(self.path)
+        self.counters["compactions"] += 1
+
+
+# Shared by /incoming-call, the call handlers and hangup
+caller_history = CallerHistory()
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+from logs import get_logger
+from webhook_client import webhook_client
+
+# Configuration
+CALLER_PROFILE_TTL = float(os.getenv("CALLER_PROFILE_TTL", 600))
+CALLER_PROFILE_MAX_SIZE = int(os.getenv("CALLER_PROFILE_MAX_SIZE", 1000))
+# Hard latency budget (seconds) for the lookup on the /incoming-call path
+CALLER_LOOKUP_BUDGET = float(os.getenv("CALLER_LOOKUP_BUDGET", 0.8))
+# Extra time (seconds) the `start` event may wait for a lookup still in flight
+CALLER_LOOKUP_START_GRACE = float(os.getenv("CALLER_LOOKUP_START_GRACE", 0.5))
+
+DEFAULT_FIRST_MESSAGE = (
+    "Greet the user with 'Hello there! Welcome to Aslan and Bingru's wedding celebration! "
+    "Thank you so much for being an important part of their journey together. "
+    "I am Ada, an AI voice assistant created by Aslan. "
+    "I'm here to tell you about a fun game you'll get to play on the wedding day! "
+    "May I first know your name, please?'"
+)
+
+log = get_logger(__name__)
+
+
+async def fetch_first_message(caller_number):
+    """Ask the Make.com webhook (route "1") for a personalized first message."""
+    status, ok, reason, webhook_response_text = await webhook_client.post(
+        {
+            "route": "1",
+            "data1": caller_number,
+            "data2": "",  # Extra data (not used here)
+        }
+    )
+
+    log.info("caller_profile.response", status=status)
+
+    if not ok:
+        log.warning("caller_profile.failed", status=status, reason=reason)
+        return None
+
+    log.debug("caller_profile.body", text=webhook_response_text)
+    try:
+        webhook_response_data = json.loads(webhook_response_text)
+        if webhook_response_data and webhook_response_data.get("firstMessage"):
+            first_message = webhook_response_data["firstMessage"]
+            log.info("caller_profile.first_message", text=first_message)
+            return first_message
+    except json.JSONDecodeError as parse_error:
+        log.warning("caller_profile.unparsable", error=str(parse_error))
+        # Use the plain text response if parsing fails
+        return webhook_response_text.strip() or None
+    return None
+
+
+class CallerProfileCache:
+    """LRU + TTL cache of personalized first messages keyed on the caller number.
+
+    Lookups are bounded by a latency budget. A miss that blows the budget keeps
+    running in the background so the result can still reach the session (and
+    warm the cache for the next call). Stale entries are served immediately
+    while a background refresh fetches a new value.
+    """
+
+    def __init__(
+        self,
+        fetch=fetch_first_message,
+        ttl=CALLER_PROFILE_TTL,
+        max_size=CALLER_PROFILE_MAX_SIZE,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._inflight = dict()
+
+    def get(self, caller_number):
+        """Return (first_message, is_fresh) for a cached caller, or (None, False)."""
+        entry = self._entries.get(caller_number)
+        if entry is None:
+            return None, False
+        self._entries.move_to_end(caller_number)
+        first_message, fetched_at = entry
+        return first_message, time.monotonic() - fetched_at < self.ttl
+
+    def put(self, caller_number, first_message):
+        self._entries[caller_number] = (first_message, time.monotonic())
+        self._entries.move_to_end(caller_number)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def refresh(self, caller_number):
+        """Start (or join) a background fetch for this caller and return its task."""
+        task = self._inflight.get(caller_number)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_store(caller_number))
+            self._inflight[caller_number] = task
+        return task
+
+    async def _fetch_and_store(self, caller_number):
+        try:
+            first_message = await self.fetch(caller_number)
+            if first_message:
+                self.put(caller_number, first_message)
+            return first_message
+        except Exception as error:
+            log.warning(
+                "caller_profile.lookup_failed", caller_number=caller_number, error=str(error)
+            )
+            return None
+        finally:
+            self._inflight.pop(caller_number, None)
+
+    async def lookup(self, caller_number, budget=CALLER_LOOKUP_BUDGET):
+        """Return (first_message or None, pending task or None) within `budget` seconds."""
+        first_message, is_fresh = self.get(caller_number)
+        if is_fresh:
+            return first_message, None
+
+        task = self.refresh(caller_number)
+        if first_message is not None:
+            # Serve the stale entry now; the refresh lands in the cache later
+            return first_message, None
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), budget), None
+        except asyncio.TimeoutError:
+            log.info(
+                "caller_profile.over_budget", caller_number=caller_number, budget=budget
+            )
+            return None, task
+
+    def has_pending(self, caller_number):
+        return caller_number in self._inflight
+
+    async def wait_pending(self, caller_number, timeout=CALLER_LOOKUP_START_GRACE):
+        """Give a lookup still in flight a last chance to finish before greeting."""
+        task = self._inflight.get(caller_number)
+        if task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+caller_profiles = CallerProfileCache()
@@ -0,0 +1,132 @@
+import os
+import gzip
+import json
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+
+from logs import get_logger
+
+# Configuration
+# Record the raw event streams of calls (both sockets) for offline replay
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "captures")
+# Share of calls captured while enabled
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", 1))
+# Events kept per call; a longer call's capture is cut off (and marked truncated)
+CAPTURE_MAX_EVENTS = int(os.getenv("CAPTURE_MAX_EVENTS", 100000))
+
+CAPTURE_FORMAT = 1
+
+log = get_logger(__name__)
+
+
+class CallCapture:
+    """The messages one call received from Twilio and from the upstream, in arrival order."""
+
+    __slots__ = ("call_sid", "started", "events", "max_events", "truncated", "_t0")
+
+    def __init__(self, max_events=CAPTURE_MAX_EVENTS):
+        self.call_sid = None
+        self.started = time.time()
+        self.events = []
+        self.max_events = max_events
+        self.truncated = False
+        self._t0 = time.perf_counter()
+
+    def add(self, source, message):
+        """Record a raw message from `source` ("twilio" or "upstream")."""
+        if len(self.events) >= self.max_events:
+            self.truncated = True
+            return
+        self.events.append((time.perf_counter() - self._t0, source, message))
+
+
+class CaptureWriter:
+    """Writes finished call captures as gzip-compressed JSONL, off the event loop.
+
+    A capture is kept in memory while its call runs and compressed and written
+    by a worker thread once it ends. The first line is a header (call SID,
+    start time, event count); every other line is one message:
+    `{"t": seconds since the stream connected, "src": "twilio" | "upstream", "msg": raw text}`.
+    """
+
+    def __init__(
+        self,
+        directory=CAPTURE_DIR,
+        enabled=CAPTURE_ENABLED,
+        sample_rate=CAPTURE_SAMPLE_RATE,
+        max_events=CAPTURE_MAX_EVENTS,
+    ):
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_events = max_events
+        self._writes = set()
+        self.counters = {"captured": 0, "written": 0, "truncated": 0, "write_failures": 0}
+
+    def open(self):
+        """A capture for a stream that just connected, or None if this call is not captured."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        return CallCapture(self.max_events)
+
+    def finish(self, capture):
+        """Write a call's capture in the background once the call has ended."""
+        self.counters["captured"] += 1
+        if capture.truncated:
+            self.counters["truncated"] += 1
+        task = asyncio.create_task(asyncio.to_thread(self._write, capture))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def close(self):
+        """Wait for captures still being written."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["writing"] = len(self._writes)
+        return stats
+
+    def _write(self, capture):
+        started = datetime.fromtimestamp(capture.started, timezone.utc)
+        name = f"{started:%Y%m%dT%H%M%SZ}_{capture.call_sid or 'unknown'}.jsonl.gz"
+        header = {
+            "capture": CAPTURE_FORMAT,
+            "call_sid": capture.call_sid,
+            "started": round(capture.started, 3),
+            "events": len(capture.events),
+            "truncated": capture.truncated,
+        }
+        lines = [json.dumps(header)]
+        lines.extend(
+            json.dumps({"t": round(t, 6), "src": source, "msg": message}, ensure_ascii=False)
+            for t, source, message in capture.events
+        )
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with gzip.open(os.path.join(self.directory, name), "wt", encoding="utf-8") as file:
+                file.write("\n".join(lines) + "\n")
+            self.counters["written"] += 1
+        except OSError as e:
+            self.counters["write_failures"] += 1
+            log.warning("capture.write_failed", call_sid=capture.call_sid, error=str(e))
+
+
+def load_capture(path):
+    """Read a capture file: its header and a list of (t, source, message) events."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        events = []
+        for line in file:
+            if line.strip():
+                event = json.loads(line)
+                events.append((event["t"], event["src"], event["msg"]))
+    return header, events
+
+
+# App-lifetime writer shared by every call
+capture_writer = CaptureWriter()
@@ -0,0 +1,89 @@
+import re
+import time
+
+from audio_codec import loads
+from logs import get_logger
+
+log = get_logger(__name__)
+
+# Realtime events are serialized with "type" as their first key
+_COMPACT_PREFIX = '{"type":"'
+_TYPE_PREFIX = re.compile(r'\{\s*"type"\s*:\s*"([^"\\]*)"')
+
+
+def peek_type(message):
+    """The event type of a raw upstream message, and the parsed event if that was needed.
+
+    The type is read from the message prefix without parsing the rest; only
+    when the prefix does not match is the whole message decoded. Frames that
+    are not a JSON object have no type: (None, None).
+    """
+    if isinstance(message, str):
+        if message.startswith(_COMPACT_PREFIX):
+            end = message.find('"', len(_COMPACT_PREFIX))
+            if end > 0:
+                return message[len(_COMPACT_PREFIX) : end], None
+        match = _TYPE_PREFIX.match(message)
+        if match is not None:
+            return match.group(1), None
+    try:
+        event = loads(message)
+    except ValueError:
+        return None, None
+    if not isinstance(event, dict):
+        return None, None
+    return event.get("type"), event
+
+
+class EventDispatcher:
+    """Routes upstream Realtime events to the handlers registered for their type.
+
+    Only events with a handler are fully parsed; everything else (transcript
+    deltas, item bookkeeping) is dropped after reading its type.
+    """
+
+    def __init__(self, log_types=()):
+        self._handlers = dict()
+        self.log_types = frozenset(log_types)
+        # perf_counter() when the message being dispatched was received
+        self.received_at = None
+        self.counters = {"dispatched": 0, "skipped": 0, "malformed": 0}
+
+    def on(self, event_type, handler=None):
+        """Register an async `handler(event)`; usable as a decorator."""
+        if handler is None:
+            return lambda handler: self.on(event_type, handler)
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def off(self, event_type, handler):
+        handlers = self._handlers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(event_type, None)
+
+    def handles(self, event_type):
+        return event_type in self._handlers
+
+    async def dispatch(self, message):
+        """Run the handlers for one raw message; returns the parsed event or None."""
+        received_at = time.perf_counter()
+        event_type, event = peek_type(message)
+        if event_type is None:
+            self.counters["malformed"] += 1
+            log.warning("upstream.malformed_event", size=len(message))
+            return None
+        if event_type in self.log_types:
+            log.info("upstream.event", type=event_type)
+        handlers = self._handlers.get(event_type)
+        if not handlers:
+            self.counters["skipped"] += 1
+            return None
+        self.received_at = received_at
+        if event is None:
+            event = loads(message)
+        self.counters["dispatched"] += 1
+        for handler in handlers:
+            await handler(event)
+        return event
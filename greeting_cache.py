@@ -0,0 +1,174 @@
+import os
+import json
+import mmap
+import base64
+import asyncio
+import hashlib
+import tempfile
+import threading
+
+from logs import get_logger
+
+# Configuration
+GREETING_CACHE_ENABLED = os.getenv("GREETING_CACHE_ENABLED", "true").lower() == "true"
+GREETING_CACHE_DIR = os.getenv("GREETING_CACHE_DIR", "greeting_cache")
+GREETING_CACHE_MAX_ENTRIES = int(os.getenv("GREETING_CACHE_MAX_ENTRIES", 64))
+# Cached audio is sent to Twilio in chunks of this many ms, each followed by a mark
+GREETING_CHUNK_MS = int(os.getenv("GREETING_CHUNK_MS", 100))
+
+ULAW_BYTES_PER_MS = 8
+
+log = get_logger(__name__)
+
+
+class CachedGreeting:
+    """A rendered greeting: memory-mapped g711 mu-law audio plus its transcript."""
+
+    def __init__(self, key, audio, transcript):
+        self.key = key
+        self.audio = audio
+        self.transcript = transcript
+
+    def chunks(self, chunk_ms=GREETING_CHUNK_MS):
+        """Base64 payloads ready for Twilio `media` frames."""
+        size = chunk_ms * ULAW_BYTES_PER_MS
+        for offset in range(0, len(self.audio), size):
+            yield base64.b64encode(self.audio[offset : offset + size]).decode("ascii")
+
+
+class GreetingRecorder:
+    """Collects the audio deltas of one greeting response so it can be cached."""
+
+    def __init__(self, cache, text, voice):
+        self.cache = cache
+        self.text = text
+        self.voice = voice
+        self._chunks = []
+
+    def add_delta(self, delta):
+        self._chunks.append(base64.b64decode(delta))
+
+    async def save(self, transcript):
+        audio = b"".join(self._chunks)
+        self._chunks = []
+        if audio and transcript:
+            await asyncio.to_thread(
+                self.cache.store, self.text, self.voice, audio, transcript
+            )
+
+
+class GreetingCache:
+    """On-disk cache of greeting audio keyed by greeting text and voice.
+
+    The first call with a given greeting records the model's g711 mu-law output;
+    later calls stream the memory-mapped file straight to Twilio instead of
+    asking the model to render the same audio again.
+
+    An entry is `<key>.ulaw` plus `<key>.json`, each written to its own
+    temporary file and renamed into place, metadata last. The metadata
+    carries the audio's size and digest, so audio and transcript from two
+    concurrent renderings (threads or worker processes) are never paired:
+    a mismatched entry reads as a miss, and a valid one is never overwritten.
+    """
+
+    def __init__(self, directory=GREETING_CACHE_DIR, max_entries=GREETING_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._loaded = dict()
+        # store() and _prune() run in worker threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, voice):
+        return hashlib.sha256(f"{voice}\0{text}".encode()).hexdigest()[:32]
+
+    def get(self, text, voice):
+        """The cached greeting for this text and voice, or None."""
+        key = self.key(text, voice)
+        with self._lock:
+            greeting = self._loaded.get(key)
+        if greeting is not None:
+            return greeting
+        greeting = self._read(key)
+        if greeting is not None:
+            with self._lock:
+                self._loaded[key] = greeting
+        return greeting
+
+    def recorder(self, text, voice):
+        return GreetingRecorder(self, text, voice)
+
+    def store(self, text, voice, audio, transcript):
+        """Write a rendered greeting atomically (blocking; run off the event loop).
+
+        The first complete rendering wins; a later one for the same key is dropped.
+        """
+        key = self.key(text, voice)
+        os.makedirs(self.directory, exist_ok=True)
+        if self._read(key) is not None:
+            return
+        base = os.path.join(self.directory, key)
+        meta = {
+            "text": text,
+            "voice": voice,
+            "transcript": transcript,
+            "bytes": len(audio),
+            "sha256": hashlib.sha256(audio).hexdigest(),
+        }
+        self._write(base + ".ulaw", audio)
+        self._write(base + ".json", json.dumps(meta).encode())
+        log.info("greeting.cached", voice=voice, bytes=len(audio))
+        self._prune()
+
+    def _read(self, key):
+        """The entry on disk if its audio matches its metadata, else None."""
+        base = os.path.join(self.directory, key)
+        try:
+            with open(base + ".json", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(base + ".ulaw", "rb") as audio_file:
+                audio = mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(audio) != meta.get("bytes") or hashlib.sha256(audio).hexdigest() != meta.get("sha256"):
+            # Torn or mixed with another rendering; rewritten by the next recording
+            audio.close()
+            return None
+        return CachedGreeting(key, audio, meta["transcript"])
+
+    def _write(self, path, data):
+        """Write to a temporary file of this writer's own, then rename it into place."""
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+
+    def _prune(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        # Pruned by another worker meanwhile
+                        continue
+            entries.sort()
+            for _, path in entries[: max(len(entries) - self.max_entries, 0)]:
+                base = path[: -len(".json")]
+                self._loaded.pop(os.path.basename(base), None)
+                for suffix in (".json", ".ulaw"):
+                    try:
+                        os.remove(base + suffix)
+                    except OSError:
+                        pass
+
+
+greeting_cache = GreetingCache()
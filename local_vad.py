@@ -0,0 +1,143 @@
+import os
+import math
+import base64
+
+from logs import get_logger
+
+# Configuration
+LOCAL_VAD_ENABLED = os.getenv("LOCAL_VAD_ENABLED", "false").lower() == "true"
+# Frames louder than the tracked noise floor by this margin count as speech...
+LOCAL_VAD_NOISE_MARGIN_DB = float(os.getenv("LOCAL_VAD_NOISE_MARGIN_DB", 15))
+# ...as long as they are also above this absolute level
+LOCAL_VAD_MIN_LEVEL_DB = float(os.getenv("LOCAL_VAD_MIN_LEVEL_DB", -45))
+# Noise-like frames (hiss, line noise) cross zero on more than this share of samples
+LOCAL_VAD_MAX_ZCR = float(os.getenv("LOCAL_VAD_MAX_ZCR", 0.4))
+# Speech must last this long before it counts as a barge-in
+LOCAL_VAD_MIN_SPEECH_MS = int(os.getenv("LOCAL_VAD_MIN_SPEECH_MS", 80))
+# Silence needed before a new onset can be reported
+LOCAL_VAD_HANGOVER_MS = int(os.getenv("LOCAL_VAD_HANGOVER_MS", 300))
+# How long to wait for the server's speech_started before treating a
+# local barge-in as a false positive and resuming the response
+LOCAL_VAD_CONFIRM_TIMEOUT = float(os.getenv("LOCAL_VAD_CONFIRM_TIMEOUT", 1.5))
+
+ULAW_BYTES_PER_MS = 8
+FULL_SCALE = 32768.0
+
+log = get_logger(__name__)
+
+# NumPy is optional, and only imported once local VAD is used; without it
+# local barge-in detection stays off
+np = None
+_ULAW_TO_PCM = None
+
+
+def _ulaw_table():
+    """g711 mu-law byte -> 16-bit linear PCM, for all 256 codes."""
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+def load_numpy():
+    """Import NumPy and build the decode table on first use; False if it is not installed."""
+    global np, _ULAW_TO_PCM
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+        _ULAW_TO_PCM = _ulaw_table()
+    return True
+
+
+def ulaw_to_pcm(data):
+    """Decode g711 mu-law bytes to an int16 array with one table lookup."""
+    return _ULAW_TO_PCM[np.frombuffer(data, dtype=np.uint8)]
+
+
+def frame_features(pcm):
+    """Level in dBFS and zero-crossing rate of one frame of PCM samples.
+
+    Frames too short to measure (empty, or a single sample with no crossing
+    to count) come out as silence rather than dividing by zero.
+    """
+    samples = pcm.astype(np.float32)
+    energy = float(np.dot(samples, samples)) / max(len(samples), 1)
+    level_db = 10 * math.log10(energy / (FULL_SCALE * FULL_SCALE) + 1e-12)
+    signs = np.signbit(pcm)
+    zcr = np.count_nonzero(signs[1:] != signs[:-1]) / max(len(pcm) - 1, 1)
+    return level_db, zcr
+
+
+class LocalVoiceDetector:
+    """Energy/zero-crossing voice activity detector for inbound Twilio audio.
+
+    Azure's server VAD only reports `speech_started` after the caller's audio
+    has gone upstream and the event has come back. Running a cheap detector
+    on the same frames locally lets the relay stop the bot's playback a
+    network round trip earlier.
+    """
+
+    def __init__(
+        self,
+        noise_margin_db=LOCAL_VAD_NOISE_MARGIN_DB,
+        min_level_db=LOCAL_VAD_MIN_LEVEL_DB,
+        max_zcr=LOCAL_VAD_MAX_ZCR,
+        min_speech_ms=LOCAL_VAD_MIN_SPEECH_MS,
+        hangover_ms=LOCAL_VAD_HANGOVER_MS,
+    ):
+        if not load_numpy():
+            raise RuntimeError("Local VAD requires numpy")
+        self.noise_margin_db = noise_margin_db
+        self.min_level_db = min_level_db
+        self.max_zcr = max_zcr
+        self.min_speech_ms = min_speech_ms
+        self.hangover_ms = hangover_ms
+        self.noise_floor_db = min_level_db - noise_margin_db
+        self.in_speech = False
+        self._speech_ms = 0.0
+        self._silence_ms = 0.0
+
+    def is_speech(self, level_db, zcr):
+        threshold = max(self.noise_floor_db + self.noise_margin_db, self.min_level_db)
+        return level_db >= threshold and zcr <= self.max_zcr
+
+    def feed(self, payload):
+        """Process one base64 mu-law frame; True exactly when speech starts."""
+        audio = base64.b64decode(payload)
+        if not audio:
+            return False
+        frame_ms = len(audio) / ULAW_BYTES_PER_MS
+        level_db, zcr = frame_features(ulaw_to_pcm(audio))
+
+        if not self.is_speech(level_db, zcr):
+            # Track the noise floor quickly downwards and slowly upwards
+            rate = 0.5 if level_db < self.noise_floor_db else 0.02
+            self.noise_floor_db += rate * (level_db - self.noise_floor_db)
+            self._speech_ms = 0.0
+            self._silence_ms += frame_ms
+            if self._silence_ms >= self.hangover_ms:
+                self.in_speech = False
+            return False
+
+        self._silence_ms = 0.0
+        self._speech_ms += frame_ms
+        if not self.in_speech and self._speech_ms >= self.min_speech_ms:
+            self.in_speech = True
+            return True
+        return False
+
+
+# Loaded at import when enabled, so the first call does not pay for it
+if LOCAL_VAD_ENABLED and not load_numpy():
+    log.warning("local_vad.unavailable", reason="numpy is not installed; using server VAD only")
+
+
+def create_local_vad():
+    """A detector for one call, or None when local VAD is off or unavailable."""
+    if not LOCAL_VAD_ENABLED or np is None:
+        return None
+    return LocalVoiceDetector()
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+# Configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one JSON object per line, "text" for a human-readable line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; beyond this they are dropped, never blocked on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Per-event sampling below WARNING, e.g. "upstream.event=0.1,agent.message=1"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "upstream.event=0.1")
+# Records per second allowed for each event (burst of the same size)
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", 50))
+# Per-event overrides, e.g. "relay.error=5"
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "")
+
+# Per-call fields (call_sid, stream_sid) attached to every record logged from
+# that call's tasks. The dict is shared, so setting stream_sid later is seen
+# by tasks that were already running.
+call_context = contextvars.ContextVar("call_context", default=None)
+
+_stats = {"queued": 0, "dropped_queue_full": 0, "sampled_out": 0, "rate_limited": 0}
+_listener = None
+
+
+def _parse_rates(spec):
+    rates = dict()
+    for pair in spec.split(","):
+        if "=" in pair:
+            name, value = pair.split("=", 1)
+            rates[name.strip()] = float(value)
+    return rates
+
+
+def bind_call(**fields):
+    """Start tagging records from the current task (and tasks it creates) with `fields`."""
+    context = dict(fields)
+    call_context.set(context)
+    return context
+
+
+def update_call(**fields):
+    """Add fields, e.g. stream_sid once the Twilio `start` arrives."""
+    context = call_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class StructuredLogger:
+    """Thin wrapper over a stdlib logger: `log.info("event.name", key=value, ...)`."""
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def _log(self, level, event, fields, exc_info=None):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+
+class SamplingFilter(logging.Filter):
+    """Per-event sampling (below WARNING) and token-bucket rate limits.
+
+    Runs on the logging thread of the caller, so dropped records cost no
+    formatting and never reach the queue.
+    """
+
+    def __init__(self, sample_rates=None, rate_limit=LOG_RATE_LIMIT, rate_limits=None):
+        super().__init__()
+        self.sample_rates = sample_rates or dict()
+        self.rate_limit = rate_limit
+        self.rate_limits = rate_limits or dict()
+        self._buckets = dict()
+
+    def filter(self, record):
+        event = record.msg
+        if record.levelno < logging.WARNING:
+            rate = self.sample_rates.get(event)
+            if rate is not None and random.random() >= rate:
+                _stats["sampled_out"] += 1
+                return False
+        limit = self.rate_limits.get(event, self.rate_limit)
+        if limit <= 0:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(event, (limit, now))
+        tokens = min(limit, tokens + (now - updated) * limit)
+        if tokens < 1:
+            self._buckets[event] = (tokens, now)
+            _stats["rate_limited"] += 1
+            return False
+        self._buckets[event] = (tokens - 1, now)
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current call's fields onto the record before it leaves the task."""
+
+    def filter(self, record):
+        record.call = call_context.get()
+        if record.call is not None:
+            record.call = dict(record.call)
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full."""
+
+    def prepare(self, record):
+        # Formatting happens on the writer thread; only freeze the exception text here
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _stats["queued"] += 1
+        except queue.Full:
+            _stats["dropped_queue_full"] += 1
+
+
+def _record_fields(record):
+    fields = dict(getattr(record, "call", None) or {})
+    fields.update(getattr(record, "fields", None) or {})
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(_record_fields(record))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={value}" for key, value in _record_fields(record).items())
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, stream=None):
+    """Route all logging through a bounded queue to a writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(
+        SamplingFilter(_parse_rates(LOG_SAMPLE_RATES), LOG_RATE_LIMIT, _parse_rates(LOG_RATE_LIMITS))
+    )
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread.
+
+    The root logger then writes to the output directly, so records logged
+    later in shutdown are not left in a queue nobody reads.
+    """
+    global _listener
+    if _listener is None:
+        return
+    output = _listener.handlers[0]
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler) and handler.queue is _listener.queue:
+            direct = logging.StreamHandler(output.stream)
+            direct.setFormatter(output.formatter)
+            for record_filter in handler.filters:
+                direct.addFilter(record_filter)
+            # Swapped before the stop so nothing is logged into the stopped queue
+            root.addHandler(direct)
+            root.removeHandler(handler)
+    _listener.stop()
+    _listener = None
+
+
+def logging_stats():
+    stats = dict(_stats)
+    handlers = logging.getLogger().handlers
+    stats["queue_depth"] = handlers[0].queue.qsize() if handlers and isinstance(handlers[0], QueueHandler) else 0
+    return stats
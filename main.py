@@ -1,26 +1,85 @@
 import os
 import json
 import time
-import base64
-import aiohttp
+import uuid
 import asyncio
 import websockets
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.websockets import WebSocketDisconnect
 from twilio.twiml.voice_response import VoiceResponse, Connect, Say, Stream
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from tools import tavily_search_tool_json, tavily_search
+from logs import setup_logging, stop_logging, get_logger, bind_call, update_call, logging_stats
+
+# Route all logging through the queue-backed writer thread before anything logs
+setup_logging()
+
+from webhook_client import webhook_client
+from caller_profiles import caller_profiles, DEFAULT_FIRST_MESSAGE
+from realtime_pool import RealtimeConnectionPool
+from outbox import Outbox, OUTBOX_PATH
+from greeting_cache import greeting_cache, GREETING_CACHE_ENABLED
+from local_vad import create_local_vad, LOCAL_VAD_CONFIRM_TIMEOUT
+from events import EventDispatcher
+from relay import (
+    BoundedAudioQueue,
+    PlaybackTracker,
+    OutboundPacer,
+    RELAY_INBOUND_MAX_MS,
+    RELAY_INBOUND_OVERFLOW,
+    RELAY_OUTBOUND_MAX_MS,
+    RELAY_OUTBOUND_OVERFLOW,
+)
+from session_store import create_session_store
+from upstream_router import upstream_router, AZURE_OPENAI_ENDPOINTS, AZURE_OPENAI_API_KEYS
+from transcripts import TurnLog, transcript_sink, TRANSCRIPT_PATH
+from recordings import call_recorder
+from captures import capture_writer
+from caller_history import caller_history
+from workers import (
+    WORKERS,
+    WORKER_INDEX,
+    WorkerSupervisor,
+    hand_off_media_stream,
+    stream_path,
+    worker_sockets,
+)
+from upstream_recovery import UpstreamReconnector, replay_items, UPSTREAM_RECONNECT_BUFFER_MS
+from admission import (
+    admission,
+    DrainingServer,
+    ADMISSION_OVERFLOW_URL,
+    ADMISSION_OVERFLOW_MESSAGE,
+    DRAIN_TIMEOUT,
+)
+from metrics import (
+    registry as metrics_registry,
+    export_stats,
+    monitor_event_loop_lag,
+    CallTimer,
+    CALLS_TOTAL,
+    ACTIVE_CALLS,
+    CALLER_LOOKUP_SECONDS,
+    LOCAL_VAD_LEAD_SECONDS,
+    LOCAL_VAD_TRIGGERS,
+    RELAY_FRAME_SECONDS,
+)
+from audio_codec import (
+    media_frame,
+    mark_frame,
+    clear_frame,
+    payload_ms,
+    UpstreamAudioCoalescer,
+)
+from tools import tool_registry
 
 # Configuration
 # OPENAI_ENDPOINT_URL = os.getenv("OPENAI_ENDPOINT_URL")
 # OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-MAKE_WEBHOOK_URL = os.getenv("MAKE_WEBHOOK_URL")
 PORT = int(os.getenv("PORT", 5050))
 SYSTEM_MESSAGE = """\
 You are Ada, a helpful wedding assistant created by A (groom) for his and B's (bride) wedding on June 27th, 2025.
@@ -46,29 +105,61 @@ Response guidelines:
 - Include appropriate humor when fitting\
 """
 VOICE = "alloy"
+# Event types logged by name; handlers log details for the ones they process
 LOG_EVENT_TYPES = [
-    "error",
     "response.content.done",
-    "rate_limits.updated",
-    "response.done",
     "input_audio_buffer.committed",
     "input_audio_buffer.speech_stopped",
     "input_audio_buffer.speech_started",
     "session.created",
 ]
-SHOW_TIMING_MATH = False
-
-# Session management - store session data
-sessions = dict()
-
-app = FastAPI()
-
-if not AZURE_OPENAI_API_KEY:
+SHOW_TIMING_MATH = os.getenv("SHOW_TIMING_MATH", "false").lower() == "true"
+# Bearer token for the operational endpoints (drain/resume, /debug/calls); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+log = get_logger("main")
+
+# Session management - store session data (in-process or shared, see SESSION_STORE_URL)
+session_store = create_session_store()
+
+# Strong references to fire-and-forget tasks
+background_tasks = set()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await webhook_client.start()
+    await realtime_pool.start()
+    await transcript_outbox.start()
+    await session_store.start()
+    await transcript_sink.start()
+    await call_recorder.start()
+    await caller_history.start()
+    spawn_background(monitor_event_loop_lag())
+    # Tool SDKs and clients load in a thread once requests are being served
+    spawn_background(tool_registry.warm_up())
+    yield
+    await realtime_pool.close()
+    await session_store.close()
+    await transcript_sink.close()
+    await call_recorder.close()
+    await capture_writer.close()
+    await caller_history.close()
+    await transcript_outbox.close()
+    await webhook_client.close()
+    for task in list(background_tasks):
+        task.cancel()
+    stop_logging()
+
+
+app = FastAPI(lifespan=lifespan)
+
+if not AZURE_OPENAI_API_KEYS:
     raise ValueError(
         "Missing the Azure OpenAI API key. Please set it in the .env file."
     )
 
-if not AZURE_OPENAI_ENDPOINT:
+if not AZURE_OPENAI_ENDPOINTS:
     raise ValueError(
         "Missing the Azure OpenAI Endpoint URL. Please set it in the .env file."
     )
@@ -79,9 +170,90 @@ async def index_page():
     return {"message": "Twilio Media Stream Server is running!"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_page():
+    """Prometheus-format latency histograms, call gauges and component stats."""
+    return PlainTextResponse(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/admission", response_class=JSONResponse)
+async def admission_status():
+    """Admission state; 503 while draining or full, for load-balancer readiness checks."""
+    return JSONResponse(
+        admission.stats(), status_code=200 if admission.accepting() else 503
+    )
+
+
+@app.post("/admission/drain", response_class=JSONResponse)
+async def admission_drain(request: Request, wait: bool = False, timeout: float = DRAIN_TIMEOUT):
+    """Stop admitting calls; with ?wait=true, return once the active calls have ended."""
+    if not is_admin(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    if wait:
+        drained = await admission.drain(timeout)
+    else:
+        admission.start_drain()
+        drained = admission.active == 0 and admission.reserved == 0
+    return {"drained": drained, **admission.stats()}
+
+
+@app.post("/admission/resume", response_class=JSONResponse)
+async def admission_resume(request: Request):
+    if not is_admin(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    admission.resume()
+    return admission.stats()
+
+
+def is_admin(request):
+    return bool(ADMIN_TOKEN) and request.headers.get("authorization") == f"Bearer {ADMIN_TOKEN}"
+
+
+@app.get("/upstreams", response_class=JSONResponse)
+async def upstreams_status():
+    """Per-deployment health, rate-limit budget and open connections."""
+    return {"deployments": upstream_router.stats()}
+
+
+@app.get("/debug/calls", response_class=JSONResponse)
+async def debug_calls(request: Request):
+    """Relay state of every call this process is streaming (admin only: includes caller numbers)."""
+    if not is_admin(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    return {"calls": [call.snapshot() for call in active_calls]}
+
+
+def collect_component_stats():
+    upstream_router.export_metrics()
+    export_stats("admission", admission.stats())
+    export_stats("webhook_client", webhook_client.stats())
+    export_stats("realtime_pool", realtime_pool.stats())
+    export_stats("transcript_outbox", transcript_outbox.stats())
+    export_stats("transcript_sink", transcript_sink.stats())
+    export_stats("call_recorder", call_recorder.stats())
+    export_stats("capture_writer", capture_writer.stats())
+    export_stats("caller_history", caller_history.stats())
+    export_stats("logging", logging_stats())
+
+
+metrics_registry.add_collector(collect_component_stats)
+
+
 @app.api_route("/incoming-call", methods=["GET", "POST"])
 async def handle_incoming_call(request: Request):
     """Handle incoming call and return TwiML response to connect to Media Stream."""
+    # Collect call info
+    form_data = await request.form()
+    caller_number = form_data.get("From", "Unknown")
+    session_id = form_data.get("CallSid")
+    log.info("call.incoming", call_sid=session_id, caller_number=caller_number)
+
+    refusal = admission.admit_call(session_id)
+    if refusal is not None:
+        return overflow_response(request)
+
     response = VoiceResponse()
     # <Say> punctuation to improve text-to-speech flow
     response.say("Please wait while we connect your call to the AI voice assistant.")
@@ -91,75 +263,36 @@ async def handle_incoming_call(request: Request):
     )
     host = request.url.hostname
     connect = Connect()
-    stream = connect.stream(url=f"wss://{host}/media-stream")
-
-    # Collect call info
-    form_data = await request.form()
-    caller_number = form_data.get("From", "Unknown")
-    session_id = form_data.get("CallSid")
-    print(f"Caller Number: {caller_number}")
-    print(f"Session Id (CallSid): {session_id}")
-
-    first_message = (
-        "Greet the user with 'Hello there! Welcome to Aslan and Bingru's wedding celebration! "
-        "Thank you so much for being an important part of their journey together. "
-        "I am Ada, an AI voice assistant created by Aslan. "
-        "I'm here to tell you about a fun game you'll get to play on the wedding day! "
-        "May I first know your name, please?'"
-    )
-
-    # Send the caller's number to Make.com webhook to get a personalized first message
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                MAKE_WEBHOOK_URL,
-                headers={"Content-Type": "application/json"},
-                json={
-                    "route": "1",
-                    "data1": caller_number,
-                    "data2": "",  # Extra data (not used here)
-                },
-            ) as webhook_response:
-
-                print(f"Webhook response status: {webhook_response.status}")
-
-                if webhook_response.ok:
-                    webhook_response_text = await webhook_response.text()
-                    print(f"Webhook response: {webhook_response_text}")
-                    try:
-                        webhook_response_data = json.loads(webhook_response_text)
-                        if webhook_response_data and webhook_response_data.get(
-                            "firstMessage"
-                        ):
-                            first_message = webhook_response_data["firstMessage"]
-                            print("Parsed firstMessage from Make.com:", first_message)
-                    except json.JSONDecodeError as parse_error:
-                        print(
-                            "Error parsing webhook response:", parse_error
-                        )  # Log any errors while parsing the response
-                        first_message = (
-                            webhook_response_text.strip()
-                        )  # Use the plain text response if parsing fails
-                else:
-                    error_msg = (
-                        f"Failed to send data to webhook: {webhook_response.reason}"
-                    )
-                    print(error_msg)
-
-    except Exception as error:
-        print(f"Error sending data to webhook: {str(error)}")
+    # With several workers, the path routes the stream back to this one
+    stream = connect.stream(url=f"wss://{host}{stream_path()}")
+
+    CALLS_TOTAL.inc()
+    history = caller_history.get(caller_number)
+    if history is not None:
+        # A returning caller: their local summary replaces the Make.com history
+        first_message, pending_lookup = caller_history.first_message(history), None
+    else:
+        # Look up a personalized first message (cached, bounded by a latency budget)
+        lookup_start = time.perf_counter()
+        first_message, pending_lookup = await caller_profiles.lookup(caller_number)
+        CALLER_LOOKUP_SECONDS.observe(time.perf_counter() - lookup_start)
+    if first_message is None:
+        first_message = DEFAULT_FIRST_MESSAGE
 
     # Update sessions
     session = {
-        "transcript": "",
         "caller_number": caller_number,
         "first_message": first_message,
     }
-    sessions.update({session_id: session})
+    await session_store.set(session_id, session)
+
+    if pending_lookup is not None:
+        # The lookup finishes after the TwiML is returned; deliver the
+        # personalized greeting to the session before `start` arrives
+        spawn_background(deliver_first_message(session_id, pending_lookup))
 
-    # Add customer parameters
-    # TODO: not actually used in the later functions
-    # as long as later it could locate the correct session
+    # Add custom parameters: the stream's `start` falls back to them
+    # when the session store no longer has the session
     stream.parameter(name="caller_number", value=caller_number)
     stream.parameter(name="first_message", value=first_message)
     response.append(connect)
@@ -167,299 +300,734 @@ async def handle_incoming_call(request: Request):
     return HTMLResponse(content=str(response), media_type="application/xml")
 
 
-@app.websocket("/media-stream")
-async def handle_media_stream(websocket: WebSocket):
-    """Handle WebSocket connections between Twilio and Azure OpenAI."""
-    print("Client connected")
-    await websocket.accept()
+def overflow_response(request):
+    """TwiML for a refused call: redirect it to another instance, or apologize and hang up."""
+    response = VoiceResponse()
+    # A call that was already redirected once is not bounced again
+    if ADMISSION_OVERFLOW_URL and "overflow" not in request.query_params:
+        separator = "&" if "?" in ADMISSION_OVERFLOW_URL else "?"
+        response.redirect(f"{ADMISSION_OVERFLOW_URL}{separator}overflow=1")
+    else:
+        response.say(ADMISSION_OVERFLOW_MESSAGE)
+        response.hangup()
+    return HTMLResponse(content=str(response), media_type="application/xml")
+
 
-    # Use Twilio's CallSid as the session ID or create a new one based on the timestamp
-    # TODO: headers don't contain the call sid, so it always uses timestamp
-    # which results in creating a session overwritting the previous one every time
-    # and thus losing caller number and first message
-    # currently skipping this retriving Call Sid again during the `start` event
-    session_id = (
-        websocket.headers.get("x-twilio-call-sid") or f"session_{int(time.time())}"
+@app.websocket("/media-stream/{worker}")
+async def handle_worker_media_stream(websocket: WebSocket, worker: int):
+    """Serve a media stream on the worker that answered its /incoming-call."""
+    if WORKER_INDEX is not None and worker != WORKER_INDEX:
+        if await hand_off_media_stream(websocket, worker):
+            return
+    await handle_media_stream(websocket)
+
+
+# Streams being relayed right now, listed by GET /debug/calls
+active_calls = set()
+inbound_frame_seconds = RELAY_FRAME_SECONDS.labels("inbound")
+outbound_frame_seconds = RELAY_FRAME_SECONDS.labels("outbound")
+
+
+class CallState:
+    """One media stream's state, and the relay steps that act on it.
+
+    The Twilio receive loop, the upstream event handlers (the `on_*`
+    methods, dispatched by event type), the pacer and the inbound forwarder
+    all work on this one slotted object; `snapshot()` is what GET
+    /debug/calls reports for the call.
+    """
+
+    __slots__ = (
+        "websocket",
+        "openai_ws",
+        "session_id",
+        "caller_number",
+        "first_message",
+        "connected_at",
+        "loop",
+        "stream_sid",
+        "latest_media_timestamp",
+        "last_assistant_item",
+        "response_start_timestamp_twilio",
+        "response_in_progress",
+        "call_timer",
+        "turn_log",
+        "capture",
+        "recording",
+        "history_item",
+        "upstream_audio",
+        "inbound_audio",
+        "outbound_audio",
+        "playback",
+        "pacer",
+        "inbound_forwarder",
+        "upstream_events",
+        "tool_tasks",
+        "greeting_recorder",
+        "cached_greeting_item",
+        "local_vad",
+        "local_barge_in_at",
+        "local_barge_in_item",
+        "local_barge_in_cancelled",
+        "local_barge_in_watch",
+        "upstream_ready",
+        "upstream_connect",
+        "opening_items",
+        "reconnector",
+        "twilio_closed",
     )
 
-    # Get the session data or create a new session
-    # Currently not used as explained above
-    session = sessions.get(session_id) or {"transcript": ""}
-    # sessions.update({session_id: session})
+    # Upstream event type -> the method that handles it
+    UPSTREAM_HANDLERS = {
+        "response.audio.delta": "on_audio_delta",
+        "input_audio_buffer.speech_stopped": "on_speech_stopped",
+        "input_audio_buffer.speech_started": "on_speech_started",
+        "response.done": "on_response_done",
+        "conversation.item.input_audio_transcription.completed": "on_user_transcript",
+        "response.function_call_arguments.done": "on_function_call",
+        "rate_limits.updated": "on_rate_limits",
+        "error": "on_error",
+    }
 
-    async with websockets.connect(
-        AZURE_OPENAI_ENDPOINT,
-        extra_headers={
-            "api-key": AZURE_OPENAI_API_KEY,
-        },
-    ) as openai_ws:
-        await initialize_session(openai_ws)
-
-        # Connection specific state
-        stream_sid = None
-        latest_media_timestamp = 0
-        last_assistant_item = None
-        mark_queue = []
-        response_start_timestamp_twilio = None
-
-        async def send_first_message(first_message):
-            """Send first message using webhook results"""
-            print("Sending first message:", first_message)
-            await openai_ws.send(json.dumps(first_message))
-            await openai_ws.send(json.dumps({"type": "response.create"}))
-
-        async def receive_from_twilio():
-            """Receive audio data from Twilio and send it to the OpenAI Realtime API."""
-            nonlocal stream_sid, latest_media_timestamp, session, session_id
-            try:
-                async for message in websocket.iter_text():
-                    data = json.loads(message)
-                    if data["event"] == "media" and openai_ws.open:
-                        latest_media_timestamp = int(data["media"]["timestamp"])
-                        audio_append = {
-                            "type": "input_audio_buffer.append",
-                            "audio": data["media"]["payload"],
-                        }
-                        await openai_ws.send(json.dumps(audio_append))
-
-                    elif data["event"] == "start":
-                        stream_sid = data["start"]["streamSid"]
-                        print(f"Incoming stream has started {stream_sid}")
-                        response_start_timestamp_twilio = None
-                        latest_media_timestamp = 0
-                        last_assistant_item = None
-
-                        # Get call sid
-                        call_sid = data["start"]["callSid"]
-                        session_id = call_sid
-                        session = sessions[session_id]
-
-                        # Prepare the first message
-                        first_message = session.get(
-                            "first_message",
-                            "Greet the user with 'Hello there! Welcome to Aslan and Bingru's wedding celebration! Thank you so much for being an important part of their journey together. I am Ada, an AI voice assistant created by Aslan. I'm here to tell you about a fun game you'll get to play on the wedding day! May I first know your name, please?'",
-                        )
-                        queued_first_message = {
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "message",
-                                "role": "user",
-                                "content": [
-                                    {"type": "input_text", "text": first_message}
-                                ],
-                            },
-                        }
-                        await send_first_message(queued_first_message)
-                        del queued_first_message
-
-                    elif data["event"] == "mark":
-                        if mark_queue:
-                            mark_queue.pop(0)
-            except WebSocketDisconnect:
-                print("WebSocketDisconnect exception caught")  # Debug log
-                print(f"Client disconnected ({session_id}).")
-                print(f"Full transcript ({session_id}):\n{session['transcript']}")
-                if openai_ws.open:
-                    await openai_ws.close()
-
-                await send_to_webhook(
-                    {
-                        "route": "2",
-                        "data1": session["caller_number"],
-                        "data2": session["transcript"],
-                    }
+    def __init__(self, websocket, session_id):
+        self.websocket = websocket
+        # Acquired in the background while `start` is handled (see connect_upstream)
+        self.openai_ws = None
+        self.session_id = session_id
+        # Both come from the session once `start` names the call
+        self.caller_number = None
+        self.first_message = None
+        self.connected_at = time.time()
+        self.loop = asyncio.get_running_loop()
+        self.stream_sid = None
+        self.latest_media_timestamp = 0
+        self.last_assistant_item = None
+        self.response_start_timestamp_twilio = None
+        self.response_in_progress = False
+        self.call_timer = CallTimer()
+        # Structured transcript, streamed to the transcript sink as turns complete
+        self.turn_log = TurnLog(session_id, transcript_sink)
+        # Raw event streams for offline replay (None unless CAPTURE_ENABLED samples this call)
+        self.capture = capture_writer.open()
+        # Dual-leg recording of the call (None unless RECORDING_ENABLED)
+        self.recording = None
+        # A returning caller's summary, sent ahead of the first message (and on reconnect)
+        self.history_item = None
+        self.upstream_audio = UpstreamAudioCoalescer(None)
+        # Bounded per-direction buffers; response audio is paced to Twilio
+        self.inbound_audio = BoundedAudioQueue(
+            "inbound", RELAY_INBOUND_MAX_MS, RELAY_INBOUND_OVERFLOW
+        )
+        self.outbound_audio = BoundedAudioQueue(
+            "outbound", RELAY_OUTBOUND_MAX_MS, RELAY_OUTBOUND_OVERFLOW
+        )
+        self.playback = PlaybackTracker()
+        self.pacer = OutboundPacer(self.outbound_audio, self.playback, self.send_audio)
+        self.inbound_forwarder = None
+        self.upstream_events = EventDispatcher(LOG_EVENT_TYPES)
+        for event_type, handler in self.UPSTREAM_HANDLERS.items():
+            self.upstream_events.on(event_type, getattr(self, handler))
+        self.tool_tasks = set()
+        self.greeting_recorder = None
+        self.cached_greeting_item = None
+        # Local barge-in detection (None unless LOCAL_VAD_ENABLED)
+        self.local_vad = create_local_vad()
+        self.local_barge_in_at = None
+        self.local_barge_in_item = None
+        self.local_barge_in_cancelled = False
+        self.local_barge_in_watch = None
+        # Set once the upstream is connected and has the opening items; cleared
+        # while a dropped connection is being replaced
+        self.upstream_ready = asyncio.Event()
+        self.upstream_connect = None
+        # What `start` prepares for the upstream: summary, first message, greeting
+        self.opening_items = self.loop.create_future()
+        # Hold the caller's audio until the upstream is ready, as during a reconnect
+        self.inbound_audio.max_ms = UPSTREAM_RECONNECT_BUFFER_MS
+        self.reconnector = UpstreamReconnector(realtime_pool.acquire)
+        self.twilio_closed = False
+
+    async def run(self):
+        """Relay the call until Twilio hangs up (or the upstream is lost for good)."""
+        self.pacer.start()
+        self.upstream_connect = asyncio.create_task(self.connect_upstream())
+        self.inbound_forwarder = asyncio.create_task(self.forward_to_openai())
+        await asyncio.gather(self.receive_from_twilio(), self.send_to_twilio())
+
+    async def connect_upstream(self):
+        """Acquire the upstream socket while Twilio's `start` is handled, then send it the opening items.
+
+        A cached greeting starts playing as soon as `start` arrives; only the
+        caller's audio and the model's first response wait for the upstream.
+        """
+        openai_ws = await realtime_pool.acquire()
+        self.openai_ws = openai_ws
+        if self.twilio_closed:
+            await openai_ws.close()
+            return
+        self.upstream_audio.send = openai_ws.send
+        deployment = upstream_router.deployment_for(openai_ws)
+        if deployment is not None:
+            update_call(deployment=deployment.name)
+        # Cancelled by hang_up if Twilio leaves before `start`
+        for item in await self.opening_items:
+            if not await self.send_upstream(item):
+                # send_to_twilio reconnects and replays the opening from the turn log
+                return
+        self.upstream_ready.set()
+
+    async def close(self):
+        """Stop the call's background work and release what it holds."""
+        log.info("call.timings", **self.call_timer.samples)
+        for tool_task in list(self.tool_tasks):
+            tool_task.cancel()
+        if self.local_barge_in_watch is not None:
+            self.local_barge_in_watch.cancel()
+        if self.upstream_connect is not None:
+            self.upstream_connect.cancel()
+        self.pacer.close()
+        if self.inbound_forwarder is not None:
+            self.inbound_forwarder.cancel()
+        if self.recording is not None:
+            self.recording.close()
+        if self.capture is not None:
+            capture_writer.finish(self.capture)
+        if self.openai_ws is not None and self.openai_ws.open:
+            await self.openai_ws.close()
+
+    def snapshot(self):
+        """The call's relay state, for GET /debug/calls."""
+        deployment = upstream_router.deployment_for(self.openai_ws)
+        return {
+            "call_sid": self.session_id,
+            "stream_sid": self.stream_sid,
+            "caller_number": self.caller_number,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "deployment": deployment.name if deployment is not None else None,
+            "upstream_ready": self.upstream_ready.is_set(),
+            "media_timestamp_ms": self.latest_media_timestamp,
+            "last_assistant_item": self.last_assistant_item,
+            "response_start_ms": self.response_start_timestamp_twilio,
+            "response_in_progress": self.response_in_progress,
+            "inbound_queued_ms": self.inbound_audio.queued_ms,
+            "outbound_queued_ms": self.outbound_audio.queued_ms,
+            "playing": bool(self.playback),
+            "turns": self.turn_log.count,
+            "tool_calls": len(self.tool_tasks),
+            "local_barge_in": self.local_barge_in_at is not None,
+            "returning_caller": self.history_item is not None,
+            "recording": self.recording is not None,
+            "captured": self.capture is not None,
+        }
+
+    async def receive_from_twilio(self):
+        """Receive audio data from Twilio and send it to the OpenAI Realtime API."""
+        try:
+            async for message in self.websocket.iter_text():
+                frame_start = time.perf_counter()
+                if self.capture is not None:
+                    self.capture.add("twilio", message)
+                data = json.loads(message)
+                # Queued even while reconnecting upstream; forwarded once it is back
+                if data["event"] == "media":
+                    await self.on_media(data["media"], frame_start)
+                elif data["event"] == "start":
+                    await self.on_start(data["start"])
+                elif data["event"] == "mark":
+                    await self.flush_upstream_audio()
+                    self.playback.acknowledged(self.loop.time())
+                elif data["event"] == "stop":
+                    await self.flush_upstream_audio()
+        except WebSocketDisconnect:
+            log.info("twilio.disconnected")
+        except Exception as e:
+            log.warning(
+                "twilio.disconnected_with_error",
+                error=str(e),
+                connection_closed=isinstance(e, websockets.exceptions.ConnectionClosed),
+            )
+        finally:
+            await self.hang_up()
+
+    async def on_media(self, media, frame_start):
+        payload = media["payload"]
+        # Track every frame's timestamp so truncation math stays
+        # exact even though audio goes upstream in larger chunks
+        self.latest_media_timestamp = int(media["timestamp"])
+        if self.recording is not None:
+            self.recording.caller(self.latest_media_timestamp, payload)
+        await self.inbound_audio.put(payload, payload_ms(payload))
+        if self.local_vad is not None and self.local_vad.feed(payload):
+            await self.handle_local_speech(frame_start)
+        inbound_frame_seconds.observe(time.perf_counter() - frame_start)
+
+    async def on_start(self, start):
+        self.stream_sid = start["streamSid"]
+        self.call_timer.stream_started()
+        self.response_start_timestamp_twilio = None
+        self.latest_media_timestamp = 0
+        self.last_assistant_item = None
+
+        # Get call sid
+        call_sid = start["callSid"]
+        self.session_id = call_sid
+        update_call(call_sid=call_sid, stream_sid=self.stream_sid)
+        log.info("stream.started")
+        self.turn_log.call_sid = call_sid
+        if self.capture is not None:
+            self.capture.call_sid = call_sid
+        self.recording = call_recorder.open_call(call_sid)
+        # The session may have been created by another worker;
+        # fall back to the TwiML custom parameters if it is gone
+        custom_parameters = start.get("customParameters", {})
+        session = await session_store.get(call_sid) or {
+            "caller_number": custom_parameters.get("caller_number"),
+            "first_message": custom_parameters.get("first_message", DEFAULT_FIRST_MESSAGE),
+        }
+        self.caller_number = session.get("caller_number")
+
+        # Prepare the first message, giving a late lookup a last chance
+        first_message = session.get("first_message", DEFAULT_FIRST_MESSAGE)
+        if caller_profiles.has_pending(self.caller_number):
+            await caller_profiles.wait_pending(self.caller_number)
+            late_first_message, _ = caller_profiles.get(self.caller_number)
+            if late_first_message:
+                first_message = late_first_message
+        self.first_message = first_message
+        opening_items = []
+        history = caller_history.get(self.caller_number)
+        if history is not None:
+            self.history_item = caller_history.prompt_item(history)
+            log.info(
+                "caller_history.injected",
+                calls=history.calls,
+                chars=len(self.history_item["item"]["content"][0]["text"]),
+            )
+            opening_items.append(self.history_item)
+        opening_items.append(
+            {
+                "type": "conversation.item.create",
+                "item": {
+                    "type": "message",
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": first_message}],
+                },
+            }
+        )
+        # A returning caller's greeting depends on their summary; never cache it
+        greeting_cacheable = GREETING_CACHE_ENABLED and self.history_item is None
+        greeting = greeting_cache.get(first_message, VOICE) if greeting_cacheable else None
+        if greeting is not None:
+            # Plays now; the model is told it was said once the upstream is ready
+            opening_items.append(await self.play_cached_greeting(greeting))
+        else:
+            if greeting_cacheable:
+                # Record this rendering for the next caller
+                self.greeting_recorder = greeting_cache.recorder(first_message, VOICE)
+            log.info("first_message.sent", cached_greeting=False)
+            opening_items.append({"type": "response.create"})
+        if not self.opening_items.done():
+            self.opening_items.set_result(opening_items)
+
+    async def hang_up(self):
+        """Twilio is gone: close the upstream and hand the transcript to the outbox."""
+        self.twilio_closed = True
+        self.opening_items.cancel()
+        self.upstream_audio.close()
+        # Rendered once, from the turn log
+        transcript = self.turn_log.render()
+        log.debug("call.transcript", transcript=transcript, turns=self.turn_log.count)
+        caller_history.record_call(self.caller_number, self.turn_log.turns)
+        try:
+            if self.openai_ws is not None and self.openai_ws.open:
+                await self.openai_ws.close()
+
+            # Only enqueue here; the outbox delivers (and retries) in the background
+            if self.caller_number:
+                transcript_outbox.enqueue(
+                    self.session_id,
+                    {"route": "2", "data1": self.caller_number, "data2": transcript},
                 )
-                if session_id in sessions:
-                    del sessions[session_id]
-            except Exception as e:
-                print(f"Exception details: {str(e)}")
-                if isinstance(e, websockets.exceptions.ConnectionClosed):
-                    print("Connection was closed")
-                print(f"Client disconnected with error ({session_id}).")
-                print("Full Transcript:")
-                print(session.get("transcript", ""))
-            finally:
-                print(f"Full transcript ({session_id}):\n{session['transcript']}")
-                try:
-                    if openai_ws.open:
-                        print("Closing OpenAI WebSocket")
-                        await openai_ws.close()
-
-                    await send_to_webhook(
-                        {
-                            "route": "2",
-                            "data1": session["caller_number"],
-                            "data2": session["transcript"],
-                        }
-                    )
-                    if session_id in sessions:
-                        print(f"Cleaning up session {session_id}")
-                        del sessions[session_id]
-                except Exception as cleanup_error:
-                    print(f"Error during cleanup: {cleanup_error}")
-
-        async def send_to_twilio():
-            """Receive events from the OpenAI Realtime API, send audio back to Twilio."""
-            nonlocal stream_sid, last_assistant_item, response_start_timestamp_twilio, session, session_id
+            log.info("call.cleanup")
+            await session_store.delete(self.session_id)
+        except Exception:
+            log.exception("call.cleanup_failed")
+
+    async def play_cached_greeting(self, greeting):
+        """Queue cached greeting audio for Twilio; returns the upstream item saying it was spoken."""
+        log.info("first_message.sent", cached_greeting=True, key=greeting.key)
+        greeting_ms = 0
+        for payload in greeting.chunks():
+            chunk_ms = payload_ms(payload)
+            greeting_ms += chunk_ms
+            await self.outbound_audio.put(payload, chunk_ms)
+        self.call_timer.audio_delta()
+        self.response_start_timestamp_twilio = self.latest_media_timestamp
+
+        self.cached_greeting_item = f"greeting_{uuid.uuid4().hex[:20]}"
+        self.last_assistant_item = self.cached_greeting_item
+        self.turn_log.add_audio(
+            self.cached_greeting_item, self.response_start_timestamp_twilio, greeting_ms
+        )
+        self.turn_log.add("agent", greeting.transcript, item_id=self.cached_greeting_item)
+        log.info("agent.message", text=greeting.transcript, cached=True)
+        # Injected upstream as already said, without response.create
+        return {
+            "type": "conversation.item.create",
+            "item": {
+                "id": self.cached_greeting_item,
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": greeting.transcript}],
+            },
+        }
+
+    async def send_to_twilio(self):
+        """Receive events from the OpenAI Realtime API and dispatch them by type."""
+        await asyncio.wait([self.upstream_connect])
+        if self.upstream_connect.cancelled() or self.twilio_closed:
+            return
+        if self.upstream_connect.exception() is not None:
+            log.error("upstream.connect_failed", error=str(self.upstream_connect.exception()))
+            # Hang up rather than leave the caller in silence
+            await self.websocket.close()
+            return
+        while True:
             try:
-                async for openai_message in openai_ws:
-                    response = json.loads(openai_message)
-                    if response["type"] in LOG_EVENT_TYPES:
-                        print(f"Received event: {response['type']}", response)
-
-                    if (
-                        response.get("type") == "response.audio.delta"
-                        and "delta" in response
-                    ):
-                        audio_payload = base64.b64encode(
-                            base64.b64decode(response["delta"])
-                        ).decode("utf-8")
-                        audio_delta = {
-                            "event": "media",
-                            "streamSid": stream_sid,
-                            "media": {"payload": audio_payload},
-                        }
-                        await websocket.send_json(audio_delta)
-
-                        if response_start_timestamp_twilio is None:
-                            response_start_timestamp_twilio = latest_media_timestamp
-                            if SHOW_TIMING_MATH:
-                                print(
-                                    f"Setting start timestamp for new response: {response_start_timestamp_twilio}ms"
-                                )
-
-                        # Update last_assistant_item safely
-                        if response.get("item_id"):
-                            last_assistant_item = response["item_id"]
-
-                        await send_mark(websocket, stream_sid)
-
-                    # Trigger an interruption. Your use case might work better using `input_audio_buffer.speech_stopped`, or combining the two.
-                    if response.get("type") == "input_audio_buffer.speech_started":
-                        print("Speech started detected.")
-                        if last_assistant_item:
-                            print(
-                                f"Interrupting response with id: {last_assistant_item}"
-                            )
-                            await handle_speech_started_event()
-
-                    # Log agent message
-                    if response.get("type") == "response.done":
-                        agent_msg = ""
-                        response_output = response.get("response", {}).get("output", [])
-                        if response_output:
-                            content_list = response_output[0].get("content", [])
-                            if content_list:
-                                agent_msg = content_list[0].get(
-                                    "transcript", "Assistant message not found"
-                                )
-                        else:
-                            agent_msg = "Assistant message not found"
-                        session["transcript"] += f"\nAgent: {agent_msg}\n"
-                        print(f"Agent ({session_id}): {agent_msg}")
-
-                    # Log user message
-                    if (
-                        response.get("type")
-                        == "conversation.item.input_audio_transcription.completed"
-                        and "transcript" in response
-                    ):
-                        user_msg = response.get(
-                            "transcript", "User message not found"
-                        ).strip()
-                        session["transcript"] += f"\nUser: {user_msg}\n"
-                        print(f"User ({session_id}): {user_msg}")
-
-                    if response.get("type") == "response.function_call_arguments.done":
-                        print(f"Function called: {response}")
-                        function_name = response.get("name")
-                        function_args = json.loads(response.get("arguments"))
-                        call_id = response.get("call_id")
-
-                        user_query = function_args.get("query")
-
-                        if function_name == "tavily_search":
-                            try:
-                                search_result = await tavily_search(**function_args)
-                                if search_result:
-                                    search_content = search_result[1]
-                                else:
-                                    search_content = (
-                                        "Sorry, no results found for that question."
-                                    )
-
-                                # Send function call result back to OpenAI
-                                function_output_event = {
-                                    "type": "conversation.item.create",
-                                    "item": {
-                                        "type": "function_call_output",
-                                        "output": search_content,
-                                        "call_id": call_id,
-                                    },
-                                }
-                                await openai_ws.send(json.dumps(function_output_event))
-                                print(
-                                    f"Sent function call result: {function_output_event}"
-                                )
-
-                                function_call_response_from_openai = {
-                                    "type": "response.create",
-                                    "response": {
-                                        "modalities": ["text", "audio"],
-                                        "instructions": f"Summarize the news and respond to the user's question {user_query} based on this news summary: {search_content}. Be concise and friendly. Do not use bullet points in your response.",
-                                    },
-                                }
-                                await openai_ws.send(
-                                    json.dumps(function_call_response_from_openai)
-                                )
-                            except Exception as e:
-                                print(f"Error calling function {function_name}: {e}")
-                                await send_error_response(openai_ws)
+                async for openai_message in self.openai_ws:
+                    if self.capture is not None:
+                        self.capture.add("upstream", openai_message)
+                    await self.upstream_events.dispatch(openai_message)
             except Exception as e:
-                print(f"Error in send_to_twilio: {e}")
-
-        async def handle_speech_started_event():
-            """Handle interruption when the caller's speech starts."""
-            nonlocal response_start_timestamp_twilio, last_assistant_item
-            print("Handling speech started event.")
-            if mark_queue and response_start_timestamp_twilio is not None:
-                elapsed_time = latest_media_timestamp - response_start_timestamp_twilio
+                log.warning("upstream.receive_failed", error=str(e))
+            if self.twilio_closed:
+                return
+            if self.openai_ws.open:
+                # A handler failed; keep relaying the connection
+                continue
+            if not await self.reconnect_upstream():
+                # Hang up rather than leave the caller in silence
+                await self.websocket.close()
+                return
+
+    async def reconnect_upstream(self):
+        """Replace a dropped upstream connection and replay the conversation into it."""
+        self.upstream_ready.clear()
+        # Hold the caller's audio for the gap instead of only the last second
+        self.inbound_audio.max_ms = UPSTREAM_RECONNECT_BUFFER_MS
+        log.warning("upstream.dropped", close_code=self.openai_ws.close_code)
+        # The response in flight is lost with the old conversation
+        self.response_in_progress = False
+        self.greeting_recorder = None
+        self.last_assistant_item = None
+
+        items = replay_items(self.first_message, self.turn_log.turns)
+        if self.history_item is not None:
+            items.insert(0, self.history_item)
+        new_ws = await self.reconnector.reconnect(items)
+        if new_ws is None:
+            return False
+        if self.twilio_closed:
+            await new_ws.close()
+            return False
+        self.openai_ws = new_ws
+        self.upstream_audio.send = new_ws.send
+        deployment = upstream_router.deployment_for(new_ws)
+        if deployment is not None:
+            update_call(deployment=deployment.name)
+        if items and items[-1]["item"]["role"] == "user":
+            # The caller was waiting for an answer when the connection dropped
+            if not await self.send_upstream({"type": "response.create"}):
+                # Dropped again; the caller keeps waiting for the next reconnect
+                return True
+        self.upstream_ready.set()
+        return True
+
+    async def on_audio_delta(self, response):
+        """Relay response audio to Twilio."""
+        if "delta" not in response:
+            return
+        item_id = response.get("item_id")
+        if item_id == self.local_barge_in_item:
+            # Interrupted locally; drop audio still in flight
+            return
+        self.response_in_progress = True
+        # The base64 mu-law delta is relayed to Twilio untouched,
+        # paced by the outbound pacer
+        delta_ms = payload_ms(response["delta"])
+        if not await self.outbound_audio.put(response["delta"], delta_ms):
+            # Dropped on overflow; a rendering with a gap is not worth caching
+            self.greeting_recorder = None
+        elif self.greeting_recorder is not None:
+            self.greeting_recorder.add_delta(response["delta"])
+
+        if self.response_start_timestamp_twilio is None or (
+            item_id and item_id != self.last_assistant_item
+        ):
+            # A new item starts playing; truncation offsets are relative to it
+            self.response_start_timestamp_twilio = self.latest_media_timestamp
+            if SHOW_TIMING_MATH:
+                log.info(
+                    "timing.response_start", timestamp_ms=self.response_start_timestamp_twilio
+                )
+
+        # Update last_assistant_item safely
+        if item_id:
+            self.last_assistant_item = item_id
+        self.turn_log.add_audio(item_id, self.response_start_timestamp_twilio, delta_ms)
+
+        self.call_timer.audio_delta()
+        outbound_frame_seconds.observe(time.perf_counter() - self.upstream_events.received_at)
+
+    async def on_speech_stopped(self, response):
+        self.call_timer.speech_stopped()
+        self.turn_log.note(response.get("item_id"), end_ms=self.latest_media_timestamp)
+
+    # Trigger an interruption. Your use case might work better using `input_audio_buffer.speech_stopped`, or combining the two.
+    async def on_speech_started(self, response):
+        detected_at = self.upstream_events.received_at
+        self.turn_log.note(response.get("item_id"), start_ms=self.latest_media_timestamp)
+        # An interrupted greeting is not worth caching
+        self.greeting_recorder = None
+        if self.local_barge_in_at is not None:
+            # Local VAD already interrupted; the server confirms it
+            LOCAL_VAD_LEAD_SECONDS.observe(detected_at - self.local_barge_in_at)
+            LOCAL_VAD_TRIGGERS.labels("confirmed").inc()
+            self.local_barge_in_at = None
+        if self.last_assistant_item:
+            log.info("barge_in", source="server", item_id=self.last_assistant_item)
+            await self.handle_speech_started_event(detected_at)
+
+    async def on_response_done(self, response):
+        """Log the agent message."""
+        self.response_in_progress = False
+        status = response.get("response", {}).get("status")
+        log.info("response.done", status=status)
+        agent_msg = ""
+        agent_item = None
+        response_output = response.get("response", {}).get("output", [])
+        if response_output:
+            agent_item = response_output[0].get("id")
+            content_list = response_output[0].get("content", [])
+            if content_list:
+                agent_msg = content_list[0].get("transcript", "Assistant message not found")
+        else:
+            agent_msg = "Assistant message not found"
+        self.turn_log.add("agent", agent_msg, item_id=agent_item)
+        log.info("agent.message", text=agent_msg)
+
+        if self.greeting_recorder is not None:
+            if status == "completed":
+                spawn_background(self.greeting_recorder.save(agent_msg))
+            self.greeting_recorder = None
+
+    async def on_user_transcript(self, response):
+        """Log the user message."""
+        if "transcript" not in response:
+            return
+        user_msg = response.get("transcript", "User message not found").strip()
+        self.turn_log.add("user", user_msg, item_id=response.get("item_id"))
+        log.info("user.message", text=user_msg)
+
+    async def on_function_call(self, response):
+        log.info("tool.called", name=response.get("name"), call_id=response.get("call_id"))
+        # Run the tool in the background so audio relay and
+        # barge-in handling keep flowing while it works
+        tool_task = asyncio.create_task(run_tool_call(self.openai_ws, response))
+        self.tool_tasks.add(tool_task)
+        tool_task.add_done_callback(self.tool_tasks.discard)
+
+    async def on_rate_limits(self, response):
+        upstream_router.observe_rate_limits(self.openai_ws, response.get("rate_limits", []))
+        log.info(
+            "upstream.rate_limits",
+            **{
+                limit.get("name", "unknown"): limit.get("remaining")
+                for limit in response.get("rate_limits", [])
+            },
+        )
+
+    async def on_error(self, response):
+        log.error("upstream.error", error=response.get("error"))
+
+    async def handle_speech_started_event(self, detected_at):
+        """Handle interruption when the caller's speech starts."""
+        if (
+            self.playback or self.outbound_audio.queued_ms
+        ) and self.response_start_timestamp_twilio is not None:
+            # Stop the pacer first so nothing more is sent after the clear
+            self.outbound_audio.clear("barge_in")
+            elapsed_time = self.latest_media_timestamp - self.response_start_timestamp_twilio
+            if SHOW_TIMING_MATH:
+                log.info(
+                    "timing.elapsed",
+                    latest_media_timestamp=self.latest_media_timestamp,
+                    response_start=self.response_start_timestamp_twilio,
+                    elapsed_ms=elapsed_time,
+                )
+
+            # The cached greeting item is text-only upstream; nothing to truncate
+            if self.last_assistant_item and self.last_assistant_item != self.cached_greeting_item:
                 if SHOW_TIMING_MATH:
-                    print(
-                        f"Calculating elapsed time for truncation: {latest_media_timestamp} - {response_start_timestamp_twilio} = {elapsed_time}ms"
+                    log.info(
+                        "timing.truncate",
+                        item_id=self.last_assistant_item,
+                        audio_end_ms=elapsed_time,
                     )
 
-                if last_assistant_item:
-                    if SHOW_TIMING_MATH:
-                        print(
-                            f"Truncating item with ID: {last_assistant_item}, Truncated at: {elapsed_time}ms"
-                        )
-
-                    truncate_event = {
-                        "type": "conversation.item.truncate",
-                        "item_id": last_assistant_item,
-                        "content_index": 0,
-                        "audio_end_ms": elapsed_time,
-                    }
-                    await openai_ws.send(json.dumps(truncate_event))
-
-                await websocket.send_json({"event": "clear", "streamSid": stream_sid})
-
-                mark_queue.clear()
-                last_assistant_item = None
-                response_start_timestamp_twilio = None
-
-        async def send_mark(connection, stream_sid):
-            if stream_sid:
-                mark_event = {
-                    "event": "mark",
-                    "streamSid": stream_sid,
-                    "mark": {"name": "responsePart"},
+                truncate_event = {
+                    "type": "conversation.item.truncate",
+                    "item_id": self.last_assistant_item,
+                    "content_index": 0,
+                    "audio_end_ms": elapsed_time,
                 }
-                await connection.send_json(mark_event)
-                mark_queue.append("responsePart")
+                await self.send_upstream(truncate_event)
+                self.turn_log.truncate(self.last_assistant_item, elapsed_time)
+
+            await self.websocket.send_text(clear_frame(self.stream_sid))
+            self.call_timer.barge_in_cleared(detected_at)
+
+            self.playback.clear(self.loop.time())
+            self.last_assistant_item = None
+            self.response_start_timestamp_twilio = None
+
+    async def handle_local_speech(self, detected_at):
+        """Interrupt as soon as local VAD hears the caller over the bot."""
+        if (
+            not (self.playback or self.outbound_audio.queued_ms)
+            or not self.last_assistant_item
+            or self.local_barge_in_at is not None
+            or not self.upstream_ready.is_set()
+        ):
+            return
+        log.info("barge_in", source="local_vad", item_id=self.last_assistant_item)
+        self.local_barge_in_at = detected_at
+        self.local_barge_in_item = self.last_assistant_item
+        self.local_barge_in_cancelled = self.response_in_progress
+        self.greeting_recorder = None
+        if self.response_in_progress:
+            # Stop generation too; the truncate alone would not stop new deltas
+            await self.send_upstream({"type": "response.cancel"})
+            self.response_in_progress = False
+        await self.handle_speech_started_event(detected_at)
+        self.local_barge_in_watch = asyncio.create_task(self.confirm_local_barge_in())
+
+    async def confirm_local_barge_in(self):
+        """Resume the bot if the server never reports the caller's speech."""
+        await asyncio.sleep(LOCAL_VAD_CONFIRM_TIMEOUT)
+        if self.local_barge_in_at is None:
+            return
+        self.local_barge_in_at = None
+        LOCAL_VAD_TRIGGERS.labels("unconfirmed").inc()
+        log.info("local_vad.unconfirmed")
+        if self.local_barge_in_cancelled:
+            await self.send_upstream({"type": "response.create"})
+
+    async def send_audio(self, payload, audio_ms):
+        """Called by the pacer: one chunk of response audio plus its mark."""
+        now = self.loop.time()
+        if self.recording is not None:
+            # Plays once Twilio's buffered audio has, on the caller's timeline
+            self.recording.agent(
+                self.latest_media_timestamp + self.playback.lead_ms(now), payload, audio_ms
+            )
+        await self.websocket.send_text(media_frame(self.stream_sid, payload))
+        self.playback.sent(audio_ms, now)
+        await self.send_mark()
+
+    async def send_mark(self):
+        if self.stream_sid:
+            await self.websocket.send_text(mark_frame(self.stream_sid))
+            self.playback.mark()
+
+    async def send_upstream(self, event):
+        """Send one event upstream; False if the connection has dropped.
+
+        The drop itself is handled by send_to_twilio, which reconnects and
+        replays the conversation, so callers on the Twilio side never see
+        `ConnectionClosed`.
+        """
+        upstream_ws = self.openai_ws
+        try:
+            await upstream_ws.send(json.dumps(event))
+        except websockets.exceptions.ConnectionClosed:
+            if upstream_ws is self.openai_ws:
+                self.upstream_ready.clear()
+            return False
+        return True
+
+    async def forward_to_openai(self):
+        """Drain the inbound queue into the upstream coalescer, holding it while reconnecting."""
+        while True:
+            payload, _ = await self.inbound_audio.get()
+            await self.upstream_ready.wait()
+            if self.inbound_audio.queued_ms <= RELAY_INBOUND_MAX_MS:
+                # Caught up on the audio buffered during a reconnect
+                self.inbound_audio.max_ms = RELAY_INBOUND_MAX_MS
+            upstream_ws = self.openai_ws
+            try:
+                await self.upstream_audio.append(payload)
+            except websockets.exceptions.ConnectionClosed:
+                # send_to_twilio notices the drop and reconnects
+                if upstream_ws is self.openai_ws:
+                    self.upstream_ready.clear()
+
+    async def flush_upstream_audio(self):
+        if self.upstream_ready.is_set():
+            try:
+                await self.upstream_audio.flush()
+            except websockets.exceptions.ConnectionClosed:
+                pass
 
-        await asyncio.gather(receive_from_twilio(), send_to_twilio())
+
+@app.websocket("/media-stream")
+async def handle_media_stream(websocket: WebSocket):
+    """Handle WebSocket connections between Twilio and Azure OpenAI."""
+    await websocket.accept()
+
+    # Twilio sends the CallSid only in the stream's `start` event, which loads the
+    # session by it; until then the stream is logged under a placeholder
+    session_id = f"session_{int(time.time())}"
+    bind_call(call_sid=session_id)
+    log.info("media_stream.connected")
+
+    if not admission.admit_stream():
+        log.warning("media_stream.refused")
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+
+    try:
+        call = CallState(websocket, session_id)
+    except Exception:
+        admission.release_stream()
+        raise
+    ACTIVE_CALLS.inc()
+    active_calls.add(call)
+    try:
+        await call.run()
+    finally:
+        ACTIVE_CALLS.dec()
+        admission.release_stream()
+        active_calls.discard(call)
+        await call.close()
+
+
+def spawn_background(coroutine):
+    """Run a coroutine as a background task, keeping a reference until it finishes."""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def deliver_first_message(session_id, pending_lookup):
+    """Patch a late personalized first message into the stored session."""
+    late_first_message = await pending_lookup
+    if late_first_message and await session_store.update(
+        session_id, first_message=late_first_message
+    ):
+        log.info("first_message.late_delivery", call_sid=session_id)
 
 
 async def send_initial_conversation_item(openai_ws):
@@ -494,13 +1062,13 @@ async def initialize_session(openai_ws):
             "modalities": ["text", "audio"],
             "temperature": 0.8,
             "input_audio_transcription": {"model": "whisper-1"},
-            # "tools": [
-            #     tavily_search_tool_json,
-            # ],
-            # "tool_choice": "auto",
         },
     }
-    print("Sending session update:", json.dumps(session_update))
+    # Only the tools enabled with TOOLS_ENABLED are offered
+    tools = tool_registry.schemas()
+    if tools:
+        session_update["session"].update(tools=tools, tool_choice="auto")
+    log.debug("upstream.session_update", session=session_update["session"])
     await openai_ws.send(json.dumps(session_update))
 
     # Uncomment the next line to have the AI speak first
@@ -522,36 +1090,84 @@ async def send_error_response(openai_ws):
     )
 
 
+async def run_tool_call(openai_ws, function_call):
+    """Run a registered tool and post its result back to the conversation."""
+    function_name = function_call.get("name")
+    call_id = function_call.get("call_id")
+    try:
+        function_args = json.loads(function_call.get("arguments") or "{}")
+        tool = tool_registry.get(function_name)
+        output = await tool_registry.run(function_name, function_args)
+
+        # Send function call result back to OpenAI
+        function_output_event = {
+            "type": "conversation.item.create",
+            "item": {
+                "type": "function_call_output",
+                "output": output,
+                "call_id": call_id,
+            },
+        }
+        await openai_ws.send(json.dumps(function_output_event))
+        log.info("tool.result_sent", name=function_name, call_id=call_id)
+
+        response_create = {"type": "response.create"}
+        instructions = tool.render_instructions(function_args, output)
+        if instructions:
+            response_create["response"] = {
+                "modalities": ["text", "audio"],
+                "instructions": instructions,
+            }
+        await openai_ws.send(json.dumps(response_create))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.warning("tool.failed", name=function_name, error=str(e))
+        if openai_ws.open:
+            await send_error_response(openai_ws)
+
+
 async def send_to_webhook(payload):
     """Function to send data to the Make.com webhook"""
-    # Log the data being sent
-    print(f"Sending data to webhook: {json.dumps(payload, indent=2)}")
+    route = payload.get("route")
+    log.debug("webhook.request", route=route, payload=payload)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                MAKE_WEBHOOK_URL,
-                headers={"Content-Type": "application/json"},
-                json=payload,
-            ) as response:
-
-                print(f"Webhook response status: {response.status}")
-
-                if response.ok:
-                    response_text = await response.text()
-                    print(f"Webhook response: {response_text}")
-                    return response_text
-                else:
-                    error_msg = f"Failed to send data to webhook: {response.reason}"
-                    print(error_msg)
-                    raise Exception(error_msg)
+        status, ok, reason, response_text = await webhook_client.post(payload)
+
+        log.info("webhook.response", route=route, status=status)
+
+        if ok:
+            log.debug("webhook.response_body", route=route, text=response_text)
+            return response_text
+        else:
+            raise Exception(f"Failed to send data to webhook: {reason}")
 
     except Exception as error:
-        print(f"Error sending data to webhook: {str(error)}")
+        log.warning("webhook.failed", route=route, error=str(error))
         raise
 
 
+# Pre-warmed upstream connections, configured with SYSTEM_MESSAGE/VOICE and
+# opened on whichever deployment the router picks
+realtime_pool = RealtimeConnectionPool(upstream_router.connect, initialize_session)
+
+# Post-call transcripts (route "2") are delivered through a durable outbox
+transcript_outbox = Outbox(send_to_webhook)
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    if WORKERS > 1 and WORKER_INDEX is None:
+        # Compact the shared caller history once, before the workers append to it
+        caller_history.compact()
+        WorkerSupervisor(
+            per_worker_paths={"OUTBOX_PATH": OUTBOX_PATH, "TRANSCRIPT_PATH": TRANSCRIPT_PATH}
+        ).run()
+    else:
+        # log_config=None leaves uvicorn's loggers to the queue-backed root handler
+        config = uvicorn.Config(app, host="0.0.0.0", port=PORT, log_config=None)
+        sockets = worker_sockets("0.0.0.0", PORT) if WORKER_INDEX is not None else None
+        # The first SIGTERM drains active calls before uvicorn closes their websockets
+        DrainingServer(config, admission).run(sockets=sockets)
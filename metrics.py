@@ -0,0 +1,320 @@
+import time
+import asyncio
+from bisect import bisect_left
+
+# Latency buckets in seconds, from sub-millisecond relay work up to slow webhooks
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = dict()
+
+    def labels(self, *values, **kwargs):
+        """Child metric for one combination of label values."""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        le = _format_labels(self.labelnames, values, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{le} {child.count}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """Register a callable run at scrape time, e.g. to copy pool stats into gauges."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = MetricsRegistry()
+
+WEBHOOK_REQUEST_SECONDS = registry.histogram(
+    "webhook_request_seconds", "Make.com webhook request latency.", ["route"]
+)
+CALLER_LOOKUP_SECONDS = registry.histogram(
+    "caller_lookup_seconds",
+    "Time /incoming-call spent on the caller-profile lookup (bounded by the budget).",
+)
+UPSTREAM_CONNECT_SECONDS = registry.histogram(
+    "upstream_connect_seconds",
+    "Time to open and configure a new Azure OpenAI Realtime connection.",
+)
+UPSTREAM_CONNECTS = registry.counter(
+    "upstream_connects_total",
+    "Upstream Realtime connection attempts, by deployment and outcome.",
+    ["deployment", "outcome"],
+)
+UPSTREAM_DEPLOYMENT_STATS = registry.gauge(
+    "upstream_deployment",
+    "Per-deployment health, rate-limit headroom and open connections.",
+    ["deployment", "stat"],
+)
+UPSTREAM_RECONNECT_SECONDS = registry.histogram(
+    "upstream_reconnect_seconds",
+    "Time from a mid-call upstream drop to a new connection with the conversation replayed.",
+)
+UPSTREAM_RECONNECTS = registry.counter(
+    "upstream_reconnects_total",
+    "Mid-call upstream reconnects, by outcome (recovered, failed, budget_exhausted).",
+    ["outcome"],
+)
+UPSTREAM_ACQUIRE_SECONDS = registry.histogram(
+    "upstream_acquire_seconds",
+    "Time a call waited for an upstream Realtime connection.",
+)
+FIRST_AUDIO_SECONDS = registry.histogram(
+    "first_audio_seconds",
+    "Time from the Twilio start event to the first response.audio.delta.",
+)
+RESPONSE_LATENCY_SECONDS = registry.histogram(
+    "response_latency_seconds",
+    "Time from input_audio_buffer.speech_stopped to the first response.audio.delta.",
+)
+BARGE_IN_CLEAR_SECONDS = registry.histogram(
+    "barge_in_clear_seconds",
+    "Time from detecting caller speech to sending the Twilio clear.",
+)
+LOCAL_VAD_LEAD_SECONDS = registry.histogram(
+    "local_vad_lead_seconds",
+    "How much earlier local VAD detected a barge-in than the server's speech_started.",
+)
+LOCAL_VAD_TRIGGERS = registry.counter(
+    "local_vad_triggers_total",
+    "Barge-ins started by local VAD, by whether the server confirmed them.",
+    ["outcome"],
+)
+RELAY_FRAME_SECONDS = registry.histogram(
+    "relay_frame_seconds",
+    "Event-loop time spent relaying one frame.",
+    ["direction"],
+)
+RELAY_AUDIO_DISCARDED_SECONDS = registry.counter(
+    "relay_audio_discarded_seconds_total",
+    "Audio dropped by the relay, by where it was queued and why.",
+    ["direction", "reason"],
+)
+EVENT_LOOP_LAG_SECONDS = registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke up a periodic probe.",
+)
+ADMISSION_DECISIONS = registry.counter(
+    "admission_decisions_total",
+    "Calls admitted or refused (full, rate_limited, draining, stream_refused).",
+    ["outcome"],
+)
+WORKER_HANDOFFS = registry.counter(
+    "worker_handoffs_total",
+    "Media streams that reached another worker than the one that answered the call, by outcome.",
+    ["outcome"],
+)
+ACTIVE_CALLS = registry.gauge("active_calls", "Calls with an open /media-stream.")
+CALLS_TOTAL = registry.counter("calls_total", "Calls answered on /incoming-call.")
+COMPONENT_STATS = registry.gauge(
+    "component_stats",
+    "Usage counters reported by the app's pools and queues.",
+    ["component", "stat"],
+)
+
+
+def export_stats(component, stats):
+    """Copy a component's stats() dict into the component_stats gauge."""
+    for stat, value in stats.items():
+        COMPONENT_STATS.labels(component, stat).set(value)
+
+
+class CallTimer:
+    """Per-call timing marks that feed the latency histograms."""
+
+    __slots__ = ("started_at", "speech_stopped_at", "first_audio_seen", "samples")
+
+    def __init__(self):
+        self.started_at = None
+        self.speech_stopped_at = None
+        self.first_audio_seen = False
+        self.samples = dict()
+
+    def _record(self, histogram, name, seconds):
+        histogram.observe(seconds)
+        self.samples[name] = seconds
+
+    def stream_started(self):
+        self.started_at = time.perf_counter()
+        self.first_audio_seen = False
+
+    def speech_stopped(self):
+        self.speech_stopped_at = time.perf_counter()
+
+    def audio_delta(self):
+        """Called for every response.audio.delta; records first-audio latencies once."""
+        now = time.perf_counter()
+        if not self.first_audio_seen and self.started_at is not None:
+            self.first_audio_seen = True
+            self._record(FIRST_AUDIO_SECONDS, "first_audio", now - self.started_at)
+        if self.speech_stopped_at is not None:
+            self._record(
+                RESPONSE_LATENCY_SECONDS, "response_latency", now - self.speech_stopped_at
+            )
+            self.speech_stopped_at = None
+
+    def barge_in_cleared(self, detected_at):
+        self._record(
+            BARGE_IN_CLEAR_SECONDS, "barge_in_clear", time.perf_counter() - detected_at
+        )
+
+
+async def monitor_event_loop_lag(interval=0.1):
+    """Probe how late the event loop runs a timer; run as a background task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(loop.time() - expected, 0))
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+
+from logs import get_logger
+
+# Configuration
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.jsonl")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 10))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", 2))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", 300))
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", 10))
+OUTBOX_FSYNC = os.getenv("OUTBOX_FSYNC", "false").lower() == "true"
+
+log = get_logger(__name__)
+
+
+class Outbox:
+    """Durable, append-only outbox for webhook deliveries that must not be lost.
+
+    `enqueue` appends a `put` record to a local spool file and returns at once.
+    A background worker delivers pending entries in batches, retrying failures
+    with exponential backoff, and appends an `ack` record once an entry is
+    delivered. Entries are deduplicated by key (the CallSid): a newer payload
+    for the same key replaces one that has not been delivered yet. Anything
+    still pending at shutdown stays in the spool and is replayed on restart.
+    """
+
+    def __init__(self, deliver, path=OUTBOX_PATH, batch_size=OUTBOX_BATCH_SIZE):
+        self.deliver = deliver
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = dict()  # key -> entry, in enqueue order
+        self._file = None
+        self._wakeup = None
+        self._worker = None
+        self.counters = {"enqueued": 0, "delivered": 0, "failures": 0, "deduplicated": 0}
+
+    async def start(self):
+        """Replay and compact the spool file, then start the delivery worker."""
+        self._wakeup = asyncio.Event()
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._worker = asyncio.create_task(self._run())
+        if self._pending:
+            log.info("outbox.replay", pending=len(self._pending))
+            self._wakeup.set()
+
+    async def close(self, timeout=OUTBOX_DRAIN_TIMEOUT):
+        """Stop the worker, then make one attempt at every entry that is due, within `timeout`.
+
+        Entries still backing off are not retried early; they stay in the
+        spool for the next start.
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        try:
+            await asyncio.wait_for(self._deliver_due(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._file.close()
+        self._file = None
+        if self._pending:
+            log.warning("outbox.undelivered", pending=len(self._pending), path=self.path)
+
+    def enqueue(self, key, payload):
+        """Persist a delivery for `key` and wake the worker. O(1), never waits on the network."""
+        entry = {
+            "id": uuid.uuid4().hex,
+            "key": key,
+            "payload": payload,
+            "attempts": 0,
+            "next_attempt": 0,
+        }
+        previous = self._pending.pop(key, None)
+        if previous is not None:
+            self.counters["deduplicated"] += 1
+            self._append({"op": "ack", "id": previous["id"]})
+        self._append(
+            {"op": "put", "id": entry["id"], "key": key, "payload": payload}
+        )
+        self._pending[key] = entry
+        self.counters["enqueued"] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["pending"] = len(self._pending)
+        return stats
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if OUTBOX_FSYNC:
+            os.fsync(self._file.fileno())
+
+    def _load(self):
+        """Rebuild pending entries from the spool and rewrite it with only those."""
+        if not os.path.exists(self.path):
+            return
+        entries = dict()
+        with open(self.path, encoding="utf-8") as spool:
+            for line in spool:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn write at the tail
+                if record.get("op") == "put":
+                    entries[record["id"]] = record
+                elif record.get("op") == "ack":
+                    entries.pop(record.get("id"), None)
+
+        for record in entries.values():
+            previous = self._pending.pop(record["key"], None)
+            if previous is not None:
+                self.counters["deduplicated"] += 1
+            record.update(attempts=0, next_attempt=0)
+            self._pending[record["key"]] = record
+
+        compacted = self.path + ".tmp"
+        with open(compacted, "w", encoding="utf-8") as spool:
+            for entry in self._pending.values():
+                spool.write(
+                    json.dumps(
+                        {
+                            "op": "put",
+                            "id": entry["id"],
+                            "key": entry["key"],
+                            "payload": entry["payload"],
+                        }
+                    )
+                    + "\n"
+                )
+        os.replace(compacted, self.path)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._deliver_due()
+
+    async def _deliver_due(self):
+        """One attempt, in batches, at every entry whose backoff has expired."""
+        now = time.monotonic()
+        due = [e for e in self._pending.values() if e["next_attempt"] <= now]
+        while due:
+            await self._deliver_batch(due[: self.batch_size])
+            due = due[self.batch_size :]
+
+    async def _deliver_batch(self, batch):
+        results = await asyncio.gather(
+            *(self.deliver(entry["payload"]) for entry in batch),
+            return_exceptions=True,
+        )
+        for entry, result in zip(batch, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                self.counters["failures"] += 1
+                entry["attempts"] += 1
+                backoff = min(OUTBOX_RETRY_BASE ** entry["attempts"], OUTBOX_RETRY_MAX)
+                entry["next_attempt"] = time.monotonic() + backoff * random.uniform(
+                    0.5, 1
+                )
+                log.warning(
+                    "outbox.retry",
+                    key=entry["key"],
+                    attempt=entry["attempts"],
+                    backoff=round(backoff),
+                    error=str(result),
+                )
+                continue
+            self.counters["delivered"] += 1
+            # A newer payload for the same key may have been enqueued meanwhile
+            if self._pending.get(entry["key"]) is entry:
+                del self._pending[entry["key"]]
+            self._append({"op": "ack", "id": entry["id"]})
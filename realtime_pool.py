@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+
+from logs import get_logger
+from metrics import UPSTREAM_ACQUIRE_SECONDS, UPSTREAM_CONNECT_SECONDS
+
+# Configuration
+REALTIME_POOL_SIZE = int(os.getenv("REALTIME_POOL_SIZE", 2))
+REALTIME_POOL_MAX_IDLE = float(os.getenv("REALTIME_POOL_MAX_IDLE", 300))
+REALTIME_POOL_HEALTH_INTERVAL = float(os.getenv("REALTIME_POOL_HEALTH_INTERVAL", 15))
+REALTIME_CONNECT_TIMEOUT = float(os.getenv("REALTIME_CONNECT_TIMEOUT", 10))
+
+log = get_logger(__name__)
+
+
+class RealtimeConnectionPool:
+    """Keeps N upstream Realtime sockets connected and configured ahead of calls.
+
+    `connect` opens a new websocket and `configure` sends the session.update
+    for it. A pooled socket is only handed out after the upstream acknowledged
+    the configuration with `session.updated`. Sockets are single use: the call
+    that acquires one owns it and closes it, and the pool refills behind it.
+    """
+
+    def __init__(
+        self,
+        connect,
+        configure,
+        size=REALTIME_POOL_SIZE,
+        max_idle=REALTIME_POOL_MAX_IDLE,
+        health_interval=REALTIME_POOL_HEALTH_INTERVAL,
+    ):
+        self.connect = connect
+        self.configure = configure
+        self.size = size
+        self.max_idle = max_idle
+        self.health_interval = health_interval
+        self._idle = deque()
+        self._refilling = 0
+        self._tasks = set()
+        self._health_task = None
+        self._closed = False
+        self.counters = {
+            "acquired": 0,
+            "pool_hits": 0,
+            "pool_misses": 0,
+            "opened": 0,
+            "open_failures": 0,
+            "discarded": 0,
+        }
+
+    async def start(self):
+        """Warm the pool and start the health checker. Called on app startup."""
+        self._closed = False
+        self._schedule_refill()
+        if self.size > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """Stop refilling and close every idle socket. Called on app shutdown."""
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        while self._idle:
+            openai_ws, _ = self._idle.popleft()
+            await self._discard(openai_ws)
+
+    async def acquire(self):
+        """Hand out a ready upstream socket, opening one inline if the pool is empty."""
+        wait_start = time.monotonic()
+        openai_ws = None
+        while self._idle:
+            candidate, created_at = self._idle.popleft()
+            if self._is_usable(candidate, created_at):
+                openai_ws = candidate
+                break
+            await self._discard(candidate)
+
+        if openai_ws is not None:
+            self.counters["pool_hits"] += 1
+        else:
+            self.counters["pool_misses"] += 1
+            openai_ws = await self._open()
+
+        self.counters["acquired"] += 1
+        UPSTREAM_ACQUIRE_SECONDS.observe(time.monotonic() - wait_start)
+        self._schedule_refill()
+        return openai_ws
+
+    def stats(self):
+        """Snapshot of pool counters (wait times go to upstream_acquire_seconds)."""
+        stats = dict(self.counters)
+        stats["idle"] = len(self._idle)
+        stats["refilling"] = self._refilling
+        stats["size"] = self.size
+        return stats
+
+    def _is_usable(self, openai_ws, created_at):
+        return openai_ws.open and time.monotonic() - created_at < self.max_idle
+
+    async def _open(self):
+        """Connect, send the session configuration and wait until it is applied."""
+        connect_start = time.monotonic()
+        try:
+            # Not bounded here: the router times out each deployment it tries,
+            # and one overall timeout would cut its failover short
+            openai_ws = await self.connect()
+        except Exception:
+            self.counters["open_failures"] += 1
+            raise
+        try:
+            await self.configure(openai_ws)
+            await asyncio.wait_for(
+                self._wait_for_session_updated(openai_ws), REALTIME_CONNECT_TIMEOUT
+            )
+        except Exception:
+            self.counters["open_failures"] += 1
+            await self._discard(openai_ws)
+            raise
+        self.counters["opened"] += 1
+        UPSTREAM_CONNECT_SECONDS.observe(time.monotonic() - connect_start)
+        return openai_ws
+
+    async def _wait_for_session_updated(self, openai_ws):
+        async for message in openai_ws:
+            event = json.loads(message)
+            if event.get("type") == "session.updated":
+                return
+            if event.get("type") == "error":
+                raise RuntimeError(f"Upstream rejected session.update: {event}")
+
+    def _schedule_refill(self):
+        if self._closed:
+            return
+        missing = self.size - len(self._idle) - self._refilling
+        for _ in range(max(missing, 0)):
+            self._refilling += 1
+            task = asyncio.create_task(self._fill_one())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fill_one(self):
+        try:
+            openai_ws = await self._open()
+            if self._closed:
+                await self._discard(openai_ws)
+            else:
+                self._idle.append((openai_ws, time.monotonic()))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("realtime_pool.warm_failed", error=str(e))
+        finally:
+            self._refilling -= 1
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for _ in range(len(self._idle)):
+                openai_ws, created_at = self._idle.popleft()
+                if self._is_usable(openai_ws, created_at) and await self._ping(
+                    openai_ws
+                ):
+                    self._idle.append((openai_ws, created_at))
+                else:
+                    await self._discard(openai_ws)
+            self._schedule_refill()
+
+    async def _ping(self, openai_ws):
+        try:
+            pong_waiter = await openai_ws.ping()
+            await asyncio.wait_for(pong_waiter, REALTIME_CONNECT_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _discard(self, openai_ws):
+        self.counters["discarded"] += 1
+        try:
+            await openai_ws.close()
+        except Exception:
+            pass
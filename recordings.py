@@ -0,0 +1,359 @@
+import os
+import time
+import base64
+import struct
+import asyncio
+import threading
+from datetime import datetime, timezone
+from collections import deque
+
+from logs import get_logger
+
+# Configuration
+RECORDING_ENABLED = os.getenv("RECORDING_ENABLED", "false").lower() == "true"
+RECORDING_DIR = os.getenv("RECORDING_DIR", "recordings")
+# Audio chunks waiting for the writer thread; beyond this they are dropped, never blocked on
+RECORDING_QUEUE_SIZE = int(os.getenv("RECORDING_QUEUE_SIZE", 20000))
+# How often the writer thread wakes up to drain the queue
+RECORDING_FLUSH_INTERVAL = float(os.getenv("RECORDING_FLUSH_INTERVAL", 0.2))
+# Audio per call held in memory to align the two legs; written out in halves
+RECORDING_BUFFER_SECONDS = float(os.getenv("RECORDING_BUFFER_SECONDS", 10))
+# A call's recording continues in a new file after this long
+RECORDING_MAX_FILE_SECONDS = float(os.getenv("RECORDING_MAX_FILE_SECONDS", 3600))
+# Recordings older than this, and the oldest beyond the total size, are deleted (0 disables either)
+RECORDING_RETENTION_DAYS = float(os.getenv("RECORDING_RETENTION_DAYS", 30))
+RECORDING_MAX_TOTAL_MB = float(os.getenv("RECORDING_MAX_TOTAL_MB", 2048))
+
+SAMPLE_RATE = 8000
+CHANNELS = 2
+# Left: what the caller said; right: what the agent played to them
+CALLER, AGENT = 0, 1
+FRAMES_PER_MS = SAMPLE_RATE // 1000
+MULAW_SILENCE = 0xFF
+WAVE_FORMAT_MULAW = 7
+HEADER_BYTES = 58
+# Seconds between retention sweeps of the recording directory
+RETENTION_SWEEP_INTERVAL = 60
+# A recording modified this recently may still be open, possibly in another
+# worker sharing the directory, so retention leaves it alone
+IN_PROGRESS_SECONDS = 300
+
+log = get_logger(__name__)
+
+
+def wav_header(frames):
+    """RIFF header of a stereo 8 kHz mu-law WAV holding `frames` sample frames."""
+    data_bytes = frames * CHANNELS
+    return (
+        b"RIFF"
+        + struct.pack("<I", HEADER_BYTES - 8 + data_bytes)
+        + b"WAVE"
+        + b"fmt "
+        + struct.pack(
+            "<IHHIIHHH",
+            18,
+            WAVE_FORMAT_MULAW,
+            CHANNELS,
+            SAMPLE_RATE,
+            SAMPLE_RATE * CHANNELS,
+            CHANNELS,
+            8,
+            0,
+        )
+        + b"fact"
+        + struct.pack("<II", 4, frames)
+        + b"data"
+        + struct.pack("<I", data_bytes)
+    )
+
+
+class StereoRecording:
+    """Writer-thread side of one call: an aligned stereo buffer and the file behind it.
+
+    The buffer is preallocated with mu-law silence and covers a sliding window
+    of the call's timeline (Twilio stream milliseconds). Each leg's audio is
+    written into its channel at its position, so gaps stay silent; when a chunk
+    lands past the window, the older half is appended to the file in one write.
+    """
+
+    def __init__(self, directory, name, counters, buffer_seconds, max_file_seconds):
+        self.directory = directory
+        self.name = name
+        self.counters = counters
+        self.buffer_frames = max(int(buffer_seconds * SAMPLE_RATE), SAMPLE_RATE)
+        self.max_file_frames = max(int(max_file_seconds * SAMPLE_RATE), self.buffer_frames)
+        self.silence = bytes([MULAW_SILENCE]) * (self.buffer_frames * CHANNELS)
+        self.buffer = bytearray(self.silence)
+        # Timeline frame at buffer[0], and the end of the latest audio added
+        self.base = 0
+        self.end = 0
+        self.file = None
+        self.path = None
+        self.part = 0
+        self.file_frames = 0
+
+    def add(self, channel, frame, audio):
+        if frame < self.base:
+            # Older than what was already written out
+            self.counters["late_frames"] += min(self.base - frame, len(audio))
+            audio = audio[self.base - frame :]
+            frame = self.base
+        audio = audio[: self.buffer_frames]
+        if not audio:
+            return
+        end = frame + len(audio)
+        if end > self.base + self.buffer_frames:
+            self._advance(max(end - self.buffer_frames, self.base + self.buffer_frames // 2))
+        offset = (frame - self.base) * CHANNELS + channel
+        self.buffer[offset : offset + len(audio) * CHANNELS : CHANNELS] = audio
+        self.end = max(self.end, end)
+
+    def close(self):
+        """Write out what is buffered and finish the current file."""
+        self._advance(self.end)
+        self._close_file()
+
+    def _advance(self, new_base):
+        """Write out the timeline before `new_base` and slide the window up to it."""
+        remaining = new_base - self.base
+        while remaining > 0:
+            frames = min(remaining, self.buffer_frames)
+            size = frames * CHANNELS
+            self._write(bytes(self.buffer[:size]))
+            self.buffer[:-size] = self.buffer[size:]
+            self.buffer[-size:] = self.silence[:size]
+            self.base += frames
+            remaining -= frames
+        if self.file is not None:
+            # Keep the header current so a partial file stays playable
+            self._write_header()
+
+    def _write(self, data):
+        while data:
+            if self.file is None:
+                self._open_file()
+            room = (self.max_file_frames - self.file_frames) * CHANNELS
+            self.file.write(data[:room])
+            written = min(len(data), room)
+            self.file_frames += written // CHANNELS
+            self.counters["bytes_written"] += written
+            data = data[room:]
+            if self.file_frames >= self.max_file_frames:
+                self._close_file()
+
+    def _open_file(self):
+        suffix = f".part{self.part + 1}" if self.part else ""
+        self.path = os.path.join(self.directory, f"{self.name}{suffix}.wav")
+        self.file = open(self.path, "wb")
+        self.file.write(wav_header(0))
+        self.file_frames = 0
+        self.part += 1
+        self.counters["files"] += 1
+
+    def _write_header(self):
+        self.file.seek(0)
+        self.file.write(wav_header(self.file_frames))
+        self.file.seek(0, os.SEEK_END)
+
+    def _close_file(self):
+        if self.file is not None:
+            self._write_header()
+            self.file.close()
+            self.file = None
+
+
+class CallRecording:
+    """Event-loop side of one call's recording: taps that only append to the queue."""
+
+    __slots__ = ("recorder", "name", "agent_ms")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        # Where the agent leg's audio so far ends on the call timeline
+        self.agent_ms = 0
+
+    def caller(self, timestamp_ms, payload):
+        """An inbound Twilio `media` payload at its stream timestamp."""
+        self.recorder._put((self, CALLER, timestamp_ms, payload))
+
+    def agent(self, position_ms, payload, audio_ms):
+        """Response audio handed to Twilio, due to play at `position_ms` (or right after the last)."""
+        start_ms = max(position_ms, self.agent_ms)
+        self.agent_ms = start_ms + audio_ms
+        self.recorder._put((self, AGENT, start_ms, payload))
+
+    def close(self):
+        # Never dropped, or the writer would keep the call open
+        self.recorder._chunks.append((self, None, 0, None))
+
+
+class CallRecorder:
+    """Dual-leg call recorder that keeps all file work off the event loop.
+
+    The relay's taps append (recording, channel, timestamp, base64 payload)
+    tuples to a deque; appends and pops are atomic, so the event loop takes
+    no lock and never waits on the writer. A writer thread wakes every
+    `flush_interval`, decodes the batch, aligns it into per-call stereo
+    buffers and writes 8 kHz mu-law WAV files (caller left, agent right) to
+    `directory`, rotating long calls into parts and enforcing retention.
+    """
+
+    def __init__(
+        self,
+        directory=RECORDING_DIR,
+        enabled=RECORDING_ENABLED,
+        queue_size=RECORDING_QUEUE_SIZE,
+        flush_interval=RECORDING_FLUSH_INTERVAL,
+        buffer_seconds=RECORDING_BUFFER_SECONDS,
+        max_file_seconds=RECORDING_MAX_FILE_SECONDS,
+        retention_days=RECORDING_RETENTION_DAYS,
+        max_total_mb=RECORDING_MAX_TOTAL_MB,
+    ):
+        self.directory = directory
+        self.enabled = enabled
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.buffer_seconds = buffer_seconds
+        self.max_file_seconds = max_file_seconds
+        self.retention_days = retention_days
+        self.max_total_mb = max_total_mb
+        self._chunks = deque()
+        self._thread = None
+        self._stop = threading.Event()
+        # Updated by the event loop
+        self.counters = {"calls": 0, "chunks": 0, "dropped_queue_full": 0}
+        # Updated by the writer thread
+        self.writer_counters = {
+            "files": 0,
+            "bytes_written": 0,
+            "late_frames": 0,
+            "deleted_files": 0,
+            "write_failures": 0,
+        }
+        self._open = 0
+
+    async def start(self):
+        if self.enabled and self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="call-recorder", daemon=True)
+            self._thread.start()
+
+    async def close(self):
+        """Stop the writer thread once it has written out and closed every recording."""
+        if self._thread is not None:
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def open_call(self, call_sid):
+        """A recording for a call whose stream just started, or None when recording is off."""
+        if self._thread is None:
+            return None
+        self.counters["calls"] += 1
+        started = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        return CallRecording(self, f"{started}_{call_sid}")
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats.update(self.writer_counters)
+        stats["queued"] = len(self._chunks)
+        stats["recording"] = self._open
+        return stats
+
+    def _put(self, chunk):
+        if len(self._chunks) >= self.queue_size:
+            self.counters["dropped_queue_full"] += 1
+            return
+        self._chunks.append(chunk)
+        self.counters["chunks"] += 1
+
+    def _run(self):
+        recordings = dict()
+        last_sweep = 0.0
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            self._drain(recordings)
+            self._open = len(recordings)
+            now = time.monotonic()
+            if stopping or now - last_sweep >= RETENTION_SWEEP_INTERVAL:
+                last_sweep = now
+                self._enforce_retention({r.path for r in recordings.values() if r.file})
+            if stopping:
+                for recording in recordings.values():
+                    self._finish(recording)
+                self._open = 0
+                return
+
+    def _drain(self, recordings):
+        while True:
+            try:
+                handle, channel, timestamp_ms, payload = self._chunks.popleft()
+            except IndexError:
+                return
+            recording = recordings.get(handle)
+            if channel is None:
+                if recording is not None:
+                    del recordings[handle]
+                    self._finish(recording)
+                continue
+            if recording is None:
+                recording = recordings[handle] = StereoRecording(
+                    self.directory,
+                    handle.name,
+                    self.writer_counters,
+                    self.buffer_seconds,
+                    self.max_file_seconds,
+                )
+            try:
+                recording.add(channel, int(timestamp_ms * FRAMES_PER_MS), base64.b64decode(payload))
+            except OSError as e:
+                self.writer_counters["write_failures"] += 1
+                log.warning("recording.write_failed", recording=handle.name, error=str(e))
+
+    def _finish(self, recording):
+        try:
+            recording.close()
+        except OSError as e:
+            self.writer_counters["write_failures"] += 1
+            log.warning("recording.write_failed", recording=recording.name, error=str(e))
+
+    def _enforce_retention(self, open_paths):
+        """Delete recordings past the age limit, then the oldest beyond the size limit.
+
+        Only finished files are candidates: this recorder's open ones, and
+        any file written to recently (an open file's header is rewritten at
+        least every half buffer).
+        """
+        in_progress = time.time() - max(IN_PROGRESS_SECONDS, 2 * self.buffer_seconds)
+        try:
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(".wav") and entry.path not in open_paths:
+                        stat = entry.stat()
+                        if stat.st_mtime < in_progress:
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            log.warning("recording.retention_failed", error=str(e))
+            return
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.retention_days * 86400
+        max_bytes = self.max_total_mb * 1024 * 1024
+        for mtime, size, path in entries:
+            expired = self.retention_days > 0 and mtime < cutoff
+            over = self.max_total_mb > 0 and total > max_bytes
+            if not (expired or over):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.writer_counters["deleted_files"] += 1
+
+
+# App-lifetime recorder shared by every call
+call_recorder = CallRecorder()
@@ -0,0 +1,190 @@
+import os
+import asyncio
+from collections import deque
+
+from logs import get_logger
+from metrics import RELAY_AUDIO_DISCARDED_SECONDS
+
+# Configuration
+# Response audio is sent to Twilio at most this far ahead of its playback
+RELAY_PLAYBACK_LEAD_MS = int(os.getenv("RELAY_PLAYBACK_LEAD_MS", 300))
+# Caller audio waiting to go upstream, and what to do when it is full
+RELAY_INBOUND_MAX_MS = int(os.getenv("RELAY_INBOUND_MAX_MS", 1000))
+RELAY_INBOUND_OVERFLOW = os.getenv("RELAY_INBOUND_OVERFLOW", "drop_oldest")
+# Response audio waiting for the pacer, and what to do when it is full. Never
+# "block": the queue is filled from the upstream event loop, and blocking it would
+# hold barge-in, transcript and tool events behind the queued audio
+RELAY_OUTBOUND_MAX_MS = int(os.getenv("RELAY_OUTBOUND_MAX_MS", 30000))
+RELAY_OUTBOUND_OVERFLOW = os.getenv("RELAY_OUTBOUND_OVERFLOW", "drop_newest")
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+if RELAY_OUTBOUND_OVERFLOW == "block":
+    raise ValueError("RELAY_OUTBOUND_OVERFLOW must be drop_oldest or drop_newest, not block")
+
+log = get_logger(__name__)
+
+
+class BoundedAudioQueue:
+    """FIFO of base64 audio payloads bounded by the audio duration it holds.
+
+    When a new payload does not fit, the overflow policy decides: ``block``
+    waits for the consumer (backpressure on the producer), ``drop_oldest``
+    discards the stalest audio and ``drop_newest`` discards the new payload.
+    """
+
+    def __init__(self, direction, max_ms, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}; expected one of {OVERFLOW_POLICIES}"
+            )
+        self.direction = direction
+        self.max_ms = max_ms
+        self.overflow = overflow
+        self.queued_ms = 0.0
+        # Bumped on clear() so a consumer can tell its item went stale
+        self.generation = 0
+        self._items = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, payload, audio_ms):
+        """Queue a payload; False if the overflow policy dropped it."""
+        while self._items and self.queued_ms + audio_ms > self.max_ms:
+            if self.overflow == "block":
+                self._writable.clear()
+                await self._writable.wait()
+            elif self.overflow == "drop_newest":
+                self._discarded(audio_ms, "overflow")
+                return False
+            else:
+                _, oldest_ms = self._items.popleft()
+                self.queued_ms -= oldest_ms
+                self._discarded(oldest_ms, "overflow")
+        self._items.append((payload, audio_ms))
+        self.queued_ms += audio_ms
+        self._readable.set()
+        return True
+
+    async def get(self):
+        """Wait for and return the oldest (payload, audio_ms)."""
+        while not self._items:
+            self._readable.clear()
+            await self._readable.wait()
+        payload, audio_ms = self._items.popleft()
+        self.queued_ms -= audio_ms
+        self._writable.set()
+        return payload, audio_ms
+
+    def clear(self, reason="cleared"):
+        """Drop everything queued and return how many ms of audio that was."""
+        dropped_ms = self.queued_ms
+        self._items.clear()
+        self.queued_ms = 0.0
+        self.generation += 1
+        self._writable.set()
+        if dropped_ms:
+            self._discarded(dropped_ms, reason)
+        return dropped_ms
+
+    def _discarded(self, audio_ms, reason):
+        RELAY_AUDIO_DISCARDED_SECONDS.labels(self.direction, reason).inc(audio_ms / 1000)
+
+
+class PlaybackTracker:
+    """Where Twilio's playback is, relative to the response audio sent to it.
+
+    Every chunk sent is followed by a `mark`; Twilio echoes marks in order once
+    the audio before them has played, so each acknowledgement pins the played
+    position exactly. Between marks the position is extrapolated in real time.
+    """
+
+    def __init__(self):
+        self.sent_ms = 0.0
+        self.played_ms = 0.0
+        self._marks = deque()
+        self._playback_until = 0.0
+
+    def __bool__(self):
+        """True while Twilio still has unacknowledged audio."""
+        return bool(self._marks)
+
+    def __len__(self):
+        return len(self._marks)
+
+    def sent(self, audio_ms, now):
+        """Record audio handed to Twilio at loop time `now`."""
+        self.sent_ms += audio_ms
+        self._playback_until = max(self._playback_until, now) + audio_ms / 1000
+
+    def mark(self):
+        """Record a mark sent right after the audio so far."""
+        self._marks.append(self.sent_ms)
+
+    def acknowledged(self, now):
+        """Twilio echoed the oldest outstanding mark at loop time `now`."""
+        if self._marks:
+            self.played_ms = self._marks.popleft()
+            self._playback_until = now + (self.sent_ms - self.played_ms) / 1000
+
+    def lead_ms(self, now):
+        """Audio Twilio has buffered but not played yet."""
+        return max(self._playback_until - now, 0) * 1000
+
+    def clear(self, now):
+        """Twilio dropped its buffer; return how many ms of audio were discarded."""
+        discarded_ms = self.lead_ms(now)
+        self._marks.clear()
+        self.played_ms = self.sent_ms
+        self._playback_until = now
+        if discarded_ms:
+            RELAY_AUDIO_DISCARDED_SECONDS.labels("twilio", "cleared").inc(
+                discarded_ms / 1000
+            )
+        return discarded_ms
+
+
+class OutboundPacer:
+    """Feeds queued response audio to Twilio in real time plus a small lead.
+
+    Azure streams a response much faster than it is spoken. Holding it here
+    instead of in Twilio's buffer keeps a barge-in `clear` cheap and lets the
+    queue bound what a slow call can accumulate.
+    """
+
+    def __init__(self, queue, tracker, send_audio, lead_ms=RELAY_PLAYBACK_LEAD_MS):
+        self.queue = queue
+        self.tracker = tracker
+        self.send_audio = send_audio
+        self.lead_ms = lead_ms
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                payload, audio_ms = await self.queue.get()
+                generation = self.queue.generation
+                wait_ms = self.tracker.lead_ms(loop.time()) - self.lead_ms
+                if wait_ms > 0:
+                    await asyncio.sleep(wait_ms / 1000)
+                    if self.queue.generation != generation:
+                        # Cleared by a barge-in while waiting
+                        continue
+                await self.send_audio(payload, audio_ms)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("relay.pacer_stopped", error=str(e))
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from logs import get_logger
+
+# Configuration
+# Empty for the in-process store, or redis://[:password@]host[:port][/db] for a shared one
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_TTL = float(os.getenv("SESSION_TTL", 3600))
+SESSION_MAX_SIZE = int(os.getenv("SESSION_MAX_SIZE", 10000))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+
+log = get_logger(__name__)
+
+
+class SessionStore(ABC):
+    """Per-call session data keyed by CallSid, with TTL expiry.
+
+    Sessions are written by /incoming-call and read by /media-stream, which may
+    be served by a different worker when a shared backend is used.
+    """
+
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get(self, session_id):
+        pass
+
+    @abstractmethod
+    async def set(self, session_id, session, ttl=SESSION_TTL):
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id):
+        pass
+
+    async def update(self, session_id, **fields):
+        """Merge `fields` into an existing session. Returns False if it is gone."""
+        session = await self.get(session_id)
+        if session is None:
+            return False
+        session.update(fields)
+        await self.set(session_id, session)
+        return True
+
+
+class MemorySessionStore(SessionStore):
+    """In-process backend: bounded, insertion-ordered, swept periodically."""
+
+    def __init__(
+        self,
+        ttl=SESSION_TTL,
+        max_size=SESSION_MAX_SIZE,
+        sweep_interval=SESSION_SWEEP_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()
+        self._sweeper = None
+        self.counters = {"expired": 0, "evicted": 0}
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, session_id):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        session, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[session_id]
+            self.counters["expired"] += 1
+            return None
+        return session
+
+    async def set(self, session_id, session, ttl=None):
+        self._entries.pop(session_id, None)
+        self._entries[session_id] = (session, time.monotonic() + (ttl or self.ttl))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    async def delete(self, session_id):
+        self._entries.pop(session_id, None)
+
+    async def update(self, session_id, **fields):
+        # Sessions are shared by reference in-process, so update in place
+        session = await self.get(session_id)
+        if session is None:
+            return False
+        session.update(fields)
+        return True
+
+    def sweep(self):
+        """Drop every expired session. Returns how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._entries.items() if now >= expires_at]
+        for key in expired:
+            del self._entries[key]
+        self.counters["expired"] += len(expired)
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                log.info("session_store.swept", removed=removed)
+
+
+class RedisSessionStore(SessionStore):
+    """Shared backend speaking the Redis protocol (RESP) over one connection.
+
+    Expiry is delegated to the server (SET ... EX), so there is nothing to
+    sweep locally; size bounds come from the server's maxmemory policy. Any
+    server that speaks RESP works, including a local stand-in for testing.
+    """
+
+    def __init__(self, url, ttl=SESSION_TTL, prefix="session:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            try:
+                await self._connect()
+            except BaseException:
+                self._disconnect()
+                raise
+
+    async def close(self):
+        self._disconnect()
+
+    async def get(self, session_id):
+        value = await self.execute("GET", self.prefix + session_id)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, session_id, session, ttl=None):
+        await self.execute(
+            "SET",
+            self.prefix + session_id,
+            json.dumps(session),
+            "EX",
+            int(ttl or self.ttl),
+        )
+
+    async def delete(self, session_id):
+        await self.execute("DEL", self.prefix + session_id)
+
+    async def execute(self, *args):
+        """Send one command and return its decoded reply, reconnecting once on failure."""
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._command(*args)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+                except BaseException:
+                    # Cancelled (or failed) between request and reply: the reply may
+                    # still arrive, and must not be read as the next command's answer
+                    self._disconnect()
+                    raise
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._command("AUTH", self.password)
+        if self.db:
+            await self._command("SELECT", self.db)
+
+    async def _command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readuntil(b"\r\n")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+
+def create_session_store(url=SESSION_STORE_URL):
+    """Pick the backend from SESSION_STORE_URL."""
+    if url.startswith("redis://"):
+        return RedisSessionStore(url)
+    return MemorySessionStore()
@@ -0,0 +1,106 @@
+import time
+import asyncio
+
+import pytest
+
+import admission as admission_module
+from admission import AdmissionController
+from upstream_router import Deployment, UpstreamRouter
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = UpstreamRouter([Deployment("wss://east.example/?deployment=rt", "key")])
+    monkeypatch.setattr(admission_module, "upstream_router", router)
+    return router
+
+
+def test_full_and_stream_admission(router):
+    admission = AdmissionController(max_calls=2)
+    assert admission.admit_call("CA1") is None
+    assert admission.admit_call("CA2") is None
+    assert admission.admit_call("CA3") == "full"
+    assert not admission.accepting()
+    # Streams take the reservations, so the count does not change
+    assert admission.admit_stream()
+    assert admission.admit_stream()
+    assert (admission.active, admission.reserved) == (2, 0)
+    # A stream without a reservation needs a free slot
+    assert not admission.admit_stream()
+    admission.release_stream()
+    assert admission.admit_stream()
+    assert admission.active == 2
+
+
+def test_reservations_expire(router):
+    admission = AdmissionController(max_calls=1, reservation_ttl=0.05)
+    assert admission.admit_call("CA1") is None
+    assert admission.admit_call("CA2") == "full"
+    time.sleep(0.06)
+    # The media stream never connected; the slot is free again
+    assert admission.reserved == 0
+    assert admission.admit_call("CA2") is None
+
+
+def test_refuses_when_every_deployment_is_rate_limited(router):
+    admission = AdmissionController(max_calls=0, min_rate_limit_fraction=0.05)
+    assert admission.admit_call("CA1") is None
+    router.deployments[0].observe_rate_limits(
+        [{"name": "tokens", "limit": 1000, "remaining": 20, "reset_seconds": 60}], time.monotonic()
+    )
+    assert admission.rate_limited()
+    assert admission.admit_call("CA2") == "rate_limited"
+    assert admission.stats()["rate_limited"] == 1
+    # A second deployment with budget left takes the calls
+    router.deployments.append(Deployment("wss://west.example/?deployment=rt", "key"))
+    assert admission.admit_call("CA3") is None
+
+
+def test_budget_that_has_reset_does_not_count(router):
+    admission = AdmissionController(max_calls=0)
+    router.deployments[0].observe_rate_limits(
+        [{"name": "requests", "limit": 100, "remaining": 0, "reset_seconds": 0}], time.monotonic()
+    )
+    assert not admission.rate_limited()
+
+
+def test_drain_waits_for_active_calls(router):
+    async def run():
+        admission = AdmissionController(max_calls=5)
+        assert admission.admit_call("CA1") is None
+        assert admission.admit_stream()
+        drain = asyncio.create_task(admission.drain(timeout=5))
+        await asyncio.sleep(0.01)
+        assert admission.draining and not drain.done()
+        assert admission.admit_call("CA2") == "draining"
+        admission.release_stream()
+        assert await drain
+
+        admission.resume()
+        assert admission.admit_call("CA3") is None
+
+    asyncio.run(run())
+
+
+def test_drain_times_out(router):
+    async def run():
+        admission = AdmissionController(max_calls=5)
+        assert admission.admit_call("CA1") is None
+        assert admission.admit_stream()
+        assert not await admission.drain(timeout=0.02)
+        assert admission.stats()["draining"] == 1
+
+    asyncio.run(run())
+
+
+def test_drain_ends_when_the_last_reservation_expires(router):
+    async def run():
+        admission = AdmissionController(max_calls=5, reservation_ttl=0.02)
+        assert admission.admit_call("CA1") is None
+        admission.start_drain()
+        await asyncio.sleep(0.03)
+        # Expiry is noticed the next time reservations are counted
+        assert admission.reserved == 0
+        assert await admission.drain(timeout=0.1)
+
+    asyncio.run(run())
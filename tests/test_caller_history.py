@@ -0,0 +1,58 @@
+import pytest
+
+from caller_history import CallerHistory, caller_name
+from transcripts import Turn
+
+
+@pytest.mark.parametrize(
+    "text, name",
+    [
+        ("My name is Ana.", "Ana"),
+        ("I'm Ana.", "Ana"),
+        ("I’m Ana, hi.", "Ana"),
+        ("This is Ana speaking", "Ana"),
+        ("I am Ana", "Ana"),
+        ("It's Bob here", "Bob"),
+        ("Hello, my name is Ana", "Ana"),
+        ("I'm fine, thanks", None),
+        ("I'm Calling about the game", None),
+        ("This is great", None),
+        ("What is the game today?", None),
+    ],
+)
+def test_caller_name(text, name):
+    assert caller_name([Turn(0, "user", text)]) == name
+
+
+def test_caller_name_ignores_the_agent_and_prefers_the_latest():
+    turns = [
+        Turn(0, "agent", "Hi, I'm Ada."),
+        Turn(1, "user", "My name is Ana."),
+        Turn(2, "user", "Sorry, it's Anna with two n's."),
+    ]
+    assert caller_name(turns) == "Anna"
+
+
+def test_record_call_keeps_a_bounded_summary():
+    history = CallerHistory(path="", enabled=True, max_callers=2)
+    turns = [Turn(0, "user", "I'm Ana."), Turn(1, "agent", "Here is a dad joke for you.")]
+    history.record_call("+1555", turns)
+    summary = history.record_call("+1555", [Turn(0, "user", "Hello again")])
+    assert (summary.name, summary.calls, summary.shared) == ("Ana", 2, ["a dad joke"])
+    history.record_call("+1666", turns)
+    history.record_call("+1777", turns)
+    assert history.get("+1555") is None
+    assert history.stats()["callers"] == 2
+
+
+def test_first_message_without_a_name():
+    history = CallerHistory(
+        path="",
+        enabled=True,
+        first_message="Greet {name} by name.",
+        first_message_unnamed="Welcome the caller back.",
+    )
+    named = history.record_call("+1555", [Turn(0, "user", "This is Ana.")])
+    unnamed = history.record_call("+1666", [Turn(0, "user", "Hello there")])
+    assert history.first_message(named) == "Greet Ana by name."
+    assert history.first_message(unnamed) == "Welcome the caller back."
@@ -0,0 +1,70 @@
+import json
+import asyncio
+
+from events import EventDispatcher, peek_type
+
+
+def test_peek_type_reads_the_prefix():
+    assert peek_type('{"type":"response.audio.delta","delta":"AAAA"}') == ("response.audio.delta", None)
+    assert peek_type('{ "type" : "session.updated", "session": {}}') == ("session.updated", None)
+
+
+def test_peek_type_parses_when_type_is_not_first():
+    message = json.dumps({"event_id": "ev1", "type": "error", "error": {"message": "bad"}})
+    event_type, event = peek_type(message)
+    assert event_type == "error"
+    assert event["error"] == {"message": "bad"}
+    assert peek_type(b'{"type":"response.done"}') == ("response.done", {"type": "response.done"})
+
+
+def test_peek_type_on_malformed_and_non_dict_frames():
+    for message in ("", "not json", '{"type":', "[1, 2]", '"response.done"', "42", "null"):
+        assert peek_type(message) == (None, None)
+    assert peek_type("{}") == (None, {})
+
+
+def test_dispatch_routes_by_type():
+    async def run():
+        dispatcher = EventDispatcher()
+        seen = []
+
+        async def on_done(event):
+            seen.append(("done", event["response"]["id"]))
+
+        @dispatcher.on("response.done")
+        async def on_done_again(event):
+            seen.append(("again", event["response"]["id"]))
+
+        dispatcher.on("response.done", on_done)
+        dispatcher.on("error", on_done)
+        dispatcher.off("error", on_done)
+        assert dispatcher.handles("response.done")
+        assert not dispatcher.handles("error")
+
+        event = await dispatcher.dispatch('{"type":"response.done","response":{"id":"r1"}}')
+        assert event == {"type": "response.done", "response": {"id": "r1"}}
+        assert seen == [("again", "r1"), ("done", "r1")]
+        assert dispatcher.received_at is not None
+
+        assert await dispatcher.dispatch('{"type":"response.audio_transcript.delta","delta":"hi"}') is None
+        assert await dispatcher.dispatch('{"type":"error","error":{}}') is None
+        assert dispatcher.counters == {"dispatched": 1, "skipped": 2, "malformed": 0}
+
+    asyncio.run(run())
+
+
+def test_dispatch_skips_malformed_frames():
+    async def run():
+        dispatcher = EventDispatcher()
+        seen = []
+
+        async def on_any(event):
+            seen.append(event)
+
+        dispatcher.on(None, on_any)
+        for message in ("not json", "[1, 2]", '{"event_id": "ev1"}'):
+            assert await dispatcher.dispatch(message) is None
+        assert seen == []
+        assert dispatcher.counters["malformed"] == 3
+
+    asyncio.run(run())
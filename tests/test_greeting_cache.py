@@ -0,0 +1,68 @@
+import json
+import threading
+
+from greeting_cache import GreetingCache
+
+TEXT = "Say hello"
+VOICE = "alloy"
+
+
+def test_store_then_get(tmp_path):
+    cache = GreetingCache(directory=str(tmp_path))
+    cache.store(TEXT, VOICE, b"\xff" * 800, "Hello!")
+    greeting = GreetingCache(directory=str(tmp_path)).get(TEXT, VOICE)
+    assert greeting.transcript == "Hello!"
+    assert bytes(greeting.audio) == b"\xff" * 800
+    assert len(list(greeting.chunks(chunk_ms=50))) == 2
+
+
+def test_first_rendering_wins(tmp_path):
+    cache = GreetingCache(directory=str(tmp_path))
+    cache.store(TEXT, VOICE, b"\x01" * 80, "first")
+    cache.store(TEXT, VOICE, b"\x02" * 80, "second")
+    assert GreetingCache(directory=str(tmp_path)).get(TEXT, VOICE).transcript == "first"
+
+
+def test_audio_that_does_not_match_its_metadata_is_a_miss(tmp_path):
+    cache = GreetingCache(directory=str(tmp_path))
+    cache.store(TEXT, VOICE, b"\x01" * 80, "first")
+    base = tmp_path / cache.key(TEXT, VOICE)
+    (base.with_suffix(".ulaw")).write_bytes(b"\x02" * 80)
+    assert GreetingCache(directory=str(tmp_path)).get(TEXT, VOICE) is None
+    # The next recording replaces the broken entry
+    cache.store(TEXT, VOICE, b"\x03" * 40, "third")
+    assert GreetingCache(directory=str(tmp_path)).get(TEXT, VOICE).transcript == "third"
+
+
+def test_concurrent_stores_never_pair_one_rendering_with_another(tmp_path):
+    for run in range(200):
+        directory = tmp_path / str(run)
+        cache = GreetingCache(directory=str(directory))
+        errors = []
+
+        def store(byte, transcript):
+            try:
+                cache.store(TEXT, VOICE, bytes([byte]) * 4000, transcript)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=store, args=(i + 1, f"rendering {i + 1}")) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        greeting = GreetingCache(directory=str(directory)).get(TEXT, VOICE)
+        if greeting is not None:
+            assert greeting.transcript == f"rendering {greeting.audio[0]}"
+        assert not [name for name in directory.iterdir() if name.suffix == ".tmp"]
+
+
+def test_prune_keeps_the_newest_entries(tmp_path):
+    cache = GreetingCache(directory=str(tmp_path), max_entries=2)
+    for i in range(4):
+        cache.store(f"text {i}", VOICE, b"\xff" * 8, f"t{i}")
+    assert len([name for name in tmp_path.iterdir() if name.suffix == ".json"]) == 2
+    assert cache.get("text 3", VOICE).transcript == "t3"
+    meta = json.loads((tmp_path / (cache.key("text 3", VOICE) + ".json")).read_text())
+    assert meta["bytes"] == 8
@@ -0,0 +1,20 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import local_vad
+
+local_vad.load_numpy()
+
+
+def test_frame_features_short_frames():
+    for pcm in (np.array([], dtype=np.int16), np.array([1200], dtype=np.int16)):
+        level_db, zcr = local_vad.frame_features(pcm)
+        assert zcr == 0
+        assert level_db < 0
+
+
+def test_frame_features_counts_crossings():
+    level_db, zcr = local_vad.frame_features(np.array([1000, -1000, 1000, -1000, 1000], dtype=np.int16))
+    assert zcr == 1.0
+    assert -31 < level_db < -30
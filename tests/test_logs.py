@@ -0,0 +1,32 @@
+import io
+import json
+import logging
+
+import logs
+
+
+def test_records_after_stop_logging_are_written():
+    stream = io.StringIO()
+    root = logging.getLogger()
+    saved_handlers, saved_level = list(root.handlers), root.level
+    try:
+        logs.setup_logging(level="INFO", log_format="json", stream=stream)
+        log = logs.get_logger("test_logs")
+        logs.bind_call(call_sid="CA1")
+        log.info("before.stop", n=1)
+        logs.stop_logging()
+        log.info("after.stop", n=2)
+        logs.stop_logging()
+        log.warning("after.second_stop")
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [event["event"] for event in events] == ["before.stop", "after.stop", "after.second_stop"]
+        assert events[1]["call_sid"] == "CA1" and events[1]["n"] == 2
+        assert logs.logging_stats()["queue_depth"] == 0
+    finally:
+        logs.call_context.set(None)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in saved_handlers:
+            root.addHandler(handler)
+        root.setLevel(saved_level)
@@ -0,0 +1,119 @@
+import json
+import time
+import asyncio
+
+from outbox import Outbox
+
+
+class Webhook:
+    """Records deliveries; fails while `down`."""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.delivered = []
+        self.attempts = 0
+
+    async def __call__(self, payload):
+        self.attempts += 1
+        if self.down:
+            raise RuntimeError("webhook down")
+        self.delivered.append(payload)
+
+
+def spool_records(path):
+    with open(path, encoding="utf-8") as spool:
+        return [json.loads(line) for line in spool]
+
+
+def test_enqueue_deduplicates_by_key(tmp_path):
+    outbox = Outbox(Webhook(), path=str(tmp_path / "outbox.jsonl"))
+    outbox.enqueue("CA1", {"data2": "first"})
+    outbox.enqueue("CA1", {"data2": "second"})
+    outbox.enqueue("CA2", {"data2": "other"})
+    assert outbox.stats()["pending"] == 2
+    assert outbox.stats()["deduplicated"] == 1
+    assert outbox._pending["CA1"]["payload"] == {"data2": "second"}
+    # The replaced put is acked in the spool, so it is not replayed either
+    records = spool_records(tmp_path / "outbox.jsonl")
+    assert [record["op"] for record in records] == ["put", "ack", "put", "put"]
+    assert records[1]["id"] == records[0]["id"]
+
+
+def test_restart_replays_unacked_entries_and_compacts_the_spool(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    first = Outbox(Webhook(), path=path)
+    first.enqueue("CA1", {"data2": "one"})
+    first.enqueue("CA1", {"data2": "one, newer"})
+    first.enqueue("CA2", {"data2": "two"})
+    first._append({"op": "ack", "id": first._pending["CA2"]["id"]})
+    # A torn write at the tail is skipped
+    with open(path, "a", encoding="utf-8") as spool:
+        spool.write('{"op": "put", "id": "torn')
+    first._file.close()
+
+    restarted = Outbox(Webhook(), path=path)
+    restarted._load()
+    assert list(restarted._pending) == ["CA1"]
+    assert restarted._pending["CA1"]["payload"] == {"data2": "one, newer"}
+    records = spool_records(path)
+    assert [(record["op"], record["key"]) for record in records] == [("put", "CA1")]
+
+
+def test_worker_delivers_acks_and_a_restart_has_nothing_to_replay(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    webhook = Webhook()
+
+    async def run():
+        outbox = Outbox(webhook, path=path)
+        await outbox.start()
+        outbox.enqueue("CA1", {"data2": "one"})
+        for _ in range(100):
+            if webhook.delivered:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.close(timeout=1)
+
+    asyncio.run(run())
+    assert webhook.delivered == [{"data2": "one"}]
+    restarted = Outbox(Webhook(), path=path)
+    restarted._load()
+    assert restarted.stats()["pending"] == 0
+
+
+def test_failed_delivery_backs_off(tmp_path):
+    webhook = Webhook(down=True)
+    outbox = Outbox(webhook, path=str(tmp_path / "outbox.jsonl"))
+    outbox.enqueue("CA1", {"data2": "one"})
+    entry = outbox._pending["CA1"]
+
+    asyncio.run(outbox._deliver_due())
+    assert (webhook.attempts, entry["attempts"]) == (1, 1)
+    assert entry["next_attempt"] > time.monotonic()
+    # Not due yet: nothing is attempted
+    asyncio.run(outbox._deliver_due())
+    assert webhook.attempts == 1
+
+
+def test_close_attempts_only_due_entries_once_and_keeps_the_rest(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    webhook = Webhook(down=True)
+
+    async def run():
+        outbox = Outbox(webhook, path=path)
+        await outbox.start()
+        outbox.enqueue("CA1", {"data2": "backing off"})
+        outbox.enqueue("CA2", {"data2": "due"})
+        outbox._pending["CA1"]["next_attempt"] = time.monotonic() + 300
+        # Keep the worker from delivering before close()
+        outbox._worker.cancel()
+        outbox._worker = asyncio.create_task(asyncio.sleep(3600))
+        started = time.monotonic()
+        await outbox.close(timeout=5)
+        return time.monotonic() - started
+
+    took = asyncio.run(run())
+    assert webhook.attempts == 1
+    assert took < 1
+    restarted = Outbox(Webhook(), path=path)
+    restarted._load()
+    assert sorted(restarted._pending) == ["CA1", "CA2"]
@@ -0,0 +1,79 @@
+import json
+import asyncio
+
+import pytest
+
+import realtime_pool
+from realtime_pool import RealtimeConnectionPool
+from upstream_router import Deployment, UpstreamRouter
+
+
+class FakeSocket:
+    """Acknowledges the session configuration, then stays quiet."""
+
+    def __init__(self):
+        self.open = True
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.sent:
+            return json.dumps({"type": "session.updated"})
+        await asyncio.sleep(60)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        self.open = False
+
+
+class FakeDeployment(Deployment):
+    def __init__(self, host, hanging=False):
+        super().__init__(f"wss://{host}/openai/realtime?deployment=rt", "key")
+        self.hanging = hanging
+
+    async def connect(self):
+        if self.hanging:
+            await asyncio.sleep(60)
+        return FakeSocket()
+
+
+async def configure(openai_ws):
+    await openai_ws.send(json.dumps({"type": "session.update"}))
+
+
+def test_open_fails_over_past_the_connect_timeout(monkeypatch):
+    # Two hanging deployments take longer than the pool's own timeout
+    monkeypatch.setattr(realtime_pool, "REALTIME_CONNECT_TIMEOUT", 0.08)
+
+    async def run():
+        deployments = [FakeDeployment("east", hanging=True), FakeDeployment("west", hanging=True)]
+        router = UpstreamRouter(deployments + [FakeDeployment("north")], attempt_timeout=0.05)
+        pool = RealtimeConnectionPool(router.connect, configure, size=0)
+        openai_ws = await pool.acquire()
+        assert router.deployment_for(openai_ws).name == "north/rt"
+        assert pool.stats()["opened"] == 1
+        assert [d.consecutive_failures for d in deployments] == [1, 1]
+
+    asyncio.run(run())
+
+
+def test_open_times_out_waiting_for_session_updated(monkeypatch):
+    monkeypatch.setattr(realtime_pool, "REALTIME_CONNECT_TIMEOUT", 0.05)
+
+    async def run():
+        router = UpstreamRouter([FakeDeployment("east")])
+
+        async def ignore(openai_ws):
+            pass
+
+        pool = RealtimeConnectionPool(router.connect, ignore, size=0)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.acquire()
+        assert pool.stats()["open_failures"] == 1
+        assert pool.stats()["discarded"] == 1
+
+    asyncio.run(run())
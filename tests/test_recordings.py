@@ -0,0 +1,36 @@
+import os
+import time
+
+from recordings import CallRecorder
+
+
+def write_recording(directory, name, size, age_seconds):
+    path = directory / name
+    path.write_bytes(b"\xff" * size)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_retention_deletes_expired_and_oldest_over_size(tmp_path):
+    recorder = CallRecorder(directory=str(tmp_path), retention_days=1, max_total_mb=1)
+    expired = write_recording(tmp_path, "a_CA1.wav", 1000, 2 * 86400)
+    oldest = write_recording(tmp_path, "b_CA2.wav", 800 * 1024, 3600)
+    newer = write_recording(tmp_path, "c_CA3.wav", 800 * 1024, 1800)
+    other = write_recording(tmp_path, "notes.txt", 10, 3 * 86400)
+    recorder._enforce_retention(set())
+    assert not expired.exists() and not oldest.exists()
+    assert newer.exists() and other.exists()
+    assert recorder.writer_counters["deleted_files"] == 2
+
+
+def test_retention_skips_recordings_in_progress(tmp_path):
+    recorder = CallRecorder(directory=str(tmp_path), retention_days=0.0001, max_total_mb=0.001)
+    # Open in this recorder, however old
+    own = write_recording(tmp_path, "a_CA1.wav", 10000, 86400)
+    # Still being written by another worker sharing the directory
+    other_worker = write_recording(tmp_path, "b_CA2.wav", 10000, 5)
+    finished = write_recording(tmp_path, "c_CA3.wav", 10000, 3600)
+    recorder._enforce_retention({str(own)})
+    assert own.exists() and other_worker.exists()
+    assert not finished.exists()
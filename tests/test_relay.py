@@ -0,0 +1,141 @@
+import os
+import sys
+import asyncio
+import subprocess
+
+import pytest
+
+from metrics import RELAY_AUDIO_DISCARDED_SECONDS
+from relay import BoundedAudioQueue, PlaybackTracker, OutboundPacer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def discarded_seconds(direction, reason):
+    return RELAY_AUDIO_DISCARDED_SECONDS.labels(direction, reason).value
+
+
+def test_drop_oldest_keeps_newest_audio():
+    async def run():
+        queue = BoundedAudioQueue("test_drop_oldest", max_ms=60, overflow="drop_oldest")
+        for index in range(5):
+            assert await queue.put(f"chunk{index}", 20)
+        assert queue.queued_ms == 60
+        assert [await queue.get() for _ in range(3)] == [("chunk2", 20), ("chunk3", 20), ("chunk4", 20)]
+
+    asyncio.run(run())
+    assert discarded_seconds("test_drop_oldest", "overflow") == pytest.approx(0.04)
+
+
+def test_drop_newest_keeps_oldest_audio():
+    async def run():
+        queue = BoundedAudioQueue("test_drop_newest", max_ms=60, overflow="drop_newest")
+        accepted = [await queue.put(f"chunk{index}", 20) for index in range(5)]
+        assert accepted == [True, True, True, False, False]
+        assert [await queue.get() for _ in range(3)] == [("chunk0", 20), ("chunk1", 20), ("chunk2", 20)]
+
+    asyncio.run(run())
+    assert discarded_seconds("test_drop_newest", "overflow") == pytest.approx(0.04)
+
+
+def test_block_waits_for_the_consumer():
+    async def run():
+        queue = BoundedAudioQueue("test_block", max_ms=40, overflow="block")
+        await queue.put("chunk0", 20)
+        await queue.put("chunk1", 20)
+        blocked = asyncio.create_task(queue.put("chunk2", 20))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        assert await queue.get() == ("chunk0", 20)
+        assert await blocked
+        assert queue.queued_ms == 40
+
+    asyncio.run(run())
+    assert discarded_seconds("test_block", "overflow") == 0
+
+
+def test_clear_records_discarded_audio():
+    async def run():
+        queue = BoundedAudioQueue("test_clear", max_ms=1000, overflow="drop_newest")
+        for index in range(3):
+            await queue.put(f"chunk{index}", 20)
+        generation = queue.generation
+        assert queue.clear("barge_in") == 60
+        assert queue.generation == generation + 1
+        assert queue.queued_ms == 0 and len(queue) == 0
+        # Nothing queued: nothing recorded
+        assert queue.clear("barge_in") == 0
+
+    asyncio.run(run())
+    assert discarded_seconds("test_clear", "barge_in") == pytest.approx(0.06)
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedAudioQueue("test_unknown", max_ms=100, overflow="drop_all")
+
+
+def test_block_outbound_overflow_is_rejected():
+    env = dict(os.environ, RELAY_OUTBOUND_OVERFLOW="block")
+    result = subprocess.run(
+        [sys.executable, "-c", "import relay"], cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode != 0
+    assert "RELAY_OUTBOUND_OVERFLOW must be drop_oldest or drop_newest" in result.stderr
+
+
+def test_playback_tracker_marks_after_clear():
+    tracker = PlaybackTracker()
+    tracker.sent(100, now=0.0)
+    tracker.mark()
+    tracker.sent(100, now=0.0)
+    tracker.mark()
+    assert len(tracker) == 2
+    assert tracker.lead_ms(0.05) == pytest.approx(150)
+
+    # Twilio dropped its buffer 50 ms into playback
+    assert tracker.clear(0.05) == pytest.approx(150)
+    assert not tracker
+    assert tracker.played_ms == 200
+    assert tracker.lead_ms(0.05) == 0
+    # A late echo of a cleared mark does not move playback back
+    tracker.acknowledged(0.06)
+    assert tracker.played_ms == 200
+
+    tracker.sent(40, now=1.0)
+    tracker.mark()
+    assert tracker.lead_ms(1.0) == pytest.approx(40)
+    tracker.acknowledged(1.04)
+    assert tracker.played_ms == 240
+    assert tracker.lead_ms(1.04) == 0
+
+
+def test_pacer_bounds_playback_lead():
+    async def run():
+        loop = asyncio.get_running_loop()
+        queue = BoundedAudioQueue("test_pacer", max_ms=10000, overflow="drop_newest")
+        tracker = PlaybackTracker()
+        leads = []
+        done = asyncio.Event()
+
+        async def send_audio(payload, audio_ms):
+            now = loop.time()
+            leads.append(tracker.lead_ms(now))
+            tracker.sent(audio_ms, now)
+            if len(leads) == 20:
+                done.set()
+
+        pacer = OutboundPacer(queue, tracker, send_audio, lead_ms=100)
+        for index in range(20):
+            await queue.put(f"chunk{index}", 20)
+        started = loop.time()
+        pacer.start()
+        await asyncio.wait_for(done.wait(), 5)
+        pacer.close()
+        return leads, loop.time() - started
+
+    leads, elapsed = asyncio.run(run())
+    # Sent no further ahead of playback than the lead...
+    assert max(leads) <= 100 + 1
+    # ...so the last chunk waits until 280 of the 380 ms before it have played
+    assert elapsed >= 0.27
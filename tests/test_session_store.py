@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from mock_redis import MockRedisServer
+from session_store import MemorySessionStore, RedisSessionStore, SessionStore
+
+
+async def connected_store(**server_kwargs):
+    server = MockRedisServer(**server_kwargs)
+    port = await server.start()
+    password = server_kwargs.get("password")
+    auth = f":{password}@" if password else ""
+    store = RedisSessionStore(f"redis://{auth}127.0.0.1:{port}/2")
+    await store.start()
+    return server, store
+
+
+def test_set_get_delete():
+    async def run():
+        server, store = await connected_store(password="secret")
+        try:
+            assert await store.get("CA1") is None
+            await store.set("CA1", {"caller_number": "+1555"})
+            assert await store.get("CA1") == {"caller_number": "+1555"}
+            await store.delete("CA1")
+            assert await store.get("CA1") is None
+        finally:
+            await store.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_command_reply_is_not_read_by_the_next_one():
+    async def run():
+        server, store = await connected_store(reply_delay_ms=50)
+        try:
+            await store.set("A", {"caller_number": "+1A"})
+            await store.set("B", {"caller_number": "+1B"})
+            pending = asyncio.create_task(store.get("A"))
+            await asyncio.sleep(0.01)
+            pending.cancel()
+            try:
+                await pending
+            except asyncio.CancelledError:
+                pass
+            assert await store.get("B") == {"caller_number": "+1B"}
+        finally:
+            await store.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_reconnects_after_the_server_drops_the_connection():
+    async def run():
+        server, store = await connected_store()
+        try:
+            await store.set("A", {"caller_number": "+1A"})
+            store._writer.transport.abort()
+            await asyncio.sleep(0)
+            assert await store.get("A") == {"caller_number": "+1A"}
+        finally:
+            await store.close()
+            await server.close()
+
+    asyncio.run(run())
+
+
+def test_backends_must_implement_the_store_interface():
+    class Incomplete(SessionStore):
+        async def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    MemorySessionStore()
@@ -0,0 +1,36 @@
+from tools import Tool
+
+SCHEMA = {"name": "search", "parameters": {}}
+
+
+async def handler(arguments):
+    return "result"
+
+
+def tool(instructions):
+    return Tool(SCHEMA, handler, timeout=1, max_concurrency=1, instructions=instructions)
+
+
+def test_render_instructions_fills_in_arguments_and_output():
+    rendered = tool("Answer {query} from: {output}").render_instructions({"query": "news"}, "headlines")
+    assert rendered == "Answer news from: headlines"
+
+
+def test_render_instructions_keeps_the_tool_output_over_an_argument_named_output():
+    rendered = tool("{output}").render_instructions({"output": "from the model"}, "from the tool")
+    assert rendered == "from the tool"
+
+
+def test_render_instructions_with_unusable_arguments():
+    assert tool("Answer {query}").render_instructions({}, "x") is None
+    assert tool("Answer {0}").render_instructions({"query": "news"}, "x") is None
+    assert tool("Answer {query[k]}").render_instructions({"query": "news"}, "x") is None
+    assert tool("Answer {query}").render_instructions(["news"], "x") is None
+
+
+def test_render_instructions_passes_braces_in_argument_values_through():
+    assert tool("Answer {query}").render_instructions({"query": "{x} [0]"}, "y") == "Answer {x} [0]"
+
+
+def test_no_instructions():
+    assert tool(None).render_instructions({"query": "news"}, "x") is None
@@ -0,0 +1,120 @@
+import time
+import asyncio
+
+import pytest
+
+from upstream_router import Deployment, UpstreamRouter, deployment_name
+
+
+class FakeSocket:
+    def __init__(self):
+        self.open = True
+
+
+class FakeDeployment(Deployment):
+    """Connects instantly, fails while `down`, or hangs while `hanging`."""
+
+    def __init__(self, host, down=False, hanging=False):
+        super().__init__(f"wss://{host}/openai/realtime?deployment=rt", "key")
+        self.down = down
+        self.hanging = hanging
+        self.attempts = 0
+
+    async def connect(self):
+        self.attempts += 1
+        if self.hanging:
+            await asyncio.sleep(60)
+        if self.down:
+            raise OSError(f"{self.name} refused")
+        return FakeSocket()
+
+
+def budget(deployment, remaining, limit=1000):
+    deployment.observe_rate_limits(
+        [{"name": "tokens", "limit": limit, "remaining": remaining, "reset_seconds": 60}],
+        time.monotonic(),
+    )
+
+
+def test_deployment_name():
+    assert deployment_name("wss://east.example/openai/realtime?api-version=1&deployment=rt") == "east.example/rt"
+    assert deployment_name("ws://127.0.0.1:8765") == "127.0.0.1:8765"
+
+
+def test_ranked_by_headroom_then_connections():
+    async def run():
+        east, west, north = FakeDeployment("east"), FakeDeployment("west"), FakeDeployment("north")
+        router = UpstreamRouter([east, west, north])
+        budget(east, 100)
+        budget(west, 900)
+        budget(north, 880)
+        assert router.ranked() == [west, north, east]
+        # west and north are in the same 10% step, so they balance on open sockets
+        sockets = [await router.connect() for _ in range(3)]
+        assert [router.deployment_for(s) for s in sockets] == [west, north, west]
+        assert router.ranked() == [north, west, east]
+        # A closed socket no longer counts as load
+        sockets[0].open = False
+        sockets[2].open = False
+        assert router.ranked() == [west, north, east]
+        assert router.headroom() == pytest.approx(0.9)
+
+    asyncio.run(run())
+
+
+def test_failover_and_cooldown():
+    async def run():
+        east, west = FakeDeployment("east", down=True), FakeDeployment("west")
+        router = UpstreamRouter([east, west])
+        openai_ws = await router.connect()
+        assert router.deployment_for(openai_ws) is west
+        assert east.attempts == 1 and east.consecutive_failures == 1
+        assert not east.healthy(time.monotonic())
+        # East is cooling down: not tried again
+        await router.connect()
+        assert east.attempts == 1
+        assert router.ranked() == [west, east]
+
+        # Its headroom does not count while it is unhealthy
+        budget(west, 10)
+        assert router.headroom() == pytest.approx(0.01)
+
+    asyncio.run(run())
+
+
+def test_all_down_tries_the_soonest_cooldown_first():
+    async def run():
+        east, west = FakeDeployment("east", down=True), FakeDeployment("west", down=True)
+        router = UpstreamRouter([east, west])
+        with pytest.raises(ConnectionError):
+            await router.connect()
+        # East failed first, so its cooldown ends first
+        assert router.ranked() == [east, west]
+        west.down = False
+        openai_ws = await router.connect()
+        assert (east.attempts, west.attempts) == (2, 2)
+        assert router.deployment_for(openai_ws) is west
+        assert west.consecutive_failures == 0 and west.healthy(time.monotonic())
+        # East's second failure doubled its cooldown
+        assert east.consecutive_failures == 2
+        assert router.ranked() == [west, east]
+
+    asyncio.run(run())
+
+
+def test_attempt_timeout_fails_over():
+    async def run():
+        east, west = FakeDeployment("east", hanging=True), FakeDeployment("west")
+        router = UpstreamRouter([east, west], attempt_timeout=0.05)
+        openai_ws = await router.connect()
+        assert router.deployment_for(openai_ws) is west
+        assert "TimeoutError" in east.last_error
+
+    asyncio.run(run())
+
+
+def test_deployment_for_unknown_socket():
+    router = UpstreamRouter([FakeDeployment("east")])
+    assert router.deployment_for(FakeSocket()) is None
+    router.observe_rate_limits(FakeSocket(), [{"name": "tokens", "limit": 10, "remaining": 0}])
+    assert router.headroom() == 1.0
@@ -1,14 +1,162 @@
 import os
-import logging
+import time
+import asyncio
+from collections import OrderedDict
 from dotenv import load_dotenv
-from tavily import AsyncTavilyClient
+
+from logs import get_logger
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger(__name__)
+log = get_logger(__name__)
+
+# Comma-separated tools offered to the model, e.g. "tavily_search" (empty: none)
+TOOLS_ENABLED = os.getenv("TOOLS_ENABLED", "")
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("TOOL_DEFAULT_TIMEOUT", 8))
+TOOL_DEFAULT_CONCURRENCY = int(os.getenv("TOOL_DEFAULT_CONCURRENCY", 4))
+TAVILY_CACHE_TTL = float(os.getenv("TAVILY_CACHE_TTL", 900))
+TAVILY_CACHE_MAX_SIZE = int(os.getenv("TAVILY_CACHE_MAX_SIZE", 256))
+
+
+## REGISTRY
+
+
+class Tool:
+    """A function the realtime model can call, with its own timeout and concurrency limit."""
+
+    def __init__(self, schema, handler, timeout, max_concurrency, instructions=None, warm_up=None):
+        self.schema = schema
+        self.name = schema["name"]
+        self.handler = handler
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Optional response.create instructions, formatted with the call
+        # arguments and the tool `output`
+        self.instructions = instructions
+        # Optional blocking setup (SDK imports, clients) run off the event loop after startup
+        self.warm_up = warm_up
+
+    def render_instructions(self, arguments, output):
+        """The instructions filled in with the call's arguments and `output`, or None.
+
+        None when the tool has no instructions or they cannot be filled in
+        from what the model passed (a missing or oddly named argument).
+        """
+        if not self.instructions:
+            return None
+        values = dict(arguments) if isinstance(arguments, dict) else dict()
+        values["output"] = output
+        try:
+            return self.instructions.format_map(values)
+        except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+            log.warning("tool.instructions_failed", name=self.name, error=repr(e))
+            return None
+
+
+class ToolRegistry:
+    """Registered tools, looked up by the name the model calls them with."""
+
+    def __init__(self):
+        self._tools = dict()
+        # Tool name -> function that registers it, for tools that are not loaded yet
+        self._loaders = dict()
+
+    def register(
+        self,
+        schema,
+        handler,
+        timeout=TOOL_DEFAULT_TIMEOUT,
+        max_concurrency=TOOL_DEFAULT_CONCURRENCY,
+        instructions=None,
+        warm_up=None,
+    ):
+        tool = Tool(schema, handler, timeout, max_concurrency, instructions, warm_up)
+        self._tools[tool.name] = tool
+        return tool
+
+    def loader(self, name):
+        """Decorator: `function` registers the tool `name` when it is enabled."""
+
+        def decorator(function):
+            self._loaders[name] = function
+            return function
+
+        return decorator
+
+    def load(self, names):
+        """Register the comma-separated tools in `names`; unknown names fail fast."""
+        for name in [name.strip() for name in names.split(",") if name.strip()]:
+            if name in self._tools:
+                continue
+            loader = self._loaders.get(name)
+            if loader is None:
+                raise ValueError(
+                    f"Unknown tool {name!r} in TOOLS_ENABLED; available: {', '.join(sorted(self._loaders))}"
+                )
+            loader()
+            log.info("tool.loaded", name=name)
+
+    async def warm_up(self):
+        """Run the loaded tools' warm-up hooks in a thread, once the server is serving."""
+        for tool in list(self._tools.values()):
+            if tool.warm_up is not None:
+                try:
+                    await asyncio.to_thread(tool.warm_up)
+                except Exception as e:
+                    log.warning("tool.warm_up_failed", name=tool.name, error=str(e))
+
+    def get(self, name):
+        return self._tools.get(name)
+
+    def schemas(self):
+        """Tool definitions for the `tools` field of session.update."""
+        return [tool.schema for tool in self._tools.values()]
+
+    async def run(self, name, arguments):
+        """Run a tool within its concurrency limit and timeout, returning its output text."""
+        tool = self._tools.get(name)
+        if tool is None:
+            raise KeyError(f"Unknown tool: {name}")
+
+        async def limited():
+            async with tool.semaphore:
+                return await tool.handler(**arguments)
+
+        return await asyncio.wait_for(limited(), tool.timeout)
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def normalize_query(query):
+    """Cache key for a search query: case, whitespace and trailing punctuation ignored."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+tool_registry = ToolRegistry()
 
 ## TOOLS
 
@@ -32,19 +180,31 @@ tavily_search_tool_json = {
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
-if not TAVILY_API_KEY:
-    raise ValueError(
-        "Missing the Azure OpenAI API key. Please set it in the .env file."
-    )
+_tavily_client = None
+tavily_cache = TTLCache(ttl=TAVILY_CACHE_TTL, max_size=TAVILY_CACHE_MAX_SIZE)
 
-atavily_client = AsyncTavilyClient(api_key=TAVILY_API_KEY)
+
+def tavily_client():
+    """The Tavily client, built (and its SDK imported) on first use."""
+    global _tavily_client
+    if _tavily_client is None:
+        from tavily import AsyncTavilyClient
+
+        _tavily_client = AsyncTavilyClient(api_key=TAVILY_API_KEY)
+    return _tavily_client
 
 
 async def tavily_search(query: str):
     """Search internet with Tavily API for a given search query"""
+    cache_key = normalize_query(query)
+    cached = tavily_cache.get(cache_key)
+    if cached is not None:
+        log.info("tool.search", query=query, cached=True)
+        return cached
+
     try:
-        logger.info(f"🕵 Performing internet search for query: '{query}'")
-        response = await atavily_client.search(
+        log.info("tool.search", query=query, cached=False)
+        response = await tavily_client().search(
             query=query,
             search_depth="basic",
             include_answer=False,
@@ -57,7 +217,7 @@ async def tavily_search(query: str):
         answer = response.get("answer", "")
         results = response.get("results", [])
         if not results:
-            logger.info(f"No results found for '{query}'.")
+            log.info("tool.search_empty", query=query)
             return None
 
         full_content = "\n\n".join([result["content"] for result in results])
@@ -70,9 +230,43 @@ async def tavily_search(query: str):
             ]
         )
 
-        message_content = f"Short answer for '{query}': {answer}\n\nSearch Results:\n\n{formatted_results}"
-        logger.info(message_content)
+        log.debug(
+            "tool.search_results", query=query, answer=answer, results=formatted_results
+        )
 
+        tavily_cache.set(cache_key, (answer, full_content))
         return answer, full_content
     except Exception as e:
-        logger.error(f"❌ Error performing internet search: {str(e)}")
+        log.error("tool.search_failed", query=query, error=str(e))
+
+
+async def run_tavily_search(query: str):
+    """Tool handler: search text for the model, or a polite fallback."""
+    search_result = await tavily_search(query)
+    if search_result:
+        return search_result[1]
+    return "Sorry, no results found for that question."
+
+
+@tool_registry.loader("tavily_search")
+def load_tavily_search():
+    if not TAVILY_API_KEY:
+        raise ValueError(
+            "Missing the Tavily API key. Please set TAVILY_API_KEY in the .env file."
+        )
+    tool_registry.register(
+        tavily_search_tool_json,
+        run_tavily_search,
+        timeout=float(os.getenv("TAVILY_TIMEOUT", 8)),
+        max_concurrency=int(os.getenv("TAVILY_MAX_CONCURRENCY", 4)),
+        instructions=(
+            "Summarize the news and respond to the user's question {query} based on "
+            "this news summary: {output}. Be concise and friendly. Do not use bullet "
+            "points in your response."
+        ),
+        warm_up=tavily_client,
+    )
+
+
+# Only the configured tools are registered (and offered to the model)
+tool_registry.load(TOOLS_ENABLED)
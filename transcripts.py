@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque, OrderedDict
+
+from logs import get_logger
+
+# Configuration
+# Turns of one call kept in memory; older ones are only in the sink
+TRANSCRIPT_WINDOW = int(os.getenv("TRANSCRIPT_WINDOW", 200))
+# Local JSONL file every turn is streamed to ("" disables it)
+TRANSCRIPT_PATH = os.getenv("TRANSCRIPT_PATH", "transcripts.jsonl")
+# Records buffered before a write, and the longest they wait for one
+TRANSCRIPT_FLUSH_RECORDS = int(os.getenv("TRANSCRIPT_FLUSH_RECORDS", 50))
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv("TRANSCRIPT_FLUSH_INTERVAL", 2))
+
+SPEAKER_LABELS = {"user": "User", "agent": "Agent"}
+
+log = get_logger(__name__)
+
+
+class Turn:
+    """One utterance; media timestamps are Twilio stream milliseconds."""
+
+    __slots__ = ("index", "speaker", "text", "item_id", "start_ms", "end_ms", "truncated_ms")
+
+    def __init__(self, index, speaker, text, item_id=None, start_ms=None, end_ms=None, truncated_ms=None):
+        self.index = index
+        self.speaker = speaker
+        self.text = text
+        self.item_id = item_id
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.truncated_ms = truncated_ms
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TranscriptSink:
+    """Append-only JSONL file of every call's turns, written in chunks.
+
+    Records are buffered and written together once `flush_records` have
+    accumulated or `flush_interval` has passed, so a busy server makes one
+    small write every couple of seconds instead of one per utterance.
+    """
+
+    def __init__(
+        self,
+        path=TRANSCRIPT_PATH,
+        flush_records=TRANSCRIPT_FLUSH_RECORDS,
+        flush_interval=TRANSCRIPT_FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._file = None
+        self._flusher = None
+        self.counters = {"records": 0, "writes": 0, "write_failures": 0}
+
+    async def start(self):
+        if self.path and self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, record):
+        if not self.path:
+            return
+        self._buffer.append(json.dumps(record, ensure_ascii=False))
+        self.counters["records"] += 1
+        if len(self._buffer) >= self.flush_records:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self.counters["writes"] += 1
+        except OSError as e:
+            self.counters["write_failures"] += 1
+            log.warning("transcript_sink.write_failed", records=len(lines), error=str(e))
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["buffered"] = len(self._buffer)
+        return stats
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+
+class TurnLog:
+    """Structured, append-only transcript of one call.
+
+    Turns are streamed to the sink as they complete and the newest `window`
+    stay in memory, so a long call costs bounded memory. Details that arrive
+    before a turn's text (the agent's first audio, the caller's speech
+    boundaries, a barge-in truncation) are noted per item and applied when
+    the turn is added; a truncation of a turn already logged is streamed as
+    an update record.
+    """
+
+    def __init__(self, call_sid, sink=None, window=TRANSCRIPT_WINDOW):
+        self.call_sid = call_sid
+        self.sink = sink
+        self.window = window
+        self.turns = deque(maxlen=window)
+        self.count = 0
+        self._pending = OrderedDict()
+
+    @property
+    def evicted(self):
+        return self.count - len(self.turns)
+
+    def note(self, item_id, **fields):
+        """Remember fields (start_ms, end_ms, ...) for the turn `item_id` will become."""
+        if item_id is None:
+            return
+        pending = self._pending.get(item_id)
+        if pending is None:
+            pending = self._pending[item_id] = dict()
+            # Items that never become a turn must not accumulate
+            while len(self._pending) > self.window:
+                self._pending.popitem(last=False)
+        pending.update(fields)
+
+    def add_audio(self, item_id, media_ms, audio_ms):
+        """Response audio for `item_id` that started playing at Twilio time `media_ms`."""
+        pending = self._pending.get(item_id)
+        if pending is None or "start_ms" not in pending:
+            self.note(item_id, start_ms=media_ms, audio_ms=audio_ms)
+        else:
+            pending["audio_ms"] = pending.get("audio_ms", 0) + audio_ms
+
+    def add(self, speaker, text, item_id=None, **fields):
+        """Append a completed turn and stream it to the sink."""
+        pending = self._pending.pop(item_id, None) or dict()
+        pending.update(fields)
+        audio_ms = pending.pop("audio_ms", None)
+        turn = Turn(self.count, speaker, text, item_id, **pending)
+        if turn.start_ms is not None and turn.end_ms is None and audio_ms is not None:
+            played_ms = audio_ms if turn.truncated_ms is None else min(audio_ms, turn.truncated_ms)
+            turn.end_ms = turn.start_ms + int(played_ms)
+        self.turns.append(turn)
+        self.count += 1
+        self._write({"op": "turn", **turn.to_dict()})
+        return turn
+
+    def truncate(self, item_id, audio_end_ms):
+        """Record where a barge-in cut the agent's item off (`conversation.item.truncate`)."""
+        for turn in reversed(self.turns):
+            if turn.item_id == item_id:
+                turn.truncated_ms = audio_end_ms
+                if turn.start_ms is not None:
+                    end_ms = turn.start_ms + audio_end_ms
+                    turn.end_ms = end_ms if turn.end_ms is None else min(turn.end_ms, end_ms)
+                self._write({"op": "truncate", "index": turn.index, "truncated_ms": audio_end_ms, "end_ms": turn.end_ms})
+                return
+        self.note(item_id, truncated_ms=audio_end_ms)
+
+    def render(self):
+        """The transcript text posted to the webhook, rendered once at the end of the call."""
+        lines = []
+        if self.evicted:
+            lines.append(f"\n[{self.evicted} earlier turns omitted]\n")
+        for turn in self.turns:
+            lines.append(f"\n{SPEAKER_LABELS.get(turn.speaker, turn.speaker)}: {turn.text}\n")
+        return "".join(lines)
+
+    def _write(self, record):
+        if self.sink is not None:
+            self.sink.write({"ts": round(time.time(), 3), "call_sid": self.call_sid, **record})
+
+
+# App-lifetime sink shared by every call
+transcript_sink = TranscriptSink()
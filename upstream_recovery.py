@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import asyncio
+
+from logs import get_logger
+from metrics import UPSTREAM_RECONNECT_SECONDS, UPSTREAM_RECONNECTS
+
+# Configuration
+# Reconnects one call may make after its upstream connection drops (0 disables)
+UPSTREAM_MAX_RECONNECTS = int(os.getenv("UPSTREAM_MAX_RECONNECTS", 3))
+# Connection attempts per reconnect, backing off exponentially from this delay
+UPSTREAM_RECONNECT_ATTEMPTS = int(os.getenv("UPSTREAM_RECONNECT_ATTEMPTS", 3))
+UPSTREAM_RECONNECT_BACKOFF = float(os.getenv("UPSTREAM_RECONNECT_BACKOFF", 0.25))
+# Caller audio held while reconnecting, flushed to the new connection afterwards
+UPSTREAM_RECONNECT_BUFFER_MS = int(os.getenv("UPSTREAM_RECONNECT_BUFFER_MS", 5000))
+# Most recent transcript text replayed into the new conversation
+UPSTREAM_REPLAY_MAX_CHARS = int(os.getenv("UPSTREAM_REPLAY_MAX_CHARS", 4000))
+
+log = get_logger(__name__)
+
+
+def replay_items(first_message, turns, max_chars=UPSTREAM_REPLAY_MAX_CHARS):
+    """`conversation.item.create` events that rebuild a conversation on a new connection.
+
+    The first message (the instruction the call opened with) comes first,
+    then the most recent turns of the call's turn log that fit in
+    `max_chars`, one text item each.
+    """
+    kept = []
+    size = 0
+    for turn in reversed(turns):
+        if not turn.text:
+            continue
+        size += len(turn.text)
+        if size > max_chars:
+            break
+        kept.append(("user" if turn.speaker == "user" else "assistant", turn.text))
+    kept.reverse()
+    if first_message:
+        kept.insert(0, ("user", first_message))
+    return [
+        {
+            "type": "conversation.item.create",
+            "item": {
+                "type": "message",
+                "role": role,
+                "content": [
+                    {"type": "input_text" if role == "user" else "text", "text": text}
+                ],
+            },
+        }
+        for role, text in kept
+    ]
+
+
+class UpstreamReconnector:
+    """Reopens a call's upstream connection after it drops, within a bounded budget.
+
+    `acquire` returns a connected socket already configured by
+    `initialize_session` (the connection pool's acquire). Each reconnect makes
+    up to `attempts` tries, and a call gets at most `max_reconnects` of them so
+    a deployment that keeps dropping it does not hold the call forever.
+    """
+
+    def __init__(
+        self,
+        acquire,
+        max_reconnects=UPSTREAM_MAX_RECONNECTS,
+        attempts=UPSTREAM_RECONNECT_ATTEMPTS,
+        backoff=UPSTREAM_RECONNECT_BACKOFF,
+    ):
+        self.acquire = acquire
+        self.max_reconnects = max_reconnects
+        self.attempts = attempts
+        self.backoff = backoff
+        self.reconnects = 0
+
+    async def reconnect(self, items):
+        """A new socket with `items` replayed into it, or None once the budget is spent."""
+        if self.reconnects >= self.max_reconnects:
+            UPSTREAM_RECONNECTS.labels("budget_exhausted").inc()
+            log.error("upstream.reconnect_budget_exhausted", reconnects=self.reconnects)
+            return None
+        self.reconnects += 1
+        started = time.perf_counter()
+        for attempt in range(self.attempts):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            openai_ws = None
+            try:
+                openai_ws = await self.acquire()
+                for item in items:
+                    await openai_ws.send(json.dumps(item))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("upstream.reconnect_attempt_failed", attempt=attempt + 1, error=str(e))
+                if openai_ws is not None and openai_ws.open:
+                    await openai_ws.close()
+                continue
+            elapsed = time.perf_counter() - started
+            UPSTREAM_RECONNECT_SECONDS.observe(elapsed)
+            UPSTREAM_RECONNECTS.labels("recovered").inc()
+            log.info(
+                "upstream.reconnected",
+                seconds=round(elapsed, 3),
+                attempts=attempt + 1,
+                replayed_items=len(items),
+                reconnects=self.reconnects,
+            )
+            return openai_ws
+        UPSTREAM_RECONNECTS.labels("failed").inc()
+        log.error("upstream.reconnect_failed", attempts=self.attempts)
+        return None
@@ -0,0 +1,217 @@
+import os
+import time
+import asyncio
+import weakref
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+
+from logs import get_logger
+from metrics import UPSTREAM_CONNECTS, UPSTREAM_DEPLOYMENT_STATS
+
+# Configuration
+# Comma-separated Realtime endpoints (falls back to the single AZURE_OPENAI_ENDPOINT)
+AZURE_OPENAI_ENDPOINTS = os.getenv("AZURE_OPENAI_ENDPOINTS") or os.getenv(
+    "AZURE_OPENAI_ENDPOINT", ""
+)
+# One key shared by every endpoint, or one per endpoint in the same order
+AZURE_OPENAI_API_KEYS = os.getenv("AZURE_OPENAI_API_KEYS") or os.getenv(
+    "AZURE_OPENAI_API_KEY", ""
+)
+# Per-deployment connect timeout, so a hanging deployment fails over quickly
+UPSTREAM_ATTEMPT_TIMEOUT = float(os.getenv("UPSTREAM_ATTEMPT_TIMEOUT", 3))
+# A deployment that failed to connect is skipped for this long, doubling per consecutive failure
+UPSTREAM_FAILURE_COOLDOWN = float(os.getenv("UPSTREAM_FAILURE_COOLDOWN", 5))
+UPSTREAM_FAILURE_COOLDOWN_MAX = float(os.getenv("UPSTREAM_FAILURE_COOLDOWN_MAX", 120))
+
+log = get_logger(__name__)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def deployment_name(endpoint):
+    """Short label for an endpoint: its host plus the `deployment` query parameter."""
+    url = urlparse(endpoint)
+    deployment = parse_qs(url.query).get("deployment")
+    return f"{url.netloc}/{deployment[0]}" if deployment else url.netloc
+
+
+class Deployment:
+    """One Azure OpenAI Realtime deployment: how to reach it, its health and its budget."""
+
+    def __init__(self, endpoint, api_key):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.name = deployment_name(endpoint)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.last_error = None
+        # Rate limit name -> (remaining, limit, monotonic time it resets)
+        self.rate_limits = dict()
+        self.counters = {"connects": 0, "connect_failures": 0}
+
+    async def connect(self):
+        return await websockets.connect(
+            self.endpoint,
+            extra_headers={
+                "api-key": self.api_key,
+            },
+        )
+
+    def healthy(self, now):
+        return now >= self.unhealthy_until
+
+    def headroom(self, now):
+        """Smallest remaining share of any rate limit that has not reset yet (1.0 if none)."""
+        fractions = [
+            remaining / limit
+            for remaining, limit, reset_at in self.rate_limits.values()
+            if now < reset_at
+        ]
+        return min(fractions, default=1.0)
+
+    def observe_rate_limits(self, rate_limits, now):
+        for limit in rate_limits:
+            total = limit.get("limit") or 0
+            if total > 0:
+                self.rate_limits[limit.get("name", "unknown")] = (
+                    limit.get("remaining", total),
+                    total,
+                    now + (limit.get("reset_seconds") or 0),
+                )
+
+    def connect_succeeded(self):
+        self.counters["connects"] += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        UPSTREAM_CONNECTS.labels(self.name, "ok").inc()
+
+    def connect_failed(self, error, now):
+        self.counters["connect_failures"] += 1
+        self.consecutive_failures += 1
+        cooldown = min(
+            UPSTREAM_FAILURE_COOLDOWN * 2 ** (self.consecutive_failures - 1),
+            UPSTREAM_FAILURE_COOLDOWN_MAX,
+        )
+        self.unhealthy_until = now + cooldown
+        self.last_error = repr(error)
+        UPSTREAM_CONNECTS.labels(self.name, "failed").inc()
+        log.warning(
+            "upstream.connect_failed",
+            deployment=self.name,
+            error=self.last_error,
+            consecutive_failures=self.consecutive_failures,
+            cooldown=cooldown,
+        )
+
+
+class UpstreamRouter:
+    """Spreads upstream Realtime connections over several deployments.
+
+    New connections go to the healthy deployment with the most rate-limit
+    budget left (as reported by its calls' `rate_limits.updated` events),
+    then the fewest open sockets. A failed connect puts the deployment on a
+    cooldown and the next one is tried, so a caller only notices when every
+    deployment is down.
+    """
+
+    def __init__(self, deployments, attempt_timeout=UPSTREAM_ATTEMPT_TIMEOUT):
+        self.deployments = deployments
+        self.attempt_timeout = attempt_timeout
+        # Open websocket -> the deployment it is connected to
+        self._deployment_of = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_config(cls, endpoints=AZURE_OPENAI_ENDPOINTS, api_keys=AZURE_OPENAI_API_KEYS):
+        endpoints, api_keys = _split(endpoints), _split(api_keys)
+        if len(api_keys) == 1:
+            api_keys = api_keys * len(endpoints)
+        if endpoints and len(api_keys) != len(endpoints):
+            raise ValueError(
+                "AZURE_OPENAI_API_KEYS must list one key, or one key per endpoint in AZURE_OPENAI_ENDPOINTS."
+            )
+        return cls([Deployment(endpoint, key) for endpoint, key in zip(endpoints, api_keys)])
+
+    def ranked(self):
+        """Deployments in the order new connections try them."""
+        now = time.monotonic()
+        connections = self._open_connections()
+        healthy = [d for d in self.deployments if d.healthy(now)]
+        cooling = [d for d in self.deployments if not d.healthy(now)]
+        # Budgets are compared in 10% steps so that close ones balance on load
+        healthy.sort(key=lambda d: (-round(d.headroom(now), 1), connections.get(d, 0)))
+        # Every deployment failed recently: try the one whose cooldown ends first
+        cooling.sort(key=lambda d: d.unhealthy_until)
+        return healthy + cooling
+
+    async def connect(self):
+        """Open a websocket to the best deployment, failing over to the others."""
+        last_error = None
+        for deployment in self.ranked():
+            try:
+                openai_ws = await asyncio.wait_for(deployment.connect(), self.attempt_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                deployment.connect_failed(e, time.monotonic())
+                last_error = e
+                continue
+            deployment.connect_succeeded()
+            self._deployment_of[openai_ws] = deployment
+            return openai_ws
+        raise ConnectionError(f"No upstream deployment accepted the connection: {last_error!r}")
+
+    def deployment_for(self, openai_ws):
+        return self._deployment_of.get(openai_ws)
+
+    def observe_rate_limits(self, openai_ws, rate_limits):
+        """Record a `rate_limits.updated` event against the socket's deployment."""
+        deployment = self._deployment_of.get(openai_ws)
+        if deployment is not None:
+            deployment.observe_rate_limits(rate_limits, time.monotonic())
+
+    def headroom(self):
+        """Best remaining budget share among healthy deployments (all of them if none is)."""
+        now = time.monotonic()
+        candidates = [d for d in self.deployments if d.healthy(now)] or self.deployments
+        return max((d.headroom(now) for d in candidates), default=1.0)
+
+    def stats(self):
+        now = time.monotonic()
+        connections = self._open_connections()
+        return [
+            {
+                "name": deployment.name,
+                "healthy": deployment.healthy(now),
+                "headroom": round(deployment.headroom(now), 3),
+                "connections": connections.get(deployment, 0),
+                "consecutive_failures": deployment.consecutive_failures,
+                "retry_in": round(max(deployment.unhealthy_until - now, 0), 1),
+                "last_error": deployment.last_error,
+                "rate_limits": {
+                    name: {"remaining": remaining, "limit": limit, "reset_in": round(max(reset_at - now, 0), 1)}
+                    for name, (remaining, limit, reset_at) in deployment.rate_limits.items()
+                },
+                **deployment.counters,
+            }
+            for deployment in self.deployments
+        ]
+
+    def export_metrics(self):
+        """Copy per-deployment health and budget into the upstream_deployment gauge."""
+        for stats in self.stats():
+            for stat in ("healthy", "headroom", "connections", "connect_failures"):
+                UPSTREAM_DEPLOYMENT_STATS.labels(stats["name"], stat).set(float(stats[stat]))
+
+    def _open_connections(self):
+        connections = dict()
+        for openai_ws, deployment in list(self._deployment_of.items()):
+            if openai_ws.open:
+                connections[deployment] = connections.get(deployment, 0) + 1
+        return connections
+
+
+# Shared by the connection pool, the call handlers and admission control
+upstream_router = UpstreamRouter.from_config()
@@ -0,0 +1,114 @@
+import os
+import time
+import aiohttp
+
+from metrics import WEBHOOK_REQUEST_SECONDS
+
+# Configuration
+MAKE_WEBHOOK_URL = os.getenv("MAKE_WEBHOOK_URL")
+WEBHOOK_POOL_LIMIT = int(os.getenv("WEBHOOK_POOL_LIMIT", 100))
+WEBHOOK_POOL_LIMIT_PER_HOST = int(os.getenv("WEBHOOK_POOL_LIMIT_PER_HOST", 20))
+WEBHOOK_KEEPALIVE_TIMEOUT = float(os.getenv("WEBHOOK_KEEPALIVE_TIMEOUT", 60))
+WEBHOOK_DNS_CACHE_TTL = int(os.getenv("WEBHOOK_DNS_CACHE_TTL", 300))
+WEBHOOK_CONNECT_TIMEOUT = float(os.getenv("WEBHOOK_CONNECT_TIMEOUT", 3))
+WEBHOOK_READ_TIMEOUT = float(os.getenv("WEBHOOK_READ_TIMEOUT", 10))
+
+
+class WebhookClient:
+    """App-lifetime pooled HTTP client for the Make.com webhook.
+
+    A single ``aiohttp.ClientSession`` is created on startup and reused by every
+    route, so calls share keep-alive connections instead of paying a new
+    TCP+TLS handshake per request.
+    """
+
+    def __init__(self, url=MAKE_WEBHOOK_URL):
+        self.url = url
+        self._session = None
+        self.counters = {
+            "requests": 0,
+            "failures": 0,
+            "in_flight": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_queued": 0,
+        }
+
+    async def start(self):
+        """Create the pooled session. Called from the FastAPI startup hook."""
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=WEBHOOK_POOL_LIMIT,
+            limit_per_host=WEBHOOK_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=WEBHOOK_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=WEBHOOK_CONNECT_TIMEOUT,
+            sock_read=WEBHOOK_READ_TIMEOUT,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"Content-Type": "application/json"},
+            trace_configs=[self._trace_config()],
+        )
+
+    async def close(self):
+        """Close the pooled session. Called from the FastAPI shutdown hook."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _trace_config(self):
+        """Hook connection pool events into the usage counters."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self.counters["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.counters["connections_reused"] += 1
+
+        async def on_connection_queued_start(session, context, params):
+            self.counters["connections_queued"] += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(on_connection_queued_start)
+        return trace_config
+
+    def stats(self):
+        """Snapshot of the pool usage counters."""
+        stats = dict(self.counters)
+        connector = self._session.connector if self._session else None
+        stats["pool_limit"] = connector.limit if connector else 0
+        stats["pool_limit_per_host"] = connector.limit_per_host if connector else 0
+        return stats
+
+    async def post(self, payload):
+        """POST a JSON payload to the webhook and return (status, ok, reason, text)."""
+        if self._session is None:
+            await self.start()
+        self.counters["requests"] += 1
+        self.counters["in_flight"] += 1
+        request_start = time.perf_counter()
+        try:
+            async with self._session.post(self.url, json=payload) as response:
+                text = await response.text()
+                if not response.ok:
+                    self.counters["failures"] += 1
+                return response.status, response.ok, response.reason, text
+        except Exception:
+            self.counters["failures"] += 1
+            raise
+        finally:
+            self.counters["in_flight"] -= 1
+            WEBHOOK_REQUEST_SECONDS.labels(payload.get("route", "")).observe(
+                time.perf_counter() - request_start
+            )
+
+
+webhook_client = WebhookClient()
@@ -0,0 +1,171 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import subprocess
+
+import websockets
+
+from logs import get_logger
+from metrics import WORKER_HANDOFFS
+
+# Configuration
+# Server processes on this host; above 1, `python main.py` supervises that many workers
+WORKERS = int(os.getenv("WORKERS", 1))
+# Set by the supervisor in each worker (unset when running a single process)
+WORKER_INDEX = int(os.environ["WORKER_INDEX"]) if os.getenv("WORKER_INDEX") else None
+# Worker i also listens on 127.0.0.1:(WORKER_PORT_BASE + i) for handed-off streams and scrapes
+WORKER_PORT_BASE = int(os.getenv("WORKER_PORT_BASE", int(os.getenv("PORT", 5050)) + 1))
+# A worker that exits on its own is restarted after this many seconds
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", 1))
+
+log = get_logger(__name__)
+
+
+def worker_port(index):
+    """The loopback port worker `index` listens on besides the shared public port."""
+    return WORKER_PORT_BASE + index
+
+
+def worker_path(path, index):
+    """A per-worker variant of a local file path ("" stays disabled)."""
+    if not path:
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}.worker{index}{extension}"
+
+
+def stream_path():
+    """The /media-stream path that routes a call's stream back to this worker."""
+    if WORKER_INDEX is None:
+        return "/media-stream"
+    return f"/media-stream/{WORKER_INDEX}"
+
+
+def listen_socket(host, port, reuse_port=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Every worker binds the public port; the kernel spreads new connections over them
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    return sock
+
+
+def worker_sockets(host, port):
+    """The shared public socket and this worker's private loopback socket."""
+    return [
+        listen_socket(host, port, reuse_port=True),
+        listen_socket("127.0.0.1", worker_port(WORKER_INDEX)),
+    ]
+
+
+async def hand_off_media_stream(websocket, owner):
+    """Relay a media stream that reached the wrong worker to the worker that answered its call.
+
+    The call's session, admission slot and pending caller lookup live in the
+    worker that served /incoming-call. Frames are passed through as text,
+    without parsing. Returns False, without accepting the websocket, if the
+    owner cannot be reached (e.g. it was restarted); the caller then serves
+    the stream itself from the TwiML parameters.
+    """
+    headers = dict()
+    call_sid = websocket.headers.get("x-twilio-call-sid")
+    if call_sid:
+        headers["x-twilio-call-sid"] = call_sid
+    try:
+        upstream = await websockets.connect(
+            f"ws://127.0.0.1:{worker_port(owner)}/media-stream/{owner}",
+            extra_headers=headers,
+            max_size=None,
+            open_timeout=2,
+        )
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+        WORKER_HANDOFFS.labels("owner_unreachable").inc()
+        log.warning("worker.handoff_failed", owner=owner, error=str(e))
+        return False
+
+    WORKER_HANDOFFS.labels("forwarded").inc()
+    await websocket.accept()
+
+    async def from_twilio():
+        async for message in websocket.iter_text():
+            await upstream.send(message)
+
+    async def to_twilio():
+        async for message in upstream:
+            await websocket.send_text(message)
+
+    tasks = [asyncio.create_task(from_twilio()), asyncio.create_task(to_twilio())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await upstream.close()
+        try:
+            # Pass on the owner's close code (e.g. 1013 when it refused the stream)
+            await websocket.close(code=upstream.close_code or 1000)
+        except RuntimeError:
+            pass
+    return True
+
+
+class WorkerSupervisor:
+    """Runs `workers` copies of this server and keeps them running.
+
+    Each worker gets WORKER_INDEX in its environment, binds the public port
+    with SO_REUSEPORT and its own loopback port, and writes local spool files
+    under per-worker names (`per_worker_paths`: setting name -> default path).
+    The first SIGTERM/SIGINT is passed on to every worker, which drains its
+    calls; a second one makes them exit immediately.
+    """
+
+    def __init__(self, workers=WORKERS, per_worker_paths=None, restart_delay=WORKER_RESTART_DELAY):
+        self.workers = workers
+        self.per_worker_paths = per_worker_paths or dict()
+        self.restart_delay = restart_delay
+        self.processes = dict()
+        self.stopping = False
+
+    def worker_env(self, index):
+        env = dict(os.environ)
+        env["WORKER_INDEX"] = str(index)
+        for name, default in self.per_worker_paths.items():
+            env[name] = worker_path(os.getenv(name, default), index)
+        return env
+
+    def spawn(self, index):
+        # Own process group: a terminal's Ctrl-C reaches the supervisor only, which forwards it once
+        process = subprocess.Popen(
+            [sys.executable] + sys.argv, env=self.worker_env(index), start_new_session=True
+        )
+        self.processes[index] = process
+        log.info("worker.started", worker=index, pid=process.pid, port=worker_port(index))
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        for index in range(self.workers):
+            self.spawn(index)
+        while self.processes:
+            time.sleep(0.5)
+            for index, process in list(self.processes.items()):
+                if process.poll() is None:
+                    continue
+                del self.processes[index]
+                if not self.stopping:
+                    log.warning("worker.exited", worker=index, returncode=process.returncode)
+                    time.sleep(self.restart_delay)
+                    self.spawn(index)
+
+    def handle_exit(self, sig, frame):
+        self.stopping = True
+        log.info("worker.stopping", signal=signal.Signals(sig).name, workers=len(self.processes))
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)